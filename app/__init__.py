@@ -20,4 +20,4 @@ migrate = Migrate(app, db)
 login = LoginManager(app)
 
 
-from app import routes, models, parsing, api_calls, parsing
\ No newline at end of file
+from app import routes, models, parsing, api_calls, parsing, prefetch
\ No newline at end of file
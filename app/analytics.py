@@ -0,0 +1,99 @@
+import numpy as np
+from app.timeseries import as_series
+
+
+def series_arrays(item):
+    """
+    Returns the dates and adjusted closing prices of a time series as NumPy arrays, oldest bar first.
+
+    Args:
+        item (Series or dict): A stored Series, or a TIME_SERIES_* response from the Alpha Vantage API.
+
+    Returns:
+        tuple: The ticker, an array of dates (datetime64[D]) and an array of adjusted closing prices.
+    """
+    series = as_series(item)
+    return series.symbol, series.bars["date"], series.bars["adjusted_close"]
+
+
+def align(dates_list, closes_list):
+    """
+    Aligns several price series on the dates they all have.
+
+    Returns:
+        tuple: The common dates, oldest first, and a (tickers x dates) matrix of closing prices.
+    """
+    common = dates_list[0]
+    for dates in dates_list[1:]:
+        common = np.intersect1d(common, dates, assume_unique=True)
+
+    prices = np.empty((len(closes_list), len(common)), dtype=np.float64)
+    for row, (dates, closes) in enumerate(zip(dates_list, closes_list)):
+        prices[row] = closes[np.searchsorted(dates, common)]
+    return common, prices
+
+
+def relative_performance(prices):
+    """
+    Returns each ticker's return over the whole period, e.g. 0.12 for +12%.
+    """
+    return prices[:, -1] / prices[:, 0] - 1
+
+
+def max_drawdown(prices):
+    """
+    Returns each ticker's largest fall from a previous peak during the period, e.g. -0.08 for -8%.
+    """
+    peaks = np.maximum.accumulate(prices, axis=1)
+    return (prices / peaks - 1).min(axis=1)
+
+
+def correlation(prices):
+    """
+    Returns the correlation matrix of the tickers' returns from one bar to the next.
+    Pairs involving a ticker whose price never changed are NaN.
+    """
+    returns = prices[:, 1:] / prices[:, :-1] - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.atleast_2d(np.corrcoef(returns))
+
+
+def compare(payloads, bars):
+    """
+    Compares the performance of several tickers over the last `bars` bars of their time series.
+
+    Args:
+        payloads (list): Stored Series or TIME_SERIES_* responses from the Alpha Vantage API, one per ticker.
+        bars (int): The number of bars compared, counting back from the latest date all tickers share.
+
+    Returns:
+        list: (title, lines) tuples in the format of format_response(): one per ticker with its return and
+            maximum drawdown, followed by the correlation matrix when there is more than one ticker.
+    """
+    tickers, dates_list, closes_list = [], [], []
+    for payload in payloads:
+        ticker, dates, closes = series_arrays(payload)
+        tickers.append(ticker)
+        dates_list.append(dates)
+        closes_list.append(closes)
+
+    dates, prices = align(dates_list, closes_list)
+    if len(dates) < 2:
+        return [("Comparison", ["The tickers do not have enough dates in common to be compared."])]
+    dates, prices = dates[-bars:], prices[:, -bars:]
+
+    period = "Period: " + str(dates[0]) + " to " + str(dates[-1])
+    performance = relative_performance(prices)
+    drawdown = max_drawdown(prices)
+    response_data = []
+    for ticker, change, fall in zip(tickers, performance, drawdown):
+        response_data.append((ticker, [period, "Return: {:+.2%}".format(change), "Max drawdown: {:.2%}".format(fall)]))
+
+    if len(tickers) > 1:
+        matrix = correlation(prices)
+        width = max(len(ticker) for ticker in tickers) + 2
+        lines = [" " * width + "".join(ticker.rjust(width) for ticker in tickers)]
+        for ticker, row in zip(tickers, matrix):
+            lines.append(ticker.ljust(width) + "".join("{:.2f}".format(value).rjust(width) for value in row))
+        response_data.append(("Correlation of returns", lines))
+    return response_data
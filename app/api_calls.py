@@ -1,10 +1,20 @@
+import asyncio
+import httpx
 import requests
-import json
-import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from functools import partial
+from app import app
+from app.cache import ResponseCache, PersistentCache, cache_key, is_empty_quote
+from app.scheduler import UpstreamScheduler, INTERACTIVE
+from app.http_client import HTTPClient, AsyncHTTPClient
+from app.planner import plan_queries
+from app.keywords import keyword_registry
+from app.analytics import compare
+from app.timeseries import SeriesStore, SERIES_KEYS, as_series
+from app.metrics import metrics
 
-# Open the keyword file in read mode and load its contents into the `keyword_data` variable.
-with open(os.path.join(os.getcwd(), "app", "static", "keywords.json"), 'r') as f:
-    keyword_data = json.load(f)
 
 """
 Example usage:
@@ -20,36 +30,478 @@ Example usage:
             response = api_call(params)
 """
 
-URL = "https://www.alphavantage.co/query"
+URL = app.config["ALPHA_VANTAGE_URL"]
 
-def api_call(queries):
+# In-process cache of upstream payloads, keyed on the query params without the apikey.
+response_cache = ResponseCache(app.config["CACHE_TTL"], app.config["CACHE_MAX_ENTRIES"],
+                               default_ttl=app.config["CACHE_DEFAULT_TTL"])
+
+# Cache shared by every worker process through a SQLite file next to app.db, checked after the in-process cache.
+persistent_cache = None
+if app.config["CACHE_PERSISTENT"]:
+    persistent_cache = PersistentCache(app.config["CACHE_DATABASE_PATH"], app.config["CACHE_TTL"],
+                                       default_ttl=app.config["CACHE_DEFAULT_TTL"],
+                                       sweep_interval=app.config["CACHE_SWEEP_INTERVAL"])
+
+# Time series are kept as memory-mapped arrays, so repeated range queries are answered without the network.
+series_store = None
+if app.config["SERIES_STORE"]:
+    series_store = SeriesStore(app.config["SERIES_STORE_PATH"], app.config["CACHE_TTL"],
+                               default_ttl=app.config["CACHE_DEFAULT_TTL"])
+
+# Shared pool used to send the queries of a multi-ticker request in parallel.
+# It is created on first use so the worker count can be set through the app config.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    Returns the shared thread pool used by api_call(), creating it on first use.
+    The pool size is taken from the API_MAX_WORKERS config setting.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config["API_MAX_WORKERS"],
+                                           thread_name_prefix="api_call")
+        return _executor
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical upstream requests that are in flight at the same time.
+
+    The first caller for a key runs the fetch; callers arriving while it is running wait on the same future
+    and share its result, or its exception.
+
+    Attributes:
+        leaders (int): The number of fetches that were actually run.
+        coalesced (int): The number of callers that shared another caller's fetch.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args):
+        """
+        Runs `function(*args)` unless a call with the same key is already running, in which case its result is shared.
+
+        Args:
+            key: A hashable key identifying the request.
+            function (callable): The function that performs the request.
+
+        Returns:
+            The result of the (possibly shared) call. Exceptions raised by the call are raised in every caller.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(function(*args))
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+    async def do_async(self, key, function, *args):
+        """
+        The asyncio counterpart of do(): awaits `function(*args)`, a coroutine function, unless a call with the
+        same key is already running in a thread or in a coroutine, in which case its result is shared.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            future.set_result(await function(*args))
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of fetches run, callers coalesced and requests in flight.
+        """
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+# Identical queries in flight at the same time share one upstream request.
+single_flight = SingleFlight()
+
+# Keeps upstream requests within the Alpha Vantage per-minute and per-day call limits, across all worker
+# processes when the limits are shared through the cache database.
+upstream_scheduler = UpstreamScheduler(
+    app.config["UPSTREAM_CALLS_PER_MINUTE"], app.config["UPSTREAM_CALLS_PER_DAY"],
+    path=app.config["CACHE_DATABASE_PATH"] if app.config["UPSTREAM_LIMITS_SHARED"] else None)
+
+# Returned instead of a payload when the call limit would keep a query waiting longer than UPSTREAM_MAX_WAIT.
+QUOTA_EXCEEDED = 429
+
+# Returned when Alpha Vantage could not be reached at all, even after retrying.
+UPSTREAM_UNAVAILABLE = 503
+
+# Pooled keep-alive session used for every upstream request.
+http_client = HTTPClient(pool_size=app.config["HTTP_POOL_SIZE"],
+                         connect_timeout=app.config["HTTP_CONNECT_TIMEOUT"],
+                         read_timeout=app.config["HTTP_READ_TIMEOUT"],
+                         retries=app.config["HTTP_RETRIES"],
+                         backoff=app.config["HTTP_BACKOFF"])
+
+# Its asyncio counterpart, used by the ASGI entry point
+async_http_client = AsyncHTTPClient(pool_size=app.config["HTTP_ASYNC_POOL_SIZE"],
+                                    connect_timeout=app.config["HTTP_CONNECT_TIMEOUT"],
+                                    read_timeout=app.config["HTTP_READ_TIMEOUT"],
+                                    retries=app.config["HTTP_RETRIES"],
+                                    backoff=app.config["HTTP_BACKOFF"])
+
+
+@metrics.collector
+def collect_metrics():
+    """
+    Reports the hit counters of the caches and the state of the upstream scheduler and HTTP client on /metrics.
+    """
+    caches = [("response", response_cache.stats())]
+    if persistent_cache is not None:
+        caches.append(("persistent", persistent_cache.counters()))
+    if series_store is not None:
+        caches.append(("series", series_store.stats()))
+    flights = single_flight.stats()
+    scheduler = upstream_scheduler.stats()
+    retries = http_client.stats()["retries"] + async_http_client.stats()["retries"]
+    return [
+        ("stockbot_cache_hits_total", "counter", "Lookups answered from each cache.",
+         [((("cache", name),), stats["hits"]) for name, stats in caches]),
+        ("stockbot_cache_misses_total", "counter", "Lookups missing or expired in each cache.",
+         [((("cache", name),), stats["misses"]) for name, stats in caches]),
+        ("stockbot_cache_hit_ratio", "gauge", "Share of lookups answered from each cache.",
+         [((("cache", name),), stats["hits"] / float(stats["hits"] + stats["misses"] or 1)) for name, stats in caches]),
+        ("stockbot_upstream_coalesced_total", "counter", "Callers that shared another caller's upstream request.",
+         [((), flights["coalesced"])]),
+        ("stockbot_upstream_queued", "gauge", "Requests waiting for the call limit.", [((), scheduler["queued"])]),
+        ("stockbot_upstream_rejected_total", "counter", "Requests turned away by the call limit.",
+         [((), scheduler["rejected"])]),
+        ("stockbot_upstream_tokens", "gauge", "Calls left in the call limit buckets.",
+         [((("window", "minute"),), scheduler["minute_tokens"]), ((("window", "day"),), scheduler["day_tokens"])]),
+        ("stockbot_http_retries_total", "counter", "Upstream requests retried.", [((), retries)]),
+    ]
+
+
+def fetch(params, priority=INTERACTIVE):
+    """
+    Send a single query to the Alpha Vantage API, answering it from the series store, the in-process cache
+    or the shared persistent cache when possible. Concurrent misses for the same query share one upstream request.
+
+    Parameters:
+        params (dict): The API parameters for the query.
+        priority (int): The scheduler priority used if the query has to go upstream.
+
+    Returns:
+        Either the JSON response object, a Series for TIME_SERIES_* queries when the series store is enabled,
+        or a HTTP status code or -1 if there is an error.
+    """
+    params, result = lookup(params)
+    if result is not None:
+        return result
+    return single_flight.do(cache_key(params), fetch_upstream, params, priority)
+
+
+def lookup(params):
+    """
+    Answers a query from the series store, the in-process cache or the shared persistent cache.
+
+    Returns:
+        tuple: The params to send upstream on a miss, which ask a stale time series for only the bars it is
+            missing, and the cached result, or None on a miss.
+    """
+    if series_store is not None and params.get("function") in SERIES_KEYS:
+        series = series_store.get(params)
+        if series is not None:
+            return params, series
+        # a stale series is refreshed with only the bars it is missing
+        params = series_store.delta_params(params)
+
+    cached = response_cache.get(params)
+    if cached is not None:
+        return params, store_series(params, cached)
+
+    if persistent_cache is not None:
+        stored = persistent_cache.get(params)
+        if stored is not None:
+            # keep the payload in memory only for as long as it has left in the shared cache
+            response_cache.set(params, stored[0], ttl=stored[1])
+            return params, store_series(params, stored[0])
+
+    return params, None
+
+
+def store_series(params, payload):
+    """
+    Stores a time series payload in the series store and returns it as a Series.
+    Any other payload, or any payload when the store is disabled, is returned unchanged.
+    """
+    if series_store is None or params.get("function") not in SERIES_KEYS:
+        return payload
+    try:
+        return series_store.put(params, payload)
+    except (KeyError, ValueError, StopIteration):
+        # a payload without the expected bars is passed on as it is
+        return payload
+
+
+def fetch_upstream(params, priority=INTERACTIVE, on_admit=None):
+    """
+    Send a single query to the Alpha Vantage API once the scheduler admits it, and store a successful
+    payload in the caches.
+
+    Parameters:
+        params (dict): The API parameters for the query.
+        priority (int): The scheduler priority of the query.
+        on_admit (callable): Called without arguments once the scheduler admits the query, before it is sent.
+
+    Returns:
+        Either the JSON response object (a Series for TIME_SERIES_* queries when the series store is enabled),
+        or a HTTP status code or -1 if there is an error. QUOTA_EXCEEDED is returned if the call limit is reached,
+        either locally or by Alpha Vantage, and UPSTREAM_UNAVAILABLE if the API could not be reached.
+    """
+    function = params.get("function")
+    if not upstream_scheduler.acquire(priority, app.config["UPSTREAM_MAX_WAIT"]):
+        metrics.upstream_calls.inc(function, "throttled")
+        return QUOTA_EXCEEDED
+    if on_admit is not None:
+        on_admit()
+
+    # Send a HTTP GET request to the Alpha Vantage API with the specified parameters.
+    try:
+        reply = http_client.get(URL, params)
+    except requests.RequestException:
+        metrics.upstream_calls.inc(function, "unavailable")
+        return UPSTREAM_UNAVAILABLE
+
+    return accept_reply(params, reply.status_code, reply.json() if reply.status_code == 200 else None)
+
+
+def accept_reply(params, status_code, json_response):
+    """
+    Checks an upstream reply, counts its outcome and stores a successful payload in the caches.
+
+    Parameters:
+        params (dict): The API parameters of the query.
+        status_code (int): The HTTP status code of the reply.
+        json_response (dict): The parsed body of a HTTP 200 reply.
+
+    Returns:
+        The payload, as fetch_upstream() returns it, or the error code for the reply.
+    """
+    function = params.get("function")
+    # Check the HTTP status code to see if the request was successful.
+    if status_code != 200:
+        # If the request was not successful, return the HTTP status code.
+        metrics.upstream_calls.inc(function, str(status_code))
+        return status_code
+
+    if bool(json_response) is False or "Error Message" in json_response or is_empty_quote(json_response):
+        # an unknown ticker is answered with an error message, or with an empty quote by GLOBAL_QUOTE
+        metrics.upstream_calls.inc(function, "error")
+        return -1
+    if "Note" in json_response or "Information" in json_response:
+        # Alpha Vantage reports an exhausted call limit with HTTP 200 and a notice
+        metrics.upstream_calls.inc(function, "quota")
+        return QUOTA_EXCEEDED
+    metrics.upstream_calls.inc(function, "200")
+    if series_store is not None and function in SERIES_KEYS:
+        # the series store keeps the bars, so the raw payload (megabytes for a full daily series) is not cached
+        return store_series(params, json_response)
+    response_cache.set(params, json_response)
+    if persistent_cache is not None:
+        persistent_cache.set(params, json_response)
+    return store_series(params, json_response)
+
+
+async def fetch_async(params, priority=INTERACTIVE):
+    """
+    The asyncio counterpart of fetch(). The caches are read and written on worker threads, since the
+    persistent cache and the series store use files, while the wait for the call limit and for Alpha Vantage
+    holds no thread. Identical queries share one upstream request with async and blocking callers alike.
+    """
+    params, result = await asyncio.to_thread(lookup, params)
+    if result is not None:
+        return result
+    return await single_flight.do_async(cache_key(params), fetch_upstream_async, params, priority)
+
+
+async def fetch_upstream_async(params, priority=INTERACTIVE):
+    """
+    The asyncio counterpart of fetch_upstream(), sending the query with async_http_client.
+    """
+    if not await upstream_scheduler.acquire_async(priority, app.config["UPSTREAM_MAX_WAIT"]):
+        metrics.upstream_calls.inc(params.get("function"), "throttled")
+        return QUOTA_EXCEEDED
+
+    try:
+        reply = await async_http_client.get(URL, params)
+    except httpx.TransportError:
+        metrics.upstream_calls.inc(params.get("function"), "unavailable")
+        return UPSTREAM_UNAVAILABLE
+
+    json_response = reply.json() if reply.status_code == 200 else None
+    return await asyncio.to_thread(accept_reply, params, reply.status_code, json_response)
+
+
+async def api_call_async(queries, priority=INTERACTIVE):
+    """
+    The asyncio counterpart of api_call(). Every query of the request is in flight at once, since waiting
+    coroutines take no worker from a pool.
+
+    Returns:
+        Either a list of JSON response objects, or the first HTTP status code or -1 in query order if there is an error.
+    """
+    plan = plan_queries(queries)
+    results = await asyncio.gather(*(fetch_async(params, priority) for params in plan.fetches))
+    for result in results:
+        if type(result) == int:
+            return result
+    return plan.expand(list(results))
+
+
+def api_call(queries, max_workers=None, priority=INTERACTIVE):
     """
     Call the Alpha Vantage API with the specified queries.
 
+    The queries are sent in parallel on a bounded thread pool, so a multi-ticker request takes
+    about as long as its slowest ticker. Duplicate queries (e.g. the same ticker typed twice in different
+    case) are fetched once. Results are returned in the same order as the queries.
+
     Parameters:
         queries (list): A list of dictionaries containing the API parameters to use for each query.
+        max_workers (int): The maximum number of queries in flight at once. Defaults to the
+            API_MAX_WORKERS config setting; a value of 1 sends the queries one after another.
+        priority (int): The scheduler priority of the queries, see app.scheduler.
 
     Returns:
         Either a list of JSON response objects, or a HTTP status code or -1 if there is an error.
     """
-    response = []
-    for params in queries:
-        # Send a HTTP GET request to the Alpha Vantage API with the specified parameters.
-        reply = requests.get(URL, params)
+    if max_workers is None:
+        max_workers = app.config["API_MAX_WORKERS"]
+
+    # Collapse duplicate (function, symbol) pairs so each payload is only downloaded once.
+    plan = plan_queries(queries)
+    fetches = plan.fetches
+
+    if max_workers <= 1 or len(fetches) <= 1:
+        results = []
+        for params in fetches:
+            result = fetch(params, priority)
+            if type(result) == int:
+                return result
+            results.append(result)
+        return plan.expand(results)
+
+    # Submit in windows of max_workers so a single request cannot take over the shared pool.
+    executor = _get_executor()
+    results = []
+    for start in range(0, len(fetches), max_workers):
+        window = fetches[start:start + max_workers]
+        results.extend(executor.map(partial(fetch, priority=priority), window))
+
+    # Report the first error in input order, matching the sequential behaviour.
+    for result in results:
+        if type(result) == int:
+            return result
+    # Return the response list containing the JSON response objects, one per query.
+    return plan.expand(results)
 
-        # Check the HTTP status code to see if the request was successful.
-        if reply.status_code != 200:
-            # If the request was not successful, return the HTTP status code.
-            return reply.status_code
-        else:
-            # If the request was successful, parse the JSON response and add it to the response list.
-            json_response = reply.json()
 
-            if bool(json_response) is False:
-                return -1
-            response.append(json_response)
-    # Return the response list containing the JSON response objects.
-    return response
+def api_call_iter(queries, priority=INTERACTIVE, max_workers=None):
+    """
+    Call the Alpha Vantage API with the specified queries, yielding each result as soon as it arrives.
+
+    Like api_call(), at most `max_workers` queries are in flight at once, so a long ticker list cannot take
+    over the shared pool: the next query is only submitted when one finishes.
+
+    Parameters:
+        queries (list): A list of dictionaries containing the API parameters to use for each query.
+        priority (int): The scheduler priority of the queries, see app.scheduler.
+        max_workers (int): The maximum number of queries in flight at once. Defaults to the
+            API_MAX_WORKERS config setting.
+
+    Yields:
+        tuple: (index, result) where index is the position of the query in `queries` and result is either
+            the JSON response object, or a HTTP status code or -1 if there is an error. Results come in the
+            order they arrive, not in query order.
+    """
+    if max_workers is None:
+        max_workers = app.config["API_MAX_WORKERS"]
+
+    plan = plan_queries(queries)
+    # the positions in `queries` answered by each fetch
+    indexes = {}
+    for index, position in enumerate(plan.positions):
+        indexes.setdefault(position, []).append(index)
+
+    executor = _get_executor()
+    waiting = deque(enumerate(plan.fetches))
+    futures = {}
+    while waiting or futures:
+        while waiting and len(futures) < max(max_workers, 1):
+            position, params = waiting.popleft()
+            futures[executor.submit(fetch, params, priority)] = position
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            for index in indexes[futures.pop(future)]:
+                yield index, result
+
+
+# Number of bars shown for each range selector ("lastweek", "lastmonth", "lastyear") of a historical query
+HISTORY_BARS = [5, 4, 12]
+
+# Number of bars compared for each range selector ("lastweek", "lastmonth", "lastyear") of a comparison query
+COMPARISON_BARS = [6, 5, 13]
+
+
+def bar_lines(bar):
+    """
+    Returns the open, close, high, low and volume lines shown for a single bar of a Series.
+    Prices are shown with the four decimals Alpha Vantage uses.
+    """
+    return [
+        "Open: %.4f" % bar["open"],
+        "Close: %.4f" % bar["close"],
+        "High: %.4f" % bar["high"],
+        "Low: %.4f" % bar["low"],
+        "Volume: %d" % bar["volume"],
+    ]
 
 
 ## format_response prepares a plaintext response to the user
@@ -69,16 +521,20 @@ def format_response(response, query_type, selector):
     response_data (list): A list containing the formatted response data.
 
     The `query_type` argument is an integer that specifies the type of query made by the user.
-    There are three types of queries:
+    There are four types of queries:
         1. General keyword search for a stock
         2. Real-time data for a stock
         3. Historical data for a stock
+        4. Comparison of the historical performance of several stocks
 
     The `selector` argument is a list that contains boolean values for formatting the response based on the user's selection.
     If the query is of a non-modifiable type, `selector` will contain a true/false matrix for all the options.
     """
     if response == int:
         return response
+
+    # the selectors are compared against the current keyword file
+    keyword_data = keyword_registry.data()
     
     # formatting the response for a standard keyword
     if query_type == 1:
@@ -126,82 +582,30 @@ def format_response(response, query_type, selector):
         
         elif selector == keyword_data["timeSelector"][1]:   #"yesterday"
             for stock in response:
-                ticker = stock["Meta Data"]["2. Symbol"]
-                data = []
-                stock = stock["Time Series (Daily)"]
-                stock = next(iter(stock.values()))
-                
-                data.append("Open: " + stock["1. open"])
-                data.append("Close: " + stock["4. close"])
-                data.append("High: " + stock["2. high"])
-                data.append("Low: " + stock["3. low"])
-                data.append("Volume: " + stock["6. volume"])
-                
-                response_data.append((ticker, data))
+                stock = as_series(stock, "TIME_SERIES_DAILY_ADJUSTED")
+                ticker = stock.symbol
+                response_data.append((ticker, bar_lines(stock.last(1)[0])))
         #print("\n\n", response_data,"\n\n")
         return response_data
     
     # formatting the response for historical data
     elif query_type == 3:
         response_data = []
-        if selector == keyword_data["rangeSelector"][0]:    #"lastweek" will do daily from last week
-            for stock in response:
-                ticker = stock["Meta Data"]["2. Symbol"]
-                data = []
-                stock = stock["Time Series (Daily)"]
-                counter = 0
-                
-                for day in stock:
-                    if counter == 5:
-                        break
-                    data.append(day)
-                    data.append("Open: " + stock[day]["1. open"])
-                    data.append("Close: " + stock[day]["4. close"])
-                    data.append("High: " + stock[day]["2. high"])
-                    data.append("Low: " + stock[day]["3. low"])
-                    data.append("Volume: " + stock[day]["6. volume"])
-                    counter += 1
-                
-                response_data.append((ticker, data))
-        
-        elif selector == keyword_data["rangeSelector"][1]:  #"lastmonth" will do weekly from last month
-            for stock in response:
-                ticker = stock["Meta Data"]["2. Symbol"]
-                data = []
-                stock = stock["Weekly Adjusted Time Series"]
-                counter = 0
-                
-                for day in stock:
-                    if counter == 4:
-                        break
-                    data.append(day)
-                    data.append("Open: " + stock[day]["1. open"])
-                    data.append("Close: " + stock[day]["4. close"])
-                    data.append("High: " + stock[day]["2. high"])
-                    data.append("Low: " + stock[day]["3. low"])
-                    data.append("Volume: " + stock[day]["6. volume"])
-                    counter += 1
-                
-                response_data.append((ticker, data))
-                
-        elif selector == keyword_data["rangeSelector"][2]:  #"lastyear will do monthly for a year"
-            for stock in response:
-                ticker = stock["Meta Data"]["2. Symbol"]
-                data = []
-                stock = stock["Monthly Adjusted Time Series"]
-                counter = 0
-                
-                for day in stock:
-                    if counter == 12:
-                        break
-                    data.append(day)
-                    data.append("Open: " + stock[day]["1. open"])
-                    data.append("Close: " + stock[day]["4. close"])
-                    data.append("High: " + stock[day]["2. high"])
-                    data.append("Low: " + stock[day]["3. low"])
-                    data.append("Volume: " + stock[day]["6. volume"])
-                    counter += 1
-                
-                response_data.append((ticker, data))
+        # the number of bars shown for "lastweek" (daily), "lastmonth" (weekly) and "lastyear" (monthly)
+        count = HISTORY_BARS[keyword_data["rangeSelector"].index(selector)]
+        for stock in response:
+            stock = as_series(stock)
+            data = []
+            # slicing the stored arrays, newest bar first
+            for bar in stock.last(count)[::-1]:
+                data.append(str(bar["date"]))
+                data.extend(bar_lines(bar))
+            response_data.append((stock.symbol, data))
         #print("\n\n", response_data,"\n\n")
-        return response_data
\ No newline at end of file
+        return response_data
+    
+    # comparing the historical performance of several stocks
+    elif query_type == 4:
+        # one more bar than the matching "price" range, so the comparison covers the same number of moves
+        bars = COMPARISON_BARS[keyword_data["rangeSelector"].index(selector)]
+        return compare(response, bars)
\ No newline at end of file
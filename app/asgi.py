@@ -0,0 +1,219 @@
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask_login import current_user
+from app import app
+from app import api_calls
+from app import routes
+from app.metrics import metrics, server_timing
+from app.parsing import compile_query, WATCHLIST_QUERY_TYPE
+from app.persistence import record_turn
+
+## ASGI entry point of the app (see asgi.py in the top-level folder), for servers such as uvicorn.
+## Chat messages that need Alpha Vantage are answered on the event loop: the wait for the call limit and for
+## the upstream replies holds no thread, so one process can keep hundreds of chat requests in flight.
+## Everything that can block still runs on worker threads: the database, the cache lookups and stores (the
+## shared SQLite cache and the series store), and each try for a token of the call limit, which may wait for
+## cache.db when the limits are shared between processes. Every other request, including streamed chat
+## replies and profiled requests, is passed on to the Flask app on a worker thread.
+
+
+def wsgi_environ(scope, body):
+    """
+    Builds the WSGI environ of an ASGI HTTP request.
+
+    Args:
+        scope (dict): The ASGI connection scope.
+        body (bytes): The full request body.
+
+    Returns:
+        dict: The environ, as a WSGI server would pass it to the Flask app.
+    """
+    server = scope.get("server") or ("localhost", None)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else "HTTP_" + name
+        value = value.decode("latin1")
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+
+async def read_body(receive):
+    """
+    Returns the full body of an ASGI HTTP request, or None if the client disconnected.
+    """
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def call_flask(environ, send):
+    """
+    Runs the Flask app for a request on a worker thread and sends its response, chunk by chunk as a
+    streamed response produces them.
+    """
+    loop = asyncio.get_running_loop()
+    deliver = lambda message: asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        # the response is produced and iterated on the same thread, so streamed responses keep their request context
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started.append((int(status.split(" ", 1)[0]), headers))
+
+        def start():
+            status, headers = started[0]
+            deliver({"type": "http.response.start", "status": status,
+                     "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]})
+
+        response = app(environ, start_response)
+        try:
+            sent_start = False
+            for chunk in response:
+                if not chunk:
+                    continue
+                if not sent_start:
+                    start()
+                    sent_start = True
+                deliver({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not sent_start:
+                start()
+            deliver({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+
+    await asyncio.to_thread(run)
+
+
+def request_user(environ):
+    """
+    Returns the id of the user logged in through the session cookie of a request, or None.
+    """
+    with app.request_context(environ):
+        return current_user.id if current_user.is_authenticated else None
+
+
+def save_chat_turn(userId, user_content, bot_content, sent_at):
+    with app.app_context():
+        record_turn(userId, user_content, bot_content, sent_at)
+
+
+def answers_async(scope, data, query):
+    """
+    Returns whether a chat message is answered on the event loop: a query for Alpha Vantage, not streamed and
+    not profiled. Everything else goes to the Flask view.
+    """
+    if query.error is not None or query.query_type == WATCHLIST_QUERY_TYPE or data.get("stream"):
+        return False
+    profiled = any(name == b"x-profile-token" for name, _ in scope.get("headers", [])) or \
+        b"profile=" in scope.get("query_string", b"")
+    return not profiled
+
+
+async def chat(scope, body, send):
+    """
+    Answers a chat message like the index() view, but awaits the upstream calls on the event loop.
+    Messages that are not answered here are passed on to the Flask app.
+    """
+    started = time.perf_counter()
+    environ = wsgi_environ(scope, body)
+    try:
+        data = json.loads(body)
+        message = data["message"]
+    except (ValueError, TypeError, KeyError):
+        return await call_flask(environ, send)
+
+    timings = []
+    with metrics.stage("parse", timings):
+        query = compile_query(message)
+    if not answers_async(scope, data, query):
+        return await call_flask(environ, send)
+
+    sent_at = datetime.now()
+    userId = await asyncio.to_thread(request_user, environ)
+    with metrics.stage("upstream", timings):
+        responses = await api_calls.api_call_async(query.queries)
+    content, success = routes.api_reply(query, responses, timings)
+    if userId is not None:
+        # the user's message is saved together with the reply, once the reply is ready
+        with metrics.stage("save", timings):
+            await asyncio.to_thread(save_chat_turn, userId, message, content, sent_at)
+
+    reply = app.json.dumps({
+        "success": success,
+        "content": content,
+        "not_auth_msg": "" if userId is not None else routes.NOT_AUTH_MSG,
+    }).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(reply)).encode())]
+    if app.debug or app.config["METRICS_TIMING_HEADER"]:
+        headers.append((b"server-timing", server_timing(timings).encode()))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    await send({"type": "http.response.body", "body": reply})
+
+    elapsed = time.perf_counter() - started
+    metrics.requests.observe(elapsed, "/", "POST")
+    if routes.slow_query_log is not None:
+        upstream = ["ok"] * len(responses) if type(responses) == list else [responses]
+        await asyncio.to_thread(routes.slow_query_log.observe, elapsed, query, timings, upstream, len(reply), userId)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # worker threads for the database, the caches and the requests passed on to Flask
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(app.config["ASGI_THREADS"], thread_name_prefix="asgi"))
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await api_calls.async_http_client.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """
+    The ASGI application. POST / chat messages are answered by chat(), everything else by the Flask app.
+    """
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    if scope["method"] == "POST" and scope["path"] == "/":
+        await chat(scope, body, send)
+    else:
+        await call_flask(wsgi_environ(scope, body), send)
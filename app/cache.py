@@ -0,0 +1,326 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(params):
+    """
+    Builds the cache key for a set of Alpha Vantage request params.
+
+    The key is made from every param except the apikey, with the symbol upper-cased, so the same
+    query from different users (or with different casing) shares one cache entry.
+
+    Args:
+        params (dict): The HTTP request params for the query.
+
+    Returns:
+        tuple: A hashable, order-independent key for the query.
+    """
+    key = []
+    for name, value in sorted(params.items()):
+        if name == "apikey":
+            continue
+        if name == "symbol" and value is not None:
+            value = value.strip().upper()
+        key.append((name, value))
+    return tuple(key)
+
+
+def is_empty_quote(payload):
+    """
+    Checks whether a payload is the empty quote Alpha Vantage sends, with HTTP 200, for an unknown ticker.
+    """
+    return isinstance(payload, dict) and "Global Quote" in payload and not payload["Global Quote"]
+
+
+def is_cacheable(payload):
+    """
+    Checks whether an API payload holds real data and can be cached.
+    Alpha Vantage answers errors and rate limit notices with HTTP 200, so those are filtered out here.
+    """
+    if not isinstance(payload, dict) or not payload or is_empty_quote(payload):
+        return False
+    return not any(field in payload for field in ("Error Message", "Note", "Information"))
+
+
+class ResponseCache(object):
+    """
+    An in-process, size-bounded LRU cache for Alpha Vantage payloads with a TTL per API function.
+
+    Attributes:
+        ttls (dict): Maps an API function name (e.g. "GLOBAL_QUOTE") to its time to live in seconds.
+        default_ttl (int): The time to live used for functions missing from `ttls`.
+        max_entries (int): The maximum number of payloads kept before the least recently used is evicted.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that were missing or expired.
+        evictions (int): The number of entries dropped to stay within `max_entries`.
+    """
+
+    def __init__(self, ttls, max_entries, default_ttl=60, clock=time.monotonic):
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries = OrderedDict()     # key -> (expiry time, payload)
+        self._lock = threading.Lock()
+
+    def ttl_for(self, params):
+        """
+        Returns the time to live in seconds for the function requested by `params`.
+        """
+        return self.ttls.get(params.get("function"), self.default_ttl)
+
+    def get(self, params):
+        """
+        Looks up a cached payload for the query.
+
+        Args:
+            params (dict): The HTTP request params for the query.
+
+        Returns:
+            The cached JSON payload, or None if it is missing or has expired.
+        """
+        key = cache_key(params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def remaining(self, params):
+        """
+        Returns the seconds left before the cached payload for the query expires, or 0 if it is not cached.
+        Unlike get(), it does not count as a lookup or refresh the entry's place in the LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key(params))
+            if entry is None:
+                return 0
+            return max(0, entry[0] - self._clock())
+
+    def set(self, params, payload, ttl=None):
+        """
+        Stores a payload for the query, evicting the least recently used entries if the cache is full.
+        Payloads that hold an API error or rate limit notice are not stored.
+        """
+        if not is_cacheable(payload):
+            return
+        if ttl is None:
+            ttl = self.ttl_for(params)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        key = cache_key(params)
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dictionary with the size of the cache and its hit/miss counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class PersistentCache(object):
+    """
+    A cache of Alpha Vantage payloads stored in a SQLite file, shared by every worker process.
+
+    Each row keeps the payload with its expiry time, so a payload fetched by one worker is served to all
+    of them until it expires, including after a restart. Writes are single-statement transactions, and the
+    database runs in WAL mode so readers in other processes are never blocked by a writer. A daemon thread
+    deletes expired rows every `sweep_interval` seconds.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+        ttls (dict): Maps an API function name to its time to live in seconds.
+        default_ttl (int): The time to live used for functions missing from `ttls`.
+        sweep_interval (int): Seconds between sweeps of expired rows, or 0 to disable the sweeper.
+        hits (int): The number of lookups answered from the database in this process.
+        misses (int): The number of lookups that were missing or expired in this process.
+    """
+
+    def __init__(self, path, ttls, default_ttl=60, sweep_interval=300, clock=time.time):
+        self.path = path
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.sweep_interval = sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def _connection(self):
+        """
+        Returns this thread's connection to the cache database, creating the schema on first use.
+        The file is only created once the cache is actually used, so importing the app has no side effects.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY,"
+                " function TEXT,"
+                " payload TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_expires ON response_cache (expires)")
+            self._local.conn = conn
+            self._start_sweeper()
+        return conn
+
+    def _start_sweeper(self):
+        """
+        Starts the background thread that deletes expired rows, if it is not already running.
+        """
+        if self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, name="cache_sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                # another process may hold the write lock; the next sweep will catch up
+                pass
+
+    def ttl_for(self, params):
+        """
+        Returns the time to live in seconds for the function requested by `params`.
+        """
+        return self.ttls.get(params.get("function"), self.default_ttl)
+
+    def get(self, params):
+        """
+        Looks up a cached payload for the query.
+
+        Args:
+            params (dict): The HTTP request params for the query.
+
+        Returns:
+            tuple: The JSON payload and its remaining time to live in seconds, or None if it is missing or expired.
+        """
+        key = json.dumps(cache_key(params))
+        now = self._clock()
+        row = self._connection().execute(
+            "SELECT payload, expires FROM response_cache WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), row[1] - now
+
+    def remaining(self, params):
+        """
+        Returns the seconds left before the stored payload for the query expires, or 0 if it is not stored.
+        It does not count as a lookup.
+        """
+        now = self._clock()
+        row = self._connection().execute(
+            "SELECT expires FROM response_cache WHERE key = ?", (json.dumps(cache_key(params)),)
+        ).fetchone()
+        return max(0, row[0] - now) if row is not None else 0
+
+    def set(self, params, payload, ttl=None):
+        """
+        Stores a payload for the query, replacing any older copy in a single atomic statement.
+        Payloads that hold an API error or rate limit notice are not stored.
+        """
+        if not is_cacheable(payload):
+            return
+        if ttl is None:
+            ttl = self.ttl_for(params)
+        if ttl <= 0:
+            return
+        now = self._clock()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO response_cache (key, function, payload, created, expires) VALUES (?, ?, ?, ?, ?)",
+            (json.dumps(cache_key(params)), params.get("function"), json.dumps(payload), now, now + ttl),
+        )
+
+    def sweep(self):
+        """
+        Deletes every expired row.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        cursor = self._connection().execute("DELETE FROM response_cache WHERE expires <= ?", (self._clock(),))
+        return cursor.rowcount
+
+    def clear(self):
+        """
+        Removes every row and resets the counters.
+        """
+        self._connection().execute("DELETE FROM response_cache")
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def counters(self):
+        """
+        Returns a dictionary with this process's hit/miss counters, without counting the rows.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of rows and this process's hit/miss counters.
+        """
+        entries = self._connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
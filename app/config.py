@@ -15,7 +15,145 @@ class Config(object):
         The URI of the database to use. Retrieved from an environment variable if set, or a local SQLite database if not.
     SQLALCHEMY_TRACK_MODIFICATIONS : bool
         Whether to track modifications to objects and emit signals. Set to `False` for better performance.
+    ALPHA_VANTAGE_URL : str
+        The URL of the Alpha Vantage query endpoint, e.g. a local stub for offline benchmarks.
+    API_MAX_WORKERS : int
+        The maximum number of Alpha Vantage queries sent in parallel for a single request.
+    CACHE_TTL : dict
+        The time to live in seconds of cached Alpha Vantage payloads, per API function.
+    CACHE_DEFAULT_TTL : int
+        The time to live in seconds for API functions not listed in CACHE_TTL.
+    CACHE_MAX_ENTRIES : int
+        The maximum number of payloads kept in the in-process response cache.
+    CACHE_PERSISTENT : bool
+        Whether payloads are also kept in a SQLite cache shared by all worker processes.
+    CACHE_DATABASE_PATH : str
+        The path of the shared SQLite cache. Defaults to cache.db next to app.db.
+    CACHE_SWEEP_INTERVAL : int
+        Seconds between deletions of expired rows from the shared cache.
+    SERIES_STORE : bool
+        Whether fetched time series are kept as memory-mapped arrays and range queries answered from them.
+    SERIES_STORE_PATH : str
+        The directory of the time series files. Defaults to series/ next to app.db.
+    UPSTREAM_CALLS_PER_MINUTE : int
+        The Alpha Vantage per-minute call limit for the api key.
+    UPSTREAM_CALLS_PER_DAY : int
+        The Alpha Vantage per-day call limit for the api key.
+    UPSTREAM_LIMITS_SHARED : bool
+        Whether the call limits are tracked in CACHE_DATABASE_PATH, so they hold for all worker processes together.
+        When off, each process has its own buckets and N processes may send N times the limits.
+    UPSTREAM_MAX_WAIT : int
+        The longest in seconds a query may queue for the call limit before the user is told to retry.
+    HTTP_POOL_SIZE : int
+        The number of keep-alive connections kept open to Alpha Vantage.
+    HTTP_ASYNC_POOL_SIZE : int
+        The maximum number of open upstream connections under the ASGI entry point, where requests wait without a thread.
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT : float
+        The connect and read timeouts in seconds of each upstream request.
+    HTTP_RETRIES : int
+        The number of retries of an upstream request after a 5xx reply or connection error.
+    HTTP_BACKOFF : float
+        The base delay in seconds of the jittered exponential backoff between retries.
+    PREFETCH : bool
+        Whether the most popular queries are refreshed ahead of demand by a background thread.
+    PREFETCH_INTERVAL : int
+        Seconds between prefetch runs.
+    PREFETCH_TOP_N : int
+        The number of most popular queries kept warm.
+    PREFETCH_WINDOW : int
+        How far back in seconds the message history is mined for popular queries.
+    PREFETCH_LEAD : int
+        A popular query is refreshed when its payload expires within this many seconds.
+    PREFETCH_QUOTA_SHARE : float
+        The share of the per-minute and per-day call limits prefetching may use.
+    WATCHLIST_REFRESH_INTERVAL : int
+        Seconds between refreshes of the quotes shared by all watchlists.
+    WATCHLIST_MAX_SYMBOLS : int
+        The maximum number of tickers on a user's watchlist.
+    METRICS_TIMING_HEADER : bool
+        Whether chat replies carry a Server-Timing header with the time spent in each stage. Always on in debug mode.
+    PROFILING : bool
+        Whether the chat and history views can be profiled. When off, they run unwrapped.
+    PROFILING_TOKEN : str
+        The secret an admin sends in the X-Profile-Token header, or as ?profile=, to profile a request.
+    PROFILING_DIR : str
+        The folder the profiles are written to.
+    PROFILING_KEEP : int
+        The number of profiles kept, the oldest ones are deleted.
+    PROFILING_FORMAT : str
+        "pstats" for cProfile dumps, or "collapsed" for sampled stacks to draw flamegraphs from.
+    PROFILING_SAMPLE_INTERVAL : float
+        Seconds between stack samples in the "collapsed" format.
+    SLOW_QUERY_LOG : bool
+        Whether chat queries slower than SLOW_QUERY_THRESHOLD are appended to the slow-query log.
+    SLOW_QUERY_THRESHOLD : float
+        The duration in seconds from which a chat query is logged as slow.
+    SLOW_QUERY_LOG_PATH : str
+        The JSON lines file of the slow-query log.
+    ASGI_THREADS : int
+        Under the ASGI entry point, the worker threads for database access, cache lookups, tries for a call limit
+        token and requests served by Flask.
+    PERSIST_WRITE_BEHIND : bool
+        Whether chat turns are saved by a background thread after the response is sent, instead of before.
+    PERSIST_FLUSH_INTERVAL : float
+        With write-behind, the longest in seconds a chat turn waits before being saved.
+    PERSIST_BATCH_SIZE : int
+        With write-behind, the maximum number of chat turns saved per transaction.
+    HISTORY_PAGE_SIZE : int
+        The number of turns on each page of the history page.
+    HISTORY_MAX_PAGE_SIZE : int
+        The largest page size a client may ask for from /history/messages.
     """
     SECRET_KEY = os.environ.get('SECRET_KEY') or "temp"
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'app.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    ALPHA_VANTAGE_URL = os.environ.get('ALPHA_VANTAGE_URL') or "https://www.alphavantage.co/query"
+    API_MAX_WORKERS = int(os.environ.get('API_MAX_WORKERS') or 8)
+    CACHE_TTL = {
+        "GLOBAL_QUOTE": 5 * 60,
+        "TIME_SERIES_DAILY_ADJUSTED": 60 * 60,
+        "TIME_SERIES_WEEKLY_ADJUSTED": 24 * 60 * 60,
+        "TIME_SERIES_MONTHLY_ADJUSTED": 24 * 60 * 60,
+        "OVERVIEW": 24 * 60 * 60,
+    }
+    CACHE_DEFAULT_TTL = 60
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 1024)
+    CACHE_PERSISTENT = (os.environ.get('CACHE_PERSISTENT') or "1") == "1"
+    CACHE_DATABASE_PATH = os.environ.get('CACHE_DATABASE_PATH') or os.path.join(basedir, 'cache.db')
+    CACHE_SWEEP_INTERVAL = int(os.environ.get('CACHE_SWEEP_INTERVAL') or 300)
+    SERIES_STORE = (os.environ.get('SERIES_STORE') or "1") == "1"
+    SERIES_STORE_PATH = os.environ.get('SERIES_STORE_PATH') or os.path.join(basedir, 'series')
+    UPSTREAM_CALLS_PER_MINUTE = int(os.environ.get('UPSTREAM_CALLS_PER_MINUTE') or 5)
+    UPSTREAM_CALLS_PER_DAY = int(os.environ.get('UPSTREAM_CALLS_PER_DAY') or 500)
+    UPSTREAM_LIMITS_SHARED = (os.environ.get('UPSTREAM_LIMITS_SHARED') or "1") == "1"
+    UPSTREAM_MAX_WAIT = int(os.environ.get('UPSTREAM_MAX_WAIT') or 20)
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE') or 10)
+    HTTP_ASYNC_POOL_SIZE = int(os.environ.get('HTTP_ASYNC_POOL_SIZE') or 100)
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT') or 3.05)
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT') or 10)
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES') or 2)
+    HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF') or 0.5)
+    PREFETCH = (os.environ.get('PREFETCH') or "0") == "1"
+    PREFETCH_INTERVAL = int(os.environ.get('PREFETCH_INTERVAL') or 60)
+    PREFETCH_TOP_N = int(os.environ.get('PREFETCH_TOP_N') or 20)
+    PREFETCH_WINDOW = int(os.environ.get('PREFETCH_WINDOW') or 7 * 24 * 60 * 60)
+    PREFETCH_LEAD = int(os.environ.get('PREFETCH_LEAD') or 60)
+    PREFETCH_QUOTA_SHARE = float(os.environ.get('PREFETCH_QUOTA_SHARE') or 0.2)
+    WATCHLIST_REFRESH_INTERVAL = int(os.environ.get('WATCHLIST_REFRESH_INTERVAL') or 5 * 60)
+    WATCHLIST_MAX_SYMBOLS = int(os.environ.get('WATCHLIST_MAX_SYMBOLS') or 50)
+    METRICS_TIMING_HEADER = (os.environ.get('METRICS_TIMING_HEADER') or "0") == "1"
+    PROFILING = (os.environ.get('PROFILING') or "0") == "1"
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN') or ""
+    PROFILING_DIR = os.environ.get('PROFILING_DIR') or os.path.join(basedir, 'profiles')
+    PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP') or 50)
+    PROFILING_FORMAT = os.environ.get('PROFILING_FORMAT') or "pstats"
+    PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL') or 0.005)
+    SLOW_QUERY_LOG = (os.environ.get('SLOW_QUERY_LOG') or "1") == "1"
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD') or 1.0)
+    SLOW_QUERY_LOG_PATH = os.environ.get('SLOW_QUERY_LOG_PATH') or os.path.join(basedir, 'slow_queries.log')
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS') or 32)
+    PERSIST_WRITE_BEHIND = (os.environ.get('PERSIST_WRITE_BEHIND') or "0") == "1"
+    PERSIST_FLUSH_INTERVAL = float(os.environ.get('PERSIST_FLUSH_INTERVAL') or 1.0)
+    PERSIST_BATCH_SIZE = int(os.environ.get('PERSIST_BATCH_SIZE') or 50)
+    HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE') or 20)
+    HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HISTORY_MAX_PAGE_SIZE') or 100)
@@ -0,0 +1,82 @@
+from datetime import datetime
+from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Message
+
+
+def encode_cursor(timeStamp, id):
+    """
+    Encodes the position of a message in a user's history as an opaque cursor string.
+    """
+    return timeStamp.isoformat() + "_" + str(id)
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by encode_cursor().
+
+    Returns:
+        tuple: The (timeStamp, id) of the message, or None if the cursor is not valid.
+    """
+    try:
+        timeStamp, id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timeStamp), int(id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def history_page(userId, cursor=None, limit=20):
+    """
+    Returns one page of a user's chat history, newest first.
+
+    Pages are found by keyset pagination on (timeStamp, id): each page starts strictly after the last
+    message of the previous one, so the cost of a page does not grow with the length of the history.
+    Each entry pairs a message sent by the user with the bot's reply, which has the next id.
+
+    Args:
+        userId (int): The user whose history is returned.
+        cursor (tuple): The (timeStamp, id) of the last message of the previous page, or None for the first page.
+        limit (int): The maximum number of turns in the page.
+
+    Returns:
+        tuple: A list of (sent timestamp, sent content, reply timestamp, reply content) tuples, and the
+            cursor of the next page, or None if this is the last page.
+    """
+    query = history_query(userId, cursor, limit + 1)
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    turns = []
+    for id, sent_at, sent, replied_at, response in rows:
+        turns.append((format_timestamp(sent_at), sent, format_timestamp(replied_at), response or ""))
+    return turns, next_cursor
+
+
+def history_query(userId, cursor=None, limit=21):
+    """
+    Builds the keyset query used by history_page(): the user's sent messages before `cursor`, newest first,
+    each joined to its reply.
+    """
+    reply = aliased(Message)
+    query = (
+        select(Message.id, Message.timeStamp, Message.content, reply.timeStamp, reply.content)
+        .outerjoin(reply, and_(reply.userId == Message.userId, reply.id == Message.id + 1))
+        .where(Message.userId == userId, Message.isUser == True)
+    )
+    if cursor is not None:
+        timeStamp, id = cursor
+        query = query.where(or_(Message.timeStamp < timeStamp, and_(Message.timeStamp == timeStamp, Message.id < id)))
+    return query.order_by(Message.timeStamp.desc(), Message.id.desc()).limit(limit)
+
+
+def format_timestamp(timeStamp):
+    """
+    Formats a message timestamp to the second, as shown on the history page.
+    """
+    if timeStamp is None:
+        return ""
+    return timeStamp.strftime("%Y-%m-%d %H:%M:%S")
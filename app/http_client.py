@@ -0,0 +1,182 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class BaseHTTPClient(object):
+    """
+    The retry policy and counters shared by the blocking and the asyncio HTTP clients.
+
+    Attributes:
+        timeout (tuple): The (connect, read) timeouts in seconds.
+        retries (int): The number of retries after the first attempt.
+        backoff (float): The base delay in seconds of the exponential backoff.
+        requests_sent (int): The number of attempts made, including retries.
+        retries_made (int): The number of retries made.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5, latency_window=1000):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.requests_sent = 0
+        self.retries_made = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+
+    def _delay(self, attempt):
+        """
+        Returns the backoff delay before retry number `attempt` (starting at 0), with full jitter.
+        """
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _record(self, seconds, retry):
+        with self._lock:
+            self.requests_sent += 1
+            if retry:
+                self.retries_made += 1
+            self._latencies.append(seconds)
+
+    def stats(self):
+        """
+        Returns a dictionary with the attempt and retry counts and the latency of recent attempts in seconds.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {"requests": self.requests_sent, "retries": self.retries_made}
+        if latencies:
+            stats["latency_mean"] = sum(latencies) / len(latencies)
+            stats["latency_p50"] = latencies[len(latencies) // 2]
+            stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return stats
+
+
+class HTTPClient(BaseHTTPClient):
+    """
+    A pooled, keep-alive HTTP client for upstream API calls.
+
+    All requests share one requests.Session, so connections (and their TLS sessions) are reused between
+    calls instead of being opened for every query. Requests have connect/read timeouts, and 5xx replies and
+    connection errors are retried with jittered exponential backoff.
+
+    Attributes:
+        session (requests.Session): The pooled session used for every request.
+        timeout (tuple): The (connect, read) timeouts in seconds.
+        retries (int): The number of retries after the first attempt.
+        backoff (float): The base delay in seconds of the exponential backoff.
+        requests_sent (int): The number of attempts made, including retries.
+        retries_made (int): The number of retries made.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5,
+                 latency_window=1000):
+        super().__init__(connect_timeout, read_timeout, retries, backoff, latency_window)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None):
+        """
+        Sends a GET request, retrying on 5xx replies and connection errors.
+
+        Args:
+            url (str): The URL to request.
+            params (dict): The query string params.
+
+        Returns:
+            requests.Response: The last reply received. A 5xx reply is returned once the retries run out.
+
+        Raises:
+            requests.RequestException: If the last attempt failed without a reply (connection error or timeout).
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                reply = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(time.perf_counter() - start, attempt > 0)
+                if attempt >= self.retries:
+                    raise
+            else:
+                self._record(time.perf_counter() - start, attempt > 0)
+                if reply.status_code < 500 or attempt >= self.retries:
+                    return reply
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+
+class AsyncHTTPClient(BaseHTTPClient):
+    """
+    The asyncio counterpart of HTTPClient, used by the ASGI entry point (asgi.py).
+
+    Requests are sent with a pooled httpx.AsyncClient and follow the same timeouts and retry policy, but
+    waiting for a reply or a backoff delay does not hold a thread. The httpx client is bound to the event
+    loop it is first used in, so a new one is opened when it is used from another loop.
+
+    Attributes:
+        pool_size (int): The maximum number of open connections.
+        transport (httpx.AsyncBaseTransport): The transport used instead of the network, for tests.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5,
+                 latency_window=1000, transport=None):
+        super().__init__(connect_timeout, read_timeout, retries, backoff, latency_window)
+        self.pool_size = pool_size
+        self.transport = transport
+        self._client = None
+        self._loop = None
+
+    def _session(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+            self._client = httpx.AsyncClient(limits=limits, timeout=timeout, transport=self.transport)
+            self._loop = loop
+        return self._client
+
+    async def get(self, url, params=None):
+        """
+        Sends a GET request, retrying on 5xx replies and connection errors.
+
+        Args:
+            url (str): The URL to request.
+            params (dict): The query string params.
+
+        Returns:
+            httpx.Response: The last reply received. A 5xx reply is returned once the retries run out.
+
+        Raises:
+            httpx.TransportError: If the last attempt failed without a reply (connection error or timeout).
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                reply = await self._session().get(url, params=params)
+            except httpx.TransportError:
+                self._record(time.perf_counter() - start, attempt > 0)
+                if attempt >= self.retries:
+                    raise
+            else:
+                self._record(time.perf_counter() - start, attempt > 0)
+                if reply.status_code < 500 or attempt >= self.retries:
+                    return reply
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def close(self):
+        """
+        Closes the connections of the httpx client, if one was opened in the running loop.
+        """
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+
+# keywords.json is found relative to the package, so the app works whatever directory it is started from
+KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "keywords.json")
+
+
+class KeywordSnapshot(object):
+    """
+    One loaded version of the keyword file, with the tables derived from it.
+
+    Attributes:
+        data (dict): The contents of keywords.json.
+        mtime (float): The modification time of the file when it was loaded.
+        version (int): Increases by one each time the file is reloaded.
+    """
+
+    def __init__(self, data, mtime, version):
+        self.data = data
+        self.mtime = mtime
+        self.version = version
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def derive(self, builder):
+        """
+        Returns builder(data), building it once per snapshot. Used for tables compiled from the keywords.
+        """
+        value = self._derived.get(builder)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(builder)
+                if value is None:
+                    value = builder(self.data)
+                    self._derived[builder] = value
+        return value
+
+
+class KeywordRegistry(object):
+    """
+    The single loaded copy of keywords.json, shared by the parser and the response formatter.
+
+    The file is read once at startup. Afterwards its modification time is checked at most every
+    `check_interval` seconds, and a changed file is loaded into a new snapshot that replaces the old one
+    in a single assignment, so a request never sees a half-loaded file. If the new file cannot be read or
+    is not valid JSON, the previous snapshot stays in use.
+
+    Attributes:
+        path (str): The path of the keyword file.
+        check_interval (float): The minimum number of seconds between checks of the file's modification time.
+        reloads (int): The number of times the file was reloaded after startup.
+    """
+
+    def __init__(self, path=KEYWORDS_PATH, check_interval=2.0, clock=time.monotonic):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = self._load(0)
+        self._checked = clock()
+
+    def _load(self, version):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, 'r') as f:
+            return KeywordSnapshot(json.load(f), mtime, version)
+
+    def snapshot(self):
+        """
+        Returns the current KeywordSnapshot, reloading the file first if it changed.
+        """
+        snapshot = self._snapshot
+        now = self._clock()
+        if now - self._checked < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return self._snapshot
+            self._checked = now
+            try:
+                if os.stat(self.path).st_mtime != self._snapshot.mtime:
+                    self._snapshot = self._load(self._snapshot.version + 1)
+                    self.reloads += 1
+            except (OSError, ValueError):
+                # the file is missing or mid-write; keep serving the last good version
+                pass
+            return self._snapshot
+
+    def data(self):
+        """
+        Returns the contents of the current keyword file.
+        """
+        return self.snapshot().data
+
+    def derive(self, builder):
+        """
+        Returns builder(data) for the current keyword file, rebuilt only when the file changes.
+        """
+        return self.snapshot().derive(builder)
+
+
+keyword_registry = KeywordRegistry()
@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context
+
+## Lightweight instrumentation: counters and histograms kept in process and rendered in the Prometheus text
+## format by the /metrics route. Stage timings of the current request are also kept in `g`, so they can be
+## sent back in a Server-Timing header when debugging.
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    """
+    Renders a tuple of (name, value) pairs as a Prometheus label set, e.g. {stage="parse"}.
+    """
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append('{}="{}"'.format(name, value))
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter(object):
+    """
+    A monotonically increasing count per label set.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        key = tuple(zip(self.labelnames, labelvalues))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(tuple(zip(self.labelnames, labelvalues)), 0)
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.help), "# TYPE {} counter".format(self.name)]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append("{}{} {}".format(self.name, format_labels(labels), value))
+        return lines
+
+
+class Histogram(object):
+    """
+    A distribution of observed values in cumulative buckets per label set, as Prometheus expects.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}     # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        key = tuple(zip(self.labelnames, labelvalues))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labelvalues):
+        with self._lock:
+            counts = self._values.get(tuple(zip(self.labelnames, labelvalues)))
+            return sum(counts[:-1]) if counts else 0
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.help), "# TYPE {} histogram".format(self.name)]
+        with self._lock:
+            for labels, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append("{}_bucket{} {}".format(self.name, format_labels(labels + (("le", bound),)), cumulative))
+                lines.append("{}_sum{} {}".format(self.name, format_labels(labels), counts[-1]))
+                lines.append("{}_count{} {}".format(self.name, format_labels(labels), cumulative))
+        return lines
+
+
+class Metrics(object):
+    """
+    The metrics of this process.
+
+    Attributes:
+        stages (Histogram): The time spent in each stage of a chat request (parse, upstream, format, save).
+        requests (Histogram): The duration of every request, by route and method.
+        upstream_calls (Counter): Upstream calls by API function and outcome (HTTP status, "error" or "quota").
+    """
+
+    def __init__(self):
+        self.stages = Histogram("stockbot_stage_duration_seconds", "Time spent in each stage of a chat request.",
+                                ("stage",))
+        self.requests = Histogram("stockbot_request_duration_seconds", "Duration of HTTP requests.",
+                                  ("route", "method"))
+        self.upstream_calls = Counter("stockbot_upstream_calls_total", "Calls sent to Alpha Vantage by outcome.",
+                                      ("function", "outcome"))
+        self._collectors = []
+
+    def collector(self, function):
+        """
+        Registers a function called on every scrape. It returns (name, type, help, samples) tuples, where samples
+        is a list of (labels, value) pairs and labels a tuple of (name, value) pairs. Usable as a decorator.
+        """
+        self._collectors.append(function)
+        return function
+
+    @contextmanager
+    def stage(self, name, timings=None):
+        """
+        Times the enclosed block as a stage of the current request. The (stage, seconds) pair is appended to
+        `timings` if given, e.g. outside of a Flask request, or else to the stage timings of the request.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages.observe(elapsed, name)
+            if timings is not None:
+                timings.append((name, elapsed))
+            elif has_request_context():
+                g.setdefault("stage_timings", []).append((name, elapsed))
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = self.stages.render() + self.requests.render() + self.upstream_calls.render()
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append("# HELP {} {}".format(name, help))
+                lines.append("# TYPE {} {}".format(name, kind))
+                for labels, value in samples:
+                    lines.append("{}{} {}".format(name, format_labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(timings):
+    """
+    Renders (stage, seconds) pairs as a Server-Timing header value, with durations in milliseconds.
+    A stage run several times in a request is reported once with its total.
+    """
+    totals = {}
+    for name, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join("{};dur={:.2f}".format(name, elapsed * 1e3) for name, elapsed in totals.items())
+
+
+metrics = Metrics()
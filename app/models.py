@@ -2,7 +2,8 @@ from app import db
 from app import login
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from sqlalchemy import select, text
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
 class User(UserMixin, db.Model):
@@ -58,11 +59,17 @@ class Message(db.Model):
     # Every time the user initiates a new conversation, the conversationId increments by 1.    
     # Therefore a unique message can be fetched purely by a primary key of a combined userId, conversationId and id.
     # When loading the page, the user will be promted to choose a conversation or start a new one. 
+    # The key starts with userId, since every query on this table is for a single user.
+    __table_args__ = (
+        db.PrimaryKeyConstraint("userId", "id", "conversationId"),
+        db.Index("ix_message_userId_isUser_timeStamp", "userId", "isUser", "timeStamp", "id"),
+        db.Index("ix_message_userId_conversationId", "userId", "conversationId"),
+    )
                      
-    id = db.Column(db.Integer, primary_key=True)
-    conversationId = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False)
+    conversationId = db.Column(db.Integer, nullable=False)
     parentId = db.Column(db.String(36))
-    userId = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    userId = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     timeStamp = db.Column(db.DateTime)
     content = db.Column(db.Text)
     isUser = db.Column(db.Boolean)
@@ -70,27 +77,15 @@ class Message(db.Model):
     def setVariableFields(self, userId):
         '''
         Sets the fields which may change for each userId: id, parentId, timeStamp.
+        The id is taken from the user's MessageCounter row, see MessageCounter.allocate().
         '''
         self.userId = userId
-    
-        # Get the maximum id and conversationId for the user
-        currentIdObject = db.session.execute(text("SELECT MAX(id) FROM Message WHERE userId==" + str(userId) + ";"))
-        currentId = currentIdObject.fetchone()[0]
-        
-        currentConvIdObject = db.session.execute(text("SELECT MAX(conversationId) FROM Message WHERE userId==" + str(userId) + ";"))
-        currentConvId = currentConvIdObject.fetchone()[0]
+        currentId, currentConvId = MessageCounter.allocate(userId)
 
         # Set the parentId, id, timeStamp, and conversationId fields
-        if currentId is not None:
-            self.parentId = currentId
-            self.id = currentId + 1
-        else:
-            self.parentId = 0
-            self.id = 1
-        if currentConvId is not None:       ## logic might need fixing depending on handling of conversations
-            self.conversationId = currentConvId
-        else:
-            self.conversationId = 1
+        self.parentId = currentId
+        self.id = currentId + 1
+        self.conversationId = currentConvId      ## logic might need fixing depending on handling of conversations
         self.timeStamp = datetime.now()
 
     def __repr__(self):
@@ -112,4 +107,130 @@ class Message(db.Model):
         """
         Sets the isUser attribute of the message to False.
         """
-        self.isUser = False
\ No newline at end of file
+        self.isUser = False
+
+
+class MessageCounter(db.Model):
+    """
+    Holds the last message id and conversationId allocated to each user.
+
+    Allocating a message id is a single UPDATE of the user's row, which takes the row's write lock until the
+    transaction ends, so concurrent requests from one user always get different ids. This replaces the two
+    SELECT MAX() scans over the user's messages that were needed for every message.
+
+    Attributes:
+        userId (int): The user the counter belongs to.
+        lastId (int): The id of the user's most recent message, 0 if they have none.
+        lastConversationId (int): The user's current conversationId.
+    """
+    userId = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    lastId = db.Column(db.Integer, nullable=False, default=0)
+    lastConversationId = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return '<MessageCounter {} {}>'.format(self.userId, self.lastId)
+
+    @staticmethod
+    def allocate(userId, count=1):
+        """
+        Takes the next `count` message ids for a user.
+
+        The counter row is updated in the current transaction, which is committed along with the message.
+        A user without a counter row (e.g. a new user) gets one, seeded from their existing messages.
+
+        Args:
+            userId (int): The user the message belongs to.
+            count (int): The number of ids to take, e.g. 2 for a message and its reply.
+
+        Returns:
+            tuple: The id before the first one taken (0 if the user had no messages) and their current conversationId.
+        """
+        increment = update(MessageCounter).where(MessageCounter.userId == userId).values(lastId=MessageCounter.lastId + count)
+        if db.session.execute(increment).rowcount == 0:
+            # first message since the counter table was created: seed the row, unless another request just did
+            try:
+                with db.session.begin_nested():
+                    row = db.session.execute(text(
+                        "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(conversationId), 1) FROM message WHERE userId = :userId"
+                    ), {"userId": userId}).fetchone()
+                    db.session.add(MessageCounter(userId=userId, lastId=row[0], lastConversationId=row[1]))
+            except IntegrityError:
+                pass
+            db.session.execute(increment)
+
+        counter = db.session.execute(
+            select(MessageCounter.lastId, MessageCounter.lastConversationId).where(MessageCounter.userId == userId)
+        ).fetchone()
+        return counter[0] - count, counter[1]
+
+
+class WatchlistItem(db.Model):
+    """
+    A stock ticker on a user's watchlist.
+
+    The quotes of every watched ticker are refreshed together for all users (see app.watchlist), so the table
+    is indexed on symbol for the query that collects the distinct tickers.
+
+    Attributes:
+        userId (int): The user the watchlist belongs to.
+        symbol (str): The normalized stock ticker, e.g. "AAPL".
+        addedAt (datetime): When the ticker was added.
+    """
+    __table_args__ = (
+        db.PrimaryKeyConstraint("userId", "symbol"),
+        db.Index("ix_watchlist_item_symbol", "symbol"),
+    )
+
+    userId = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    symbol = db.Column(db.String(16), nullable=False)
+    addedAt = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return '<WatchlistItem {} {}>'.format(self.userId, self.symbol)
+
+    @staticmethod
+    def symbolsFor(userId):
+        """
+        Returns the tickers on a user's watchlist, in the order they were added.
+        """
+        rows = db.session.execute(
+            select(WatchlistItem.symbol).where(WatchlistItem.userId == userId)
+            .order_by(WatchlistItem.addedAt, WatchlistItem.symbol)
+        )
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def allSymbols():
+        """
+        Returns every ticker on at least one watchlist, each once.
+        """
+        rows = db.session.execute(select(WatchlistItem.symbol).distinct().order_by(WatchlistItem.symbol))
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def watch(userId, symbols):
+        """
+        Adds tickers to a user's watchlist, skipping those already on it. The caller commits.
+
+        Returns:
+            list: The tickers that were added.
+        """
+        present = set(WatchlistItem.symbolsFor(userId))
+        added = []
+        for symbol in symbols:
+            if symbol not in present:
+                present.add(symbol)
+                added.append(symbol)
+                db.session.add(WatchlistItem(userId=userId, symbol=symbol))
+        return added
+
+    @staticmethod
+    def unwatch(userId, symbols):
+        """
+        Removes tickers from a user's watchlist. The caller commits.
+
+        Returns:
+            int: The number of tickers removed.
+        """
+        removed = WatchlistItem.query.filter(WatchlistItem.userId == userId, WatchlistItem.symbol.in_(symbols))
+        return removed.delete(synchronize_session=False)
@@ -1,6 +1,7 @@
-import json
 import os
+from enum import IntEnum
 from dotenv import load_dotenv
+from app.keywords import keyword_registry
 
 # Load the environment variables from the .env file
 load_dotenv()
@@ -8,17 +9,233 @@ load_dotenv()
 # Retrieve the Alpha Vantage API key from the environment variables
 stockkey = os.getenv("AV_API")
 
-# Load the JSON file containing the search keywords for the app
-# Note that the JSON values have been stripped of whitespace for easier parsing
-with open(os.path.join(os.getcwd(), "app", "static", "keywords.json"), 'r') as f:
-    keyword_data = json.load(f)
+
+
+class QueryError(IntEnum):
+    """
+    Error codes for user input that cannot be turned into API calls.
+    The values of the request_constructor() errors are unchanged, so they still compare equal to -1, -2 and -3.
+    """
+    INVALID_KEYWORDS = -1       # invalid keywords mixed into call
+    WRONG_KEYWORD_COUNT = -2    # argument count not correct !=2
+    NO_KEYWORDS = -3            # call contained no keywords
+    INVALID_FORMAT = -4         # input of the wrong format, has to be "keywords: tickers"
+
+
+## The tables below are compiled from keywords.json once per version of the file (see app.keywords),
+## so parsing a request is a handful of set and dict lookups instead of list scans and nested if/elif chains.
+## Note that the JSON values have been stripped of whitespace for easier parsing.
+
+# API function for each selector, in the order the selectors appear in keywords.json
+TIME_SELECTOR_FUNCTIONS = ["GLOBAL_QUOTE", "TIME_SERIES_DAILY_ADJUSTED"]
+RANGE_SELECTOR_FUNCTIONS = ["TIME_SERIES_DAILY_ADJUSTED", "TIME_SERIES_WEEKLY_ADJUSTED", "TIME_SERIES_MONTHLY_ADJUSTED"]
+
+# Query type of the watchlist commands, which are answered from the shared watchlist snapshot (see app.watchlist)
+WATCHLIST_QUERY_TYPE = 5
+
+
+class QueryRule(object):
+    """
+    An entry of the dispatch table: how to build the API calls for a keyword or selector.
+
+    Attributes:
+        query_type (int): The query type passed to format_response(): 1 keywords, 2 time selector, 3 range selector,
+            4 comparison, 5 watchlist.
+        function (str): The Alpha Vantage function called for each ticker, or None if the query makes no calls.
+    """
+    __slots__ = ("query_type", "function")
+
+    def __init__(self, query_type, function):
+        self.query_type = query_type
+        self.function = function
+
+
+def compile_keywords(keyword_data):
+    """
+    Compiles the keyword file into the lookup sets and dispatch tables used by the parser.
+
+    Args:
+        keyword_data (dict): The contents of keywords.json.
+
+    Returns:
+        dict: The compiled tables:
+            - "keywords": frozenset of the "keywords" query keywords, "options" the same in file order.
+            - "modifiable": frozenset of the keywords that take a selector.
+            - "selectors": dict from selector to its QueryRule.
+            - "comparison": frozenset of the keywords that compare tickers over a range selector.
+            - "comparisons": dict from range selector to the QueryRule of comparison queries.
+            - "watchlist": frozenset of the watchlist commands, "show" the one that shows the watchlist.
+            - "overview": the QueryRule of "keywords" queries.
+    """
+    selectors = {}
+    for selector, function in zip(keyword_data["timeSelector"], TIME_SELECTOR_FUNCTIONS):
+        selectors[selector] = QueryRule(2, function)
+    comparisons = {}
+    for selector, function in zip(keyword_data["rangeSelector"], RANGE_SELECTOR_FUNCTIONS):
+        selectors[selector] = QueryRule(3, function)
+        comparisons[selector] = QueryRule(4, function)
+
+    return {
+        "keywords": frozenset(keyword_data["keywords"]),
+        "options": tuple(keyword_data["keywords"]),
+        "modifiable": frozenset(keyword_data["modifiableKeywords"]),
+        "selectors": selectors,
+        "comparison": frozenset(keyword_data.get("comparisonKeywords", [])),
+        "comparisons": comparisons,
+        "watchlist": frozenset(keyword_data.get("watchlistKeywords", [])),
+        "show": keyword_data.get("watchlistKeywords", [None, None, None])[2],
+        "overview": QueryRule(1, "OVERVIEW"),
+    }
+
+
+def current_tables():
+    """
+    Returns the tables compiled from the current keyword file, recompiled only when the file changes.
+    """
+    return keyword_registry.derive(compile_keywords)
+
+
+def split_input(user_input):
+    """
+    Removes whitespace from the input and splits it into its keyword and ticker parts.
+
+    Returns:
+        tuple: The keyword part and the ticker part (without the optional curly braces), or None if the
+            input does not contain exactly one ":".
+    """
+    keyword_part, colon, ticker_part = user_input.replace(" ", "").partition(":")
+    if not colon or ":" in ticker_part:
+        return None
+    return keyword_part, ticker_part.strip("{}")
+
+
+class Query(object):
+    """
+    A parsed user request.
+
+    Attributes:
+        keywords (list): The keywords before the ":".
+        tickers (list): The stock tickers after the ":".
+        query_type (int): 1 for "keywords" queries, 2 for time selector, 3 for range selector, 4 for comparison
+            and 5 for watchlist queries.
+        selector: The option matrix of a "keywords" query, or the selector keyword of a modifiable query.
+        queries (list): The HTTP request params for each ticker.
+        error (QueryError): The reason the input could not be parsed, or None if it was parsed.
+    """
+    __slots__ = ("keywords", "tickers", "query_type", "selector", "queries", "error")
+
+    def __init__(self, keywords=None, tickers=None, query_type=None, selector=None, queries=None, error=None):
+        self.keywords = keywords
+        self.tickers = tickers
+        self.query_type = query_type
+        self.selector = selector
+        self.queries = queries
+        self.error = error
+
+    def __repr__(self):
+        return '<Query {} {} {}>'.format(self.keywords, self.tickers, self.error)
+
+
+def compile_query(user_input, tables=None):
+    """
+    Parses a user's input into a Query in a single pass, with the HTTP request params for every ticker.
+
+    Args:
+        user_input (str): The message sent by the user, e.g. "price, lastweek : aapl, tsla".
+        tables (dict): Compiled keyword tables from compile_keywords(). Defaults to the app's keywords.
+
+    Returns:
+        Query: The parsed query. Its `error` is set if the input was invalid.
+    """
+    if tables is None:
+        tables = current_tables()
+
+    parts = split_input(user_input)
+    if parts is None:
+        # the watchlist is shown with its keyword alone, e.g. "watchlist"
+        if user_input.replace(" ", "") == tables["show"]:
+            return build_query(Query([tables["show"]], []), tables)
+        return Query(error=QueryError.INVALID_FORMAT)
+
+    return build_query(Query(parts[0].split(","), parts[1].split(",")), tables)
+
+
+def build_query(query, tables=None):
+    """
+    Fills in the query type, selector and HTTP request params of a Query from its keywords and tickers.
+
+    Returns:
+        Query: The same query, with `error` set if the keywords are invalid.
+    """
+    if tables is None:
+        tables = current_tables()
+    keywords = query.keywords
+    first = keywords[0]
+
+    if first == "overview" or first in tables["keywords"]:
+        # Construct the requests for "keywords" calls
+        overview = first == "overview"
+        if not overview and not tables["keywords"].issuperset(keywords):
+            query.error = QueryError.INVALID_KEYWORDS
+            return query
+        rule = tables["overview"]
+        # constructing a true/false matrix for all the options
+        if overview:
+            query.selector = [1] * len(tables["options"])
+        else:
+            query.selector = [1 if option in keywords else 0 for option in tables["options"]]
+
+    elif first in tables["modifiable"]:
+        # constructs requests for "modifiableKeywords calls"
+        if len(keywords) != 2:
+            query.error = QueryError.WRONG_KEYWORD_COUNT
+            return query
+        rule = tables["selectors"].get(keywords[1])
+        if rule is None:
+            # the subsequent arguements were not valid
+            query.error = QueryError.INVALID_KEYWORDS
+            return query
+        query.selector = keywords[1]
+
+    elif first in tables["comparison"]:
+        # comparison calls take a range selector, e.g. "compare, lastyear : aapl, msft"
+        if len(keywords) != 2:
+            query.error = QueryError.WRONG_KEYWORD_COUNT
+            return query
+        rule = tables["comparisons"].get(keywords[1])
+        if rule is None:
+            query.error = QueryError.INVALID_KEYWORDS
+            return query
+        query.selector = keywords[1]
+
+    elif first in tables["watchlist"]:
+        # watchlist commands make no calls of their own, e.g. "watch : aapl, msft" or "watchlist"
+        query.tickers = [ticker for ticker in query.tickers if ticker]
+        if len(keywords) != 1:
+            query.error = QueryError.WRONG_KEYWORD_COUNT
+        elif first != tables["show"] and not query.tickers:
+            query.error = QueryError.INVALID_FORMAT
+        else:
+            query.query_type = WATCHLIST_QUERY_TYPE
+            query.selector = first
+            query.queries = []
+        return query
+
+    else:
+        query.error = QueryError.NO_KEYWORDS
+        return query
+
+    query.query_type = rule.query_type
+    function = rule.function
+    query.queries = [{"function": function, "symbol": ticker, "apikey": stockkey} for ticker in query.tickers]
+    return query
 
 
 def parse_input(user_input):
     """
     This function takes a string input from the user and returns a tuple containing a list of keywords and a list of 
     stock tickers. The input format must be 'keywords: {stock tickers}', with keywords separated by commas and stock 
-    tickers separated by commas and enclosed in curly braces. Whitespaces in the input string will be removed.
+    tickers separated by commas and optionally enclosed in curly braces. Whitespaces in the input string will be removed.
 
     Args:
     - user_input (str): a string input from the user
@@ -26,22 +243,20 @@ def parse_input(user_input):
     Returns:
     - tuple: a tuple containing a list of keywords and a list of stock tickers
     """
-
-    # Remove whitespaces from user_input
-    user_input = user_input.replace(" ", "")
-
-    # Splitting the user input by ":" to separate the string
-    split_input = user_input.split(":")
-    if len(split_input) != 2:
+    parts = split_input(user_input)
+    if parts is None:
         return -1       # input of the wrong format, has to be "keywords: tickers"
 
-    # Get the keyword parts from split_input
-    keyword_list = split_input[0].split(",")
+    return parts[0].split(","), parts[1].split(",")
 
-    # Split the modified string by comma to create stock_name_list
-    stock_name_list = split_input[1].split(",")
 
-    return keyword_list, stock_name_list
+def selector_queries(keyword_list, stock_name_list, query_type):
+    # shared by time_selector_constructor() and range_selector_constructor()
+    selector = keyword_list[1]
+    rule = current_tables()["selectors"].get(selector)
+    if rule is None or rule.query_type != query_type:
+        return [], selector
+    return [{"function": rule.function, "symbol": ticker, "apikey": stockkey} for ticker in stock_name_list], selector
 
 
 def time_selector_constructor(keyword_list, stock_name_list):
@@ -56,33 +271,7 @@ def time_selector_constructor(keyword_list, stock_name_list):
     - queries (list): A list of HTTP request params
     - selector (str): The time selector keyword
     '''
-    queries = []
-
-    # get the time selector
-    selector = keyword_list[1]
-    
-    # check the selected time selector
-    if selector == keyword_data["timeSelector"][0]:     # "current"
-        # add GLOBAL_QUOTE query for each stock
-        for ticker in stock_name_list:
-            params = {
-                "function": "GLOBAL_QUOTE",
-                "symbol": ticker,
-                "apikey": stockkey
-            }
-            queries.append(params)
-    elif selector == keyword_data["timeSelector"][1]:   # "yesterday"
-        # add TIME_SERIES_DAILY_ADJUSTED query for each stock
-        for ticker in stock_name_list:
-            params = {
-                "function": "TIME_SERIES_DAILY_ADJUSTED",
-                "symbol": ticker,
-                "apikey": stockkey
-            }
-            queries.append(params)
-            
-    # return the list of HTTP request params and the selected time selector
-    return queries, selector
+    return selector_queries(keyword_list, stock_name_list, 2)
 
 
 def range_selector_constructor(keyword_list, stock_name_list):
@@ -96,42 +285,7 @@ def range_selector_constructor(keyword_list, stock_name_list):
     Returns:
         A tuple containing a list of constructed HTTP request params and the range selector keyword.
     """
-    
-    queries = []
-    # get the range selector
-    selector = keyword_list[1]
-    
-    # "last week" selector
-    if selector == keyword_data["rangeSelector"][0]:    
-        for ticker in stock_name_list:
-            params = {
-                "function": "TIME_SERIES_DAILY_ADJUSTED",
-                "symbol": ticker,
-                "apikey": stockkey
-            }
-            queries.append(params)
-    
-    # "last month" selector
-    elif selector == keyword_data["rangeSelector"][1]:  
-        for ticker in stock_name_list:
-            params = {
-                "function": "TIME_SERIES_WEEKLY_ADJUSTED",
-                "symbol": ticker,
-                "apikey": stockkey
-            }
-            queries.append(params)
-    
-    # "last year" selector
-    elif selector == keyword_data["rangeSelector"][2]:  
-        for ticker in stock_name_list:
-            params = {
-                "function": "TIME_SERIES_MONTHLY_ADJUSTED",
-                "symbol": ticker,
-                "apikey": stockkey
-            }
-            queries.append(params)
-    
-    return queries, selector
+    return selector_queries(keyword_list, stock_name_list, 3)
 
     
 def request_constructor(keyword_list, stock_name_list):
@@ -149,75 +303,18 @@ def request_constructor(keyword_list, stock_name_list):
                 - 1: "keywords" query.
                 - 2: "timeSelector" query.
                 - 3: "rangeSelector" query.
-            - selector (str): A string representing the time/range modifier for the query type.
+                - 4: "comparisonKeywords" query.
+                - 5: "watchlistKeywords" query.
+            - selector (str): A string representing the time/range modifier (or watchlist command) for the query type.
 
     Raises:
-        int: An integer error code indicating the type of error that occurred:
+        int: A QueryError code indicating the type of error that occurred:
             - -1: Invalid keywords mixed into call.
             - -2: Incorrect argument count.
             - -3: Call contained no keywords.
+            - -4: A watchlist command without tickers.
     """
-
-    # array containing queries for each stock ticker
-    queries = []
-
-    # Check if the user request is "overview" to construct the overview request
-    overview = keyword_list[0] == "overview"
-    if keyword_list[0] in keyword_data["keywords"] or overview:
-        if not overview:
-            # Ensure all keywords are valid
-            for keyword in keyword_list:
-                if keyword not in keyword_data["keywords"]:
-                    # -1 error means invalid keywords mixed into call
-                    return -1
-    # Construct the requests for "keywords" calls
-        for ticker in stock_name_list:
-            params = {
-                "function": "OVERVIEW",
-                "symbol": ticker,
-                "apikey": stockkey
-            }
-            queries.append(params)
-        query_type = 1          # "keywords" query will be 1
-
-        # constructing a true/false matrix for all the options
-        option_matrix = []
-        for keyword in keyword_data["keywords"]:
-            if keyword in keyword_list or overview:
-                option_matrix.append(1)
-            else:
-                option_matrix.append(0)
-
-        return queries, query_type, option_matrix
-
-    # constructs requests for "modifiableKeywords calls"
-    elif keyword_list[0] in keyword_data["modifiableKeywords"]:
-        if len(keyword_list) != 2:
-            # -2 error means argument count not correct !=2
-            return -2
-        if(keyword_list[1] in keyword_data["timeSelector"]):
-            # constructs HTTP request parameters for "timeSelector" call
-            queries, selector = time_selector_constructor(keyword_list, stock_name_list)
-            query_type = 2      # time selector query will be type 2
-        elif(keyword_list[1] in keyword_data["rangeSelector"]):
-            # constructs HTTP request parameters for "rangeSelector" call
-            queries, selector = range_selector_constructor(keyword_list, stock_name_list)
-            query_type = 3      # range selector query will be type 3
-        else:
-            # the subsequent arguements were not valid
-            return -1
-        return queries, query_type, selector
-
-    # if call contained no keywords 
-    else:
-        return -3
-
-    
-
-
-"""## Testing - python3 app/parsing.py
-string = "price, last week : {APPL,TSLA}"
-a, b = parse_input(string)
-query = request_constructor(a, b)
-print(a, b)
-print(query)"""
\ No newline at end of file
+    query = build_query(Query(keyword_list, stock_name_list))
+    if query.error is not None:
+        return query.error
+    return query.queries, query.query_type, query.selector
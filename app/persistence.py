@@ -0,0 +1,178 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from app import app, db
+from app.models import Message, MessageCounter
+
+
+def save_turn(userId, user_content, bot_content, sent_at=None, replied_at=None):
+    """
+    Saves a chat turn, the user's message and the bot's reply, in a single transaction.
+
+    Both message ids are taken from the user's counter in one update, so the reply always directly
+    follows the message it answers.
+
+    Args:
+        userId (int): The user the turn belongs to.
+        user_content (str): The message sent by the user.
+        bot_content (str): The reply sent by the bot.
+        sent_at (datetime): When the user's message was received. Defaults to now.
+        replied_at (datetime): When the reply was sent. Defaults to now.
+    """
+    db.session.add_all(build_turn(userId, user_content, bot_content, sent_at, replied_at))
+    db.session.commit()
+
+
+def build_turn(userId, user_content, bot_content, sent_at=None, replied_at=None):
+    """
+    Creates the two Message objects of a chat turn, allocating their ids in the current transaction.
+
+    Returns:
+        list: The user's message and the bot's reply, ready to be added to the session.
+    """
+    previousId, conversationId = MessageCounter.allocate(userId, count=2)
+    now = datetime.now()
+
+    sent = Message(content=user_content, userId=userId, conversationId=conversationId,
+                   id=previousId + 1, parentId=previousId, timeStamp=sent_at or now)
+    sent.setUser()
+    reply = Message(content=bot_content, userId=userId, conversationId=conversationId,
+                    id=previousId + 2, parentId=previousId + 1, timeStamp=replied_at or now)
+    reply.setResponse()
+    return [sent, reply]
+
+
+# Put on the queue by flush() to wake the background thread, so it writes its batch without waiting
+_FLUSH = object()
+
+
+class WriteBehindQueue(object):
+    """
+    Saves chat turns from a background thread so the HTTP response does not wait for the database.
+
+    Turns are queued by record() and written by a daemon thread in batches of up to `batch_size` turns per
+    transaction, at least every `flush_interval` seconds. flush() makes the thread write what it holds straight
+    away and waits until every recorded turn is saved; it is also run by an atexit hook, so a clean shutdown
+    loses nothing, but a crash can lose up to one interval of turns.
+
+    Attributes:
+        flush_interval (float): The longest a queued turn waits before being written, in seconds.
+        batch_size (int): The maximum number of turns written per transaction.
+        written (int): The number of turns written.
+        failed (int): The number of turns that could not be written.
+    """
+
+    def __init__(self, flush_interval=1.0, batch_size=50):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._unsaved = 0       # turns recorded but not written yet, queued or in the batch being collected
+        self._condition = threading.Condition()
+        self._flushing = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write_behind", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush, 30)
+
+    def record(self, userId, user_content, bot_content, sent_at=None):
+        """
+        Queues a chat turn to be saved. The timestamps are taken now, not when the turn is written.
+        """
+        self._start()
+        with self._condition:
+            self._unsaved += 1
+        self._queue.put((userId, user_content, bot_content, sent_at or datetime.now(), datetime.now()))
+
+    def pending(self):
+        """
+        Returns the number of turns recorded but not written yet.
+        """
+        with self._condition:
+            return self._unsaved
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self):
+        # wait for a first turn, then up to flush_interval for the batch to fill, unless a flush is requested
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                timeout = None
+            elif self._flushing.is_set():
+                timeout = 0
+            else:
+                timeout = deadline - time.monotonic()
+            try:
+                turn = self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if turn is _FLUSH:
+                if batch:
+                    deadline = time.monotonic()
+                continue
+            batch.append(turn)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _write(self, batch):
+        with app.app_context():
+            try:
+                for turn in batch:
+                    db.session.add_all(build_turn(*turn))
+                db.session.commit()
+                self.written += len(batch)
+            except Exception:
+                db.session.rollback()
+                self.failed += len(batch)
+                app.logger.exception("Could not save %d chat turns", len(batch))
+        with self._condition:
+            self._unsaved -= len(batch)
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Makes the background thread write every recorded turn now, and waits until they are saved.
+
+        Args:
+            timeout (float): The longest to wait in seconds, or None to wait until every turn is saved.
+
+        Returns:
+            bool: Whether every recorded turn was saved (or failed to save) in time.
+        """
+        self._flushing.set()
+        try:
+            self._queue.put(_FLUSH)
+            with self._condition:
+                return self._condition.wait_for(lambda: self._unsaved == 0, timeout)
+        finally:
+            self._flushing.clear()
+
+
+# Only used when PERSIST_WRITE_BEHIND is set
+write_behind = WriteBehindQueue(app.config["PERSIST_FLUSH_INTERVAL"], app.config["PERSIST_BATCH_SIZE"])
+
+
+def record_turn(userId, user_content, bot_content, sent_at=None):
+    """
+    Saves a chat turn, either now in one transaction or through the write-behind queue,
+    depending on the PERSIST_WRITE_BEHIND config setting.
+    """
+    if app.config["PERSIST_WRITE_BEHIND"]:
+        write_behind.record(userId, user_content, bot_content, sent_at)
+    else:
+        save_turn(userId, user_content, bot_content, sent_at)
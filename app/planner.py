@@ -0,0 +1,90 @@
+## The planner sits between request_constructor() and the upstream API.
+## It makes sure a request never downloads the same payload twice, whatever the user typed.
+
+# outputsize values in increasing order of coverage; a "full" series also answers a "compact" query
+OUTPUT_SIZES = ["compact", "full"]
+
+
+def normalize_symbol(ticker):
+    """
+    Normalizes a stock ticker for use as an API param, e.g. " aapl" becomes "AAPL".
+    """
+    return ticker.strip().upper()
+
+
+def fetch_key(params):
+    """
+    Returns the key identifying the payload a query downloads: its params without the apikey and outputsize.
+    Two queries with the same key can be answered by a single fetch.
+    """
+    return tuple(sorted((name, value) for name, value in params.items() if name not in ("apikey", "outputsize")))
+
+
+class QueryPlan(object):
+    """
+    The deduplicated set of upstream fetches needed to answer a list of queries.
+
+    Attributes:
+        queries (list): The queries as built by request_constructor().
+        fetches (list): The unique queries to send upstream, with normalized symbols.
+        positions (list): For each query, the index in `fetches` of the fetch that answers it.
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+        self.fetches = []
+        self.positions = []
+        seen = {}
+
+        for params in queries:
+            params = dict(params)
+            if params.get("symbol") is not None:
+                params["symbol"] = normalize_symbol(params["symbol"])
+            key = fetch_key(params)
+
+            if key not in seen:
+                seen[key] = len(self.fetches)
+                self.fetches.append(params)
+            else:
+                # keep the larger outputsize, since it also answers the smaller one
+                shared = self.fetches[seen[key]]
+                if _size_rank(params) > _size_rank(shared):
+                    shared["outputsize"] = params["outputsize"]
+            self.positions.append(seen[key])
+
+    def expand(self, results):
+        """
+        Maps the results of `fetches` back onto the original queries.
+
+        Args:
+            results (list): One result per fetch, in the order of `fetches`.
+
+        Returns:
+            list: One result per query, in the order of `queries`.
+        """
+        return [results[position] for position in self.positions]
+
+    def saved(self):
+        """
+        Returns the number of upstream fetches avoided by the plan.
+        """
+        return len(self.queries) - len(self.fetches)
+
+
+def _size_rank(params):
+    # queries without an outputsize get Alpha Vantage's default, "compact"
+    size = params.get("outputsize", "compact")
+    return OUTPUT_SIZES.index(size) if size in OUTPUT_SIZES else 0
+
+
+def plan_queries(queries):
+    """
+    Builds the QueryPlan for a list of queries from request_constructor().
+
+    Args:
+        queries (list): A list of dictionaries containing the API parameters for each query.
+
+    Returns:
+        QueryPlan: The plan holding the unique fetches and how to map their results back.
+    """
+    return QueryPlan(queries)
@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from app import app
+from app import api_calls
+from app.cache import cache_key
+from app.models import Message
+from app.parsing import compile_query
+from app.planner import plan_queries
+from app.metrics import metrics
+from app.scheduler import token_buckets, PREFETCH
+from app.timeseries import SERIES_KEYS
+
+## The prefetcher keeps the most asked-for queries warm, so users rarely wait on Alpha Vantage for them.
+## It reads what users asked for from the message table and refreshes those payloads shortly before they
+## expire, using at most a fixed share of the API call limit.
+
+
+def popular_queries(since, limit, scan_limit=5000):
+    """
+    Finds the most frequent upstream queries in the messages users sent since a given time.
+
+    Every message is parsed like a chat message, and each (function, symbol) pair it would fetch is
+    counted once per message.
+
+    Args:
+        since (datetime): The oldest message timestamp to consider.
+        limit (int): The number of queries to return.
+        scan_limit (int): The maximum number of recent messages read.
+
+    Returns:
+        list: (params, count) tuples, most frequent first. The params have normalized symbols.
+    """
+    rows = (Message.query.with_entities(Message.content)
+            .filter(Message.isUser == True, Message.timeStamp >= since)
+            .order_by(Message.timeStamp.desc())
+            .limit(scan_limit))
+
+    counts = Counter()
+    queries = {}
+    for (content,) in rows:
+        if not content:
+            continue
+        query = compile_query(content)
+        if query.error is not None:
+            continue
+        for params in plan_queries(query.queries).fetches:
+            key = cache_key(params)
+            queries.setdefault(key, params)
+            counts[key] += 1
+    return [(queries[key], count) for key, count in counts.most_common(limit)]
+
+
+def remaining_ttl(params):
+    """
+    Returns the seconds left before the payload of a query expires from the series store or the caches,
+    or 0 if it is not stored anywhere.
+    """
+    if api_calls.series_store is not None and params.get("function") in SERIES_KEYS:
+        return api_calls.series_store.remaining(params)
+    remaining = api_calls.response_cache.remaining(params)
+    if api_calls.persistent_cache is not None:
+        remaining = max(remaining, api_calls.persistent_cache.remaining(params))
+    return remaining
+
+
+class Prefetcher(object):
+    """
+    Refreshes the most popular queries ahead of demand from a background thread.
+
+    Every `interval` seconds the messages of the last `window` seconds are mined for the `top_n` most
+    frequent queries, and each one that is missing or expires within `lead` seconds is fetched again at
+    PREFETCH priority, so it queues behind every user request. Prefetches draw from their own per-minute
+    and per-day buckets sized to `quota_share` of the API call limits; a run stops early when they are empty.
+    With a `path`, the prefetch buckets are shared by the worker processes like the scheduler's.
+
+    Attributes:
+        prefetched (int): The number of queries fetched ahead of demand.
+        skipped (int): The number of popular queries that were still fresh.
+        failed (int): The number of prefetches that returned an error.
+        throttled (int): The number of runs cut short by the prefetch quota.
+    """
+
+    def __init__(self, top_n=20, window=7 * 24 * 60 * 60, interval=60, lead=60, quota_share=0.2,
+                 per_minute=5, per_day=500, scan_limit=5000, clock=time.monotonic, path=None):
+        self.top_n = top_n
+        self.window = window
+        self.interval = interval
+        self.lead = lead
+        self.scan_limit = scan_limit
+        # the per-minute bucket holds at least one call, or a small share could never be spent
+        self._buckets = token_buckets({"prefetch_minute": (max(1.0, per_minute * quota_share), 60),
+                                       "prefetch_day": (per_day * quota_share, 24 * 60 * 60)}, path, clock)
+        self.prefetched = 0
+        self.skipped = 0
+        self.failed = 0
+        self.throttled = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run_once(self):
+        """
+        Refreshes the popular queries that are about to expire. Must be called inside an app context.
+
+        Returns:
+            int: The number of queries fetched.
+        """
+        since = datetime.now() - timedelta(seconds=self.window)
+        fetched = 0
+        for params, _ in popular_queries(since, self.top_n, self.scan_limit):
+            if remaining_ttl(params) > self.lead:
+                self.skipped += 1
+                continue
+            # a prefetch needs a whole token in both buckets
+            if self._buckets.time_until(1) > 0:
+                self.throttled += 1
+                break
+
+            if api_calls.series_store is not None and params["function"] in SERIES_KEYS:
+                params = api_calls.series_store.delta_params(params)
+            # the token is only taken once the upstream scheduler admits the call, so a prefetch that is
+            # rejected, or that joins a fetch already in flight, leaves the prefetch quota untouched
+            result = api_calls.single_flight.do(cache_key(params), api_calls.fetch_upstream, params, PREFETCH,
+                                                self._spend_token)
+            if type(result) == int:
+                self.failed += 1
+                continue
+            self.prefetched += 1
+            fetched += 1
+        return fetched
+
+    def _spend_token(self):
+        # shared buckets may have been emptied by another process since the check; the admitted call is sent
+        # anyway rather than wasting the upstream token it already holds
+        self._buckets.take(1)
+
+    def start(self):
+        """
+        Starts the background thread, if it is not already running.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with app.app_context():
+                try:
+                    self.run_once()
+                except Exception:
+                    app.logger.exception("Prefetch run failed")
+
+    def stats(self):
+        """
+        Returns a dictionary with the prefetch counters and the calls left in the prefetch quota.
+        """
+        return {
+            "prefetched": self.prefetched,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "quota_left": min(self._buckets.tokens().values()),
+        }
+
+
+prefetcher = Prefetcher(top_n=app.config["PREFETCH_TOP_N"], window=app.config["PREFETCH_WINDOW"],
+                        interval=app.config["PREFETCH_INTERVAL"], lead=app.config["PREFETCH_LEAD"],
+                        quota_share=app.config["PREFETCH_QUOTA_SHARE"],
+                        per_minute=app.config["UPSTREAM_CALLS_PER_MINUTE"],
+                        per_day=app.config["UPSTREAM_CALLS_PER_DAY"],
+                        path=app.config["CACHE_DATABASE_PATH"] if app.config["UPSTREAM_LIMITS_SHARED"] else None)
+
+
+
+@metrics.collector
+def collect_metrics():
+    """
+    Reports the prefetch counters on /metrics.
+    """
+    stats = prefetcher.stats()
+    return [
+        ("stockbot_prefetch_total", "counter", "Popular queries refreshed ahead of demand, by outcome.",
+         [((("outcome", outcome),), stats[outcome]) for outcome in ("prefetched", "skipped", "failed", "throttled")]),
+    ]
+
+
+if app.config["PREFETCH"]:
+    prefetcher.start()
@@ -0,0 +1,162 @@
+import cProfile
+import functools
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import request, make_response
+from app import app
+
+## Opt-in profiling of single requests. With PROFILING on, an admin adds the PROFILING_TOKEN to a request, either
+## in the X-Profile-Token header or as ?profile=<token>, and that request is profiled into a file in PROFILING_DIR.
+## With PROFILING off the views are not wrapped at all, so there is no cost per request.
+
+PROFILE_EXTENSIONS = {"pstats": ".prof", "collapsed": ".collapsed"}
+
+
+class StackSampler(object):
+    """
+    Samples the stack of one thread at a fixed interval and counts the stacks in the collapsed format read by
+    flamegraph tools: the frames from the outermost one, separated by semicolons, then the number of samples.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def frame_label(frame):
+        code = frame.f_code
+        return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="stack_sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write("{} {}\n".format(stack, count))
+
+
+class Profiler(object):
+    """
+    Profiles the requests that ask for it and keeps the newest `keep` profiles in `directory`.
+
+    Only one request is profiled at a time; a request asking while another one is profiled is served normally.
+    The name of the profile is sent back in the X-Profile response header. A streamed reply is only profiled up
+    to the moment its stream is returned.
+
+    Attributes:
+        enabled (bool): Whether views are wrapped at all.
+        token (str): The secret a request must carry to be profiled. Profiling is refused while it is empty.
+        directory (str): The folder the profiles are written to.
+        keep (int): The number of profiles kept, older ones are deleted.
+        format (str): "pstats" for a deterministic cProfile dump, or "collapsed" for sampled stacks.
+        interval (float): Seconds between stack samples in the "collapsed" format.
+    """
+
+    def __init__(self, enabled=False, token="", directory="profiles", keep=50, format="pstats", interval=0.005):
+        if format not in PROFILE_EXTENSIONS:
+            raise ValueError("Unknown profile format: " + str(format))
+        self.enabled = enabled
+        self.token = token
+        self.directory = directory
+        self.keep = keep
+        self.format = format
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def requested(self):
+        """
+        Returns whether the current request carries the profiling token.
+        """
+        given = request.headers.get("X-Profile-Token") or request.args.get("profile")
+        return bool(self.token) and given is not None and hmac.compare_digest(given.encode(), self.token.encode())
+
+    def wrap(self, view):
+        """
+        Returns the view, profiled when a request asks for it. With profiling disabled the view itself is returned.
+        """
+        if not self.enabled:
+            return view
+
+        @functools.wraps(view)
+        def profiled_view(*args, **kwargs):
+            if not self.requested() or not self._lock.acquire(blocking=False):
+                return view(*args, **kwargs)
+            try:
+                return self._run(view, args, kwargs)
+            finally:
+                self._lock.release()
+
+        return profiled_view
+
+    def _run(self, view, args, kwargs):
+        if self.format == "pstats":
+            profile = cProfile.Profile()
+            response = make_response(profile.runcall(view, *args, **kwargs))
+        else:
+            profile = StackSampler(threading.get_ident(), self.interval)
+            profile.start()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                profile.stop()
+
+        name = "{}-{:06d}-{}-{}{}".format(time.strftime("%Y%m%d-%H%M%S"), next(self._sequence) % 1000000,
+                                          request.endpoint, request.method.lower(), PROFILE_EXTENSIONS[self.format])
+        os.makedirs(self.directory, exist_ok=True)
+        if self.format == "pstats":
+            profile.dump_stats(os.path.join(self.directory, name))
+        else:
+            profile.dump(os.path.join(self.directory, name))
+        self.rotate()
+        response.headers["X-Profile"] = name
+        return response
+
+    def profiles(self):
+        """
+        Returns the names of the stored profiles, oldest first.
+        """
+        extensions = tuple(PROFILE_EXTENSIONS.values())
+        names = [name for name in os.listdir(self.directory) if name.endswith(extensions)]
+        return sorted(names, key=lambda name: (os.path.getmtime(os.path.join(self.directory, name)), name))
+
+    def rotate(self):
+        """
+        Deletes the oldest profiles beyond the newest `keep`.
+        """
+        names = self.profiles()
+        for name in names[:max(len(names) - self.keep, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+profiler = Profiler(app.config["PROFILING"], app.config["PROFILING_TOKEN"], app.config["PROFILING_DIR"],
+                    app.config["PROFILING_KEEP"], app.config["PROFILING_FORMAT"],
+                    app.config["PROFILING_SAMPLE_INTERVAL"])
+profiled = profiler.wrap
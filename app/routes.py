@@ -1,15 +1,23 @@
 from app import app
 from app import db
-from flask import render_template, flash, redirect, session, request, jsonify
+from flask import render_template, flash, redirect, session, request, jsonify, Response, stream_with_context, g
 from app.forms import *
 from flask_login import current_user, login_user, login_required, logout_user
-from app.models import User, Message
-from app.parsing import parse_input, request_constructor
+from app.models import User, WatchlistItem
+from app.parsing import compile_query, QueryError, WATCHLIST_QUERY_TYPE
 from app.api_calls import *
-from sqlalchemy import text
-
-## used for debugging purposes
-from pprint import pprint
+from app.persistence import record_turn
+from app.history import history_page, decode_cursor
+from app.keywords import keyword_registry
+from app.planner import normalize_symbol
+from app.timeseries import SYMBOL_PATTERN
+from app.watchlist import watchlist_snapshot
+from app.metrics import metrics, server_timing
+from app.profiling import profiled
+from app.slowlog import slow_query_log
+from datetime import datetime
+import json
+import time
 
 
 @app.route('/')
@@ -19,11 +27,212 @@ def StockBot():
     '''
     return render_template("index.html")
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_timing(response):
+    """
+    Records the duration of every request, and sends the stage timings of the request in a Server-Timing header
+    when debugging (see the METRICS_TIMING_HEADER setting).
+    """
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.requests.observe(time.perf_counter() - started, route, request.method)
+        if not response.is_streamed:
+            log_slow_query(response.calculate_content_length())
+    if (app.debug or app.config["METRICS_TIMING_HEADER"]) and g.get("stage_timings"):
+        response.headers["Server-Timing"] = server_timing(g.stage_timings)
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Exposes the request, stage, upstream and cache metrics of this process in the Prometheus text format.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def log_slow_query(size):
+    """
+    Appends the chat query of the current request to the slow-query log if it took longer than the threshold.
+
+    Args:
+        size (int): The size of the reply in bytes.
+    """
+    if slow_query_log is None or g.get("query") is None:
+        return
+    userId = current_user.id if current_user.is_authenticated else None
+    slow_query_log.observe(time.perf_counter() - g.request_started, g.query, g.get("stage_timings", []),
+                           g.upstream, size, userId)
+
+
+# Message shown to the user for each reason their input could not be parsed
+QUERY_ERROR_MESSAGES = {
+    QueryError.INVALID_FORMAT: "INFO: The input format was invalid.",
+    QueryError.INVALID_KEYWORDS: "INFO: There were invalid keywords in the input.",
+    QueryError.WRONG_KEYWORD_COUNT: "INFO: Keyword count is not correct.",
+    QueryError.NO_KEYWORDS: "INFO: Your call must contain keywords! Please check your input.",
+}
+
+
+# Shown with every reply to a user who is not logged in
+NOT_AUTH_MSG = "User not authenticated, your messages will not be saved from this point."
+
+
+# Query types whose tickers are formatted independently, so their replies can be streamed ticker by ticker.
+# Comparisons need every ticker's data before anything can be shown.
+STREAMABLE_QUERY_TYPES = (1, 2, 3)
+
+
+def response_text(response_data):
+    """
+    Joins the (ticker, lines) tuples from format_response() into the plaintext reply shown to the user.
+    """
+    content = ""
+    for response in response_data:
+        content += response[0] + "\n"
+        for line in response[1]:
+            content += line + "\n"
+        content += "\n\n"
+    return content
+
+
+def api_error_message(code):
+    """
+    Returns the message shown to the user for an error code returned by api_call().
+    """
+    if code == -1:
+        return "INFO: A stock ticker may be misspelt, or does not exist."
+    elif code == QUOTA_EXCEEDED:
+        wait = round(upstream_scheduler.estimate_wait())
+        return "INFO: StockBot has reached its Alpha Vantage call limit. Please try again in about " + str(max(wait, 1)) + " seconds."
+    else:
+        return "INFO: There was an issue with the Alpha Vantage API. HTTP code: " + str(code)
+
+
+def api_reply(query, responses, timings=None):
+    """
+    Turns the result of api_call() for a query into the reply shown to the user.
+
+    Args:
+        query (Query): The compiled query.
+        responses: The list of payloads, or the error code, returned by api_call().
+        timings (list): Where the time spent formatting is recorded, see metrics.stage().
+
+    Returns:
+        tuple: The reply and whether the query succeeded.
+    """
+    if type(responses) != list:
+        return api_error_message(responses), False
+    with metrics.stage("format", timings):
+        response_data = format_response(responses, query.query_type, query.selector)
+        content = response_text(response_data)
+    return content, len(response_data) > 0
+
+
+def stream_reply(api_calls, not_auth_msg, user_content, sent_at):
+    """
+    Generates the reply to a chat message as newline-delimited JSON, one line per ticker as soon as its
+    data arrives, so the user sees the fastest ticker first.
+
+    Lines have one of three shapes:
+        {"not_auth_msg": str}                          - always sent first
+        {"index": int, "content": str}                 - a formatted block, index is the ticker's position in the query
+        {"done": true, "success": bool, "content": str} - sent last, content is the full reply in query order
+    An error for a ticker is sent as {"index": int, "info": str}.
+
+    The turn is saved when the generator ends, even if the client disconnects mid-stream, with the blocks
+    produced so far. As in api_reply(), a reply with an error is saved as the error of the first failing
+    ticker in query order.
+    """
+    userId = current_user.id if current_user.is_authenticated else None
+    blocks = [""] * len(api_calls[0])
+    errors = {}
+    size = 0
+    try:
+        first = json.dumps({"not_auth_msg": not_auth_msg}) + "\n"
+        size += len(first.encode())
+        yield first
+
+        for index, result in api_call_iter(api_calls[0]):
+            if type(result) == int:
+                errors[index] = result
+                g.upstream.append(result)
+                line = json.dumps({"index": index, "info": api_error_message(result)}) + "\n"
+            else:
+                g.upstream.append("ok")
+                with metrics.stage("format"):
+                    blocks[index] = response_text(format_response([result], api_calls[1], api_calls[2]))
+                line = json.dumps({"index": index, "content": blocks[index]}) + "\n"
+            size += len(line.encode())
+            yield line
+    finally:
+        content = api_error_message(errors[min(errors)]) if errors else "".join(blocks)
+        if userId is not None:
+            with metrics.stage("save"):
+                record_turn(userId, user_content, content, sent_at)
+    last = json.dumps({"done": True, "success": not errors, "content": content}) + "\n"
+    log_slow_query(size + len(last.encode()))
+    yield last
+
+
+def watchlist_reply(query):
+    """
+    Runs a watchlist command ("watch", "unwatch" or "watchlist") for the current user.
+
+    Returns:
+        tuple: The reply shown to the user and whether the command succeeded.
+    """
+    if not current_user.is_authenticated:
+        return "INFO: Please log in to keep a watchlist.", False
+
+    commands = keyword_registry.data()["watchlistKeywords"]
+    symbols = list(dict.fromkeys(normalize_symbol(ticker) for ticker in query.tickers))
+    invalid = [symbol for symbol in symbols if len(symbol) > 16 or not SYMBOL_PATTERN.fullmatch(symbol)]
+    if invalid:
+        return "INFO: These are not valid stock tickers: " + ", ".join(invalid), False
+
+    if query.selector == commands[0]:       # "watch"
+        watched = WatchlistItem.symbolsFor(current_user.id)
+        limit = app.config["WATCHLIST_MAX_SYMBOLS"]
+        if len(set(watched) | set(symbols)) > limit:
+            return "INFO: A watchlist can hold at most " + str(limit) + " tickers.", False
+        added = WatchlistItem.watch(current_user.id, symbols)
+        db.session.commit()
+        if not added:
+            return "These tickers are already on your watchlist.", True
+        return "Added " + ", ".join(added) + " to your watchlist.", True
+
+    elif query.selector == commands[1]:     # "unwatch"
+        removed = WatchlistItem.unwatch(current_user.id, symbols)
+        db.session.commit()
+        return "Removed " + str(removed) + " ticker(s) from your watchlist.", True
+
+    # "watchlist" shows the quotes of every watched ticker from the shared snapshot
+    watched = WatchlistItem.symbolsFor(current_user.id)
+    if not watched:
+        return "Your watchlist is empty. Add tickers with \"watch : aapl, msft\".", True
+    quotes = watchlist_snapshot.quotes(watched)
+    content = response_text(format_response(quotes, 2, keyword_registry.data()["timeSelector"][0]))
+    if len(quotes) < len(watched):
+        content += "INFO: Some tickers could not be fetched, please try again shortly."
+    return content, len(quotes) > 0
+
+
 @app.route('/', methods=['GET', 'POST'])
+@profiled
 def index():
     """
     Route to handle the home page. If the HTTP method is POST, then it processes user input
     and returns the relevant data. If the HTTP method is GET, it renders the index.html template.
+
+    If the posted JSON has "stream" set, replies that need the Alpha Vantage API are streamed as
+    newline-delimited JSON (see stream_reply()); every other reply is a single JSON object.
     """
     if request.method == "POST":
         data = request.get_json()
@@ -32,62 +241,44 @@ def index():
         # Here we set a default message for not authenticated users
         not_auth_msg = ""
         if not current_user.is_authenticated:
-            not_auth_msg = "User not authenticated, your messages will not be saved from this point."
+            not_auth_msg = NOT_AUTH_MSG
 
-        if(current_user.is_authenticated):
-            # if user is authenticated, add message to database and associate it with the user
-            message = Message(content=content)
-            message.setUser()
-            message.setVariableFields(current_user.id)
-            pprint(vars(message))
-
-            db.session.add(message)
-            db.session.commit()
+        # the user's message is saved together with the reply, once the reply is ready
+        sent_at = datetime.now()
 
         ## TODO: return the message, this is where we analyse the message
         success = False     # tracks if message is successfully parsed or contains user input error
-        parsed_content = parse_input(content)
-        print(parsed_content)
-
-        if type(parsed_content) == tuple:
-            # if parsed content is valid, generate API calls based on input and make requests
-            api_calls = request_constructor(parsed_content[0], parsed_content[1])
-
-            if api_calls == -1:
-                content = "INFO: There were invalid keywords in the input."
-            elif api_calls == -2:
-                content = "INFO: Keyword count is not correct."
-            elif api_calls == -3:
-                content = "INFO: Your call must contain keywords! Please check your input."
-            else:
-                # if API calls are successful, format the response data and return to user
+        with metrics.stage("parse"):
+            query = compile_query(content)
+        # kept for the slow-query log, with the outcome of each upstream result
+        g.query = query
+        g.upstream = []
+
+        if query.error is None and query.query_type == WATCHLIST_QUERY_TYPE:
+            # watchlist commands are answered from the shared watchlist snapshot
+            content, success = watchlist_reply(query)
+
+        elif query.error is None:
+            # if parsed content is valid, make the API calls built from the input
+            api_calls = (query.queries, query.query_type, query.selector)
+
+            if data.get("stream") and query.query_type in STREAMABLE_QUERY_TYPES:
+                # send each ticker's data as soon as it arrives
+                return Response(stream_with_context(stream_reply(api_calls, not_auth_msg, data['message'], sent_at)),
+                                mimetype="application/x-ndjson")
+
+            # if API calls are successful, format the response data and return to user
+            with metrics.stage("upstream"):
                 responses = api_call(api_calls[0])
-                if type(responses) == list:
-                    response_data = format_response(responses, api_calls[1], api_calls[2])
-                    content = ""
-                    for response in response_data:
-                        content += response[0] + "\n"
-                        for line in response[1]:
-                            content += line + "\n"
-                        content += "\n\n"
-                        success = True
-                elif responses == -1:
-                    content = "INFO: A stock ticker may be misspelt, or does not exist."
-                else:
-                    content = "INFO: There was an issue with the Alpha Vantage API. HTTP code: "+ response
+            g.upstream = ["ok"] * len(responses) if type(responses) == list else [responses]
+            content, success = api_reply(query, responses)
         else:
-            content = "INFO: The input format was invalid."
+            content = QUERY_ERROR_MESSAGES[query.error]
 
         if current_user.is_authenticated:
-            # if user is authenticated, add response message to database and associate it with the user
-            message = Message(content=content)
-            message.setResponse()
-            message.setVariableFields(current_user.id)
-            pprint(vars(message))
-
-            # add message to database
-            db.session.add(message)
-            db.session.commit()
+            # if user is authenticated, save the message and the reply as one turn and associate it with the user
+            with metrics.stage("save"):
+                record_turn(current_user.id, data['message'], content, sent_at)
 
         post_response = {
             "success": success,
@@ -104,24 +295,39 @@ def index():
 
 
 @app.route('/history')
+@profiled
 @login_required
 def history():
     """
-    Route to handle the history page. Renders the history.html template.
-    Also queries database for userId's old messages and returns them.
+    Route to handle the history page. Renders the history.html template with the first page
+    of the user's old messages; older pages are loaded by the page from /history/messages.
     """
-    messages_object = db.session.execute(text("SELECT * FROM message WHERE userId==" + str(current_user.id) + " ORDER BY timeStamp DESC;"))
-    sent, response, sent_timestamp, response_timestamp = [], [], [], []
+    turns, next_cursor = history_page(current_user.id, limit=app.config["HISTORY_PAGE_SIZE"])
+    return render_template("history.html", messages=turns, next_cursor=next_cursor)
 
-    for message in messages_object:
-        if message.isUser == True:
-            sent.append(message.content)
-            sent_timestamp.append(message.timeStamp[:19])
-        else:
-            response.append(message.content)
-            response_timestamp.append(message.timeStamp[:19])
+@app.route('/history/messages')
+@login_required
+def history_messages():
+    """
+    Returns a page of the user's old messages as JSON, newest first.
+
+    Query parameters:
+        cursor: The next_cursor of the previous page. Omit for the first page.
+        limit: The number of turns in the page, capped at HISTORY_MAX_PAGE_SIZE.
+    """
+    cursor = None
+    if request.args.get("cursor"):
+        cursor = decode_cursor(request.args["cursor"])
+        if cursor is None:
+            return jsonify({"error": "Invalid cursor."}), 400
+    limit = request.args.get("limit", app.config["HISTORY_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, app.config["HISTORY_MAX_PAGE_SIZE"]))
 
-    return render_template("history.html", messages=zip(sent_timestamp, sent, response_timestamp, response))
+    turns, next_cursor = history_page(current_user.id, cursor, limit)
+    return jsonify({
+        "turns": [{"sent_at": t[0], "sent": t[1], "response_at": t[2], "response": t[3]} for t in turns],
+        "next_cursor": next_cursor
+    })
 
 @app.route('/help')
 def help():
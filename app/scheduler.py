@@ -0,0 +1,376 @@
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+# Request priorities, lowest value first. Chat queries from users always go ahead of background work.
+INTERACTIVE = 0
+BACKGROUND = 1
+PREFETCH = 2
+
+# How often an async caller queued behind other requests checks whether it is its turn, in seconds
+ASYNC_POLL_INTERVAL = 0.05
+
+# The shortest wait before retrying a token another process took first, in seconds
+MIN_RETRY_DELAY = 0.001
+
+
+class TokenBucket(object):
+    """
+    A token bucket that refills continuously up to its capacity.
+
+    Attributes:
+        capacity (float): The maximum number of tokens the bucket holds.
+        rate (float): The number of tokens added per second.
+        tokens (float): The number of tokens currently available.
+    """
+
+    def __init__(self, capacity, period, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = capacity / float(period)
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._updated = clock()
+
+    def refill(self):
+        """
+        Adds the tokens earned since the last refill.
+        """
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, count=1):
+        """
+        Returns the number of seconds until `count` tokens are available, or 0 if they already are.
+        """
+        self.refill()
+        deficit = count - self.tokens
+        if deficit <= 0:
+            return 0.0
+        return deficit / self.rate
+
+    def consume(self, count=1):
+        """
+        Removes `count` tokens from the bucket. Callers must check time_until() first.
+        """
+        self.refill()
+        self.tokens -= count
+
+
+class LocalTokenBuckets(object):
+    """
+    A group of token buckets kept in process memory. A request needs a token from every bucket.
+
+    Attributes:
+        buckets (dict): The TokenBucket of each name.
+    """
+
+    def __init__(self, limits, clock=time.monotonic):
+        self.buckets = {name: TokenBucket(capacity, period, clock) for name, (capacity, period) in limits.items()}
+
+    def time_until(self, count=1):
+        """
+        Returns the number of seconds until `count` tokens are available in every bucket, or 0 if they already are.
+        """
+        return max(bucket.time_until(count) for bucket in self.buckets.values())
+
+    def take(self, count=1):
+        """
+        Takes `count` tokens from every bucket if they are all available.
+
+        Returns:
+            bool: Whether the tokens were taken.
+        """
+        if self.time_until(count) > 0:
+            return False
+        for bucket in self.buckets.values():
+            bucket.consume(count)
+        return True
+
+    def tokens(self):
+        """
+        Returns a dictionary with the tokens currently available in each bucket.
+        """
+        for bucket in self.buckets.values():
+            bucket.refill()
+        return {name: bucket.tokens for name, bucket in self.buckets.items()}
+
+
+class SharedTokenBuckets(object):
+    """
+    A group of token buckets kept in a SQLite database, so every worker process sharing the file draws from
+    the same buckets. A request needs a token from every bucket; tokens are refilled and taken in one
+    BEGIN IMMEDIATE transaction, so two processes can never both spend the last token.
+
+    The buckets are refilled from the wall clock, as monotonic clocks are not comparable between processes.
+
+    Attributes:
+        path (str): The path of the SQLite database, usually the shared cache.db.
+        limits (dict): The (capacity, period in seconds) of each bucket name.
+    """
+
+    def __init__(self, path, limits, clock=time.time):
+        self.path = path
+        self.limits = dict(limits)
+        self._clock = clock
+        self._local = threading.local()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS token_bucket "
+                         "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            now = self._clock()
+            # a bucket starts full the first time any process uses it
+            conn.executemany("INSERT OR IGNORE INTO token_bucket (name, tokens, updated) VALUES (?, ?, ?)",
+                             [(name, float(capacity), now) for name, (capacity, _) in self.limits.items()])
+            self._local.conn = conn
+        return conn
+
+    def _levels(self, conn, now):
+        names = list(self.limits)
+        rows = conn.execute("SELECT name, tokens, updated FROM token_bucket WHERE name IN ({})".format(
+            ", ".join("?" * len(names))), names).fetchall()
+        levels = {}
+        for name, tokens, updated in rows:
+            capacity, period = self.limits[name]
+            levels[name] = min(float(capacity), tokens + max(0.0, now - updated) * capacity / float(period))
+        return levels
+
+    def _wait(self, levels, count):
+        waits = [0.0]
+        for name, tokens in levels.items():
+            capacity, period = self.limits[name]
+            if tokens < count:
+                waits.append((count - tokens) * period / float(capacity))
+        return max(waits)
+
+    def time_until(self, count=1):
+        """
+        Returns the number of seconds until `count` tokens are available in every bucket, or 0 if they already are.
+        """
+        return self._wait(self._levels(self._connection(), self._clock()), count)
+
+    def take(self, count=1):
+        """
+        Takes `count` tokens from every bucket if they are all available.
+
+        Returns:
+            bool: Whether the tokens were taken.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = self._clock()
+            levels = self._levels(conn, now)
+            taken = self._wait(levels, count) <= 0
+            if taken:
+                conn.executemany("UPDATE token_bucket SET tokens = ?, updated = ? WHERE name = ?",
+                                 [(tokens - count, now, name) for name, tokens in levels.items()])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return taken
+
+    def tokens(self):
+        """
+        Returns a dictionary with the tokens currently available in each bucket.
+        """
+        return self._levels(self._connection(), self._clock())
+
+
+def token_buckets(limits, path=None, clock=time.monotonic):
+    """
+    Returns a group of token buckets, shared through the SQLite database at `path` if one is given.
+
+    Args:
+        limits (dict): The (capacity, period in seconds) of each bucket name.
+        path (str): The database shared by the worker processes, or None to keep the buckets in this process.
+        clock (callable): The clock of in-process buckets.
+
+    Returns:
+        LocalTokenBuckets or SharedTokenBuckets: The buckets.
+    """
+    if path is None:
+        return LocalTokenBuckets(limits, clock)
+    return SharedTokenBuckets(path, limits)
+
+
+class UpstreamScheduler(object):
+    """
+    Admits upstream requests within the Alpha Vantage per-minute and per-day call limits.
+
+    Every request takes one token from both a per-minute and a per-day bucket. When tokens run out, callers
+    queue in priority order (INTERACTIVE, then BACKGROUND, then PREFETCH, first come first served within a
+    priority) and are released as the buckets refill, so a burst is smoothed out instead of using the whole
+    quota at once and failing for the rest of the minute.
+
+    With a `path`, the buckets live in that SQLite database and are shared by every worker process using it,
+    so the limits hold for the whole deployment instead of for each process. The priority queue itself stays
+    per process.
+
+    Attributes:
+        granted (int): The number of requests admitted.
+        rejected (int): The number of requests turned away because their wait would be too long.
+    """
+
+    def __init__(self, per_minute, per_day, clock=time.monotonic, path=None):
+        self._clock = clock
+        self._buckets = token_buckets({"upstream_minute": (per_minute, 60), "upstream_day": (per_day, 24 * 60 * 60)},
+                                      path, clock)
+        self._waiters = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self.granted = 0
+        self.rejected = 0
+
+    def _estimate(self, priority):
+        # a new request waits for every queued request of the same or higher priority, plus its own token
+        needed = 1 + sum(1 for waiter in self._waiters if waiter[0] <= priority)
+        return self._buckets.time_until(needed)
+
+    def estimate_wait(self, priority=INTERACTIVE):
+        """
+        Estimates how long a new request with the given priority would wait before being sent.
+
+        Args:
+            priority (int): The priority of the request.
+
+        Returns:
+            float: The estimated wait in seconds.
+        """
+        with self._condition:
+            return self._estimate(priority)
+
+    def available(self):
+        """
+        Returns the number of requests that could be sent right now, the smaller of the two buckets.
+        """
+        with self._condition:
+            return min(self._buckets.tokens().values())
+
+    def acquire(self, priority=INTERACTIVE, max_wait=None):
+        """
+        Waits until the request may be sent and takes its tokens.
+
+        Args:
+            priority (int): The priority of the request.
+            max_wait (float): The longest the caller is willing to wait in seconds, or None to wait indefinitely.
+
+        Returns:
+            bool: True if the request may be sent, False if it would have waited longer than `max_wait`.
+        """
+        with self._condition:
+            if max_wait is not None and self._estimate(priority) > max_wait:
+                self.rejected += 1
+                return False
+
+            deadline = None if max_wait is None else self._clock() + max_wait
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    remaining = None if deadline is None else deadline - self._clock()
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    if self._waiters[0] == ticket:
+                        if self._buckets.take(1):
+                            self.granted += 1
+                            return True
+                        # shared buckets may have been emptied by another process since the take
+                        delay = max(self._buckets.time_until(1), MIN_RETRY_DELAY)
+                        self._condition.wait(delay if remaining is None else min(delay, remaining))
+                    else:
+                        self._condition.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+
+    def _enqueue(self, priority, max_wait):
+        # queues an async caller, or returns None if its wait would be longer than max_wait
+        with self._condition:
+            if max_wait is not None and self._estimate(priority) > max_wait:
+                self.rejected += 1
+                return None
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiters, ticket)
+            return ticket
+
+    def _attempt(self, ticket, deadline):
+        # one try of an async caller: returns (True, 0) once its tokens are taken, (False, 0) once past its
+        # deadline, or (None, delay) with the seconds to sleep before the next try
+        with self._condition:
+            remaining = None if deadline is None else deadline - self._clock()
+            if remaining is not None and remaining <= 0:
+                self.rejected += 1
+                return False, 0
+            delay = ASYNC_POLL_INTERVAL
+            if self._waiters[0] == ticket:
+                if self._buckets.take(1):
+                    self.granted += 1
+                    return True, 0
+                delay = max(self._buckets.time_until(1), MIN_RETRY_DELAY)
+            return None, delay if remaining is None else min(delay, remaining)
+
+    def _dequeue(self, ticket):
+        with self._condition:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            self._condition.notify_all()
+
+    async def acquire_async(self, priority=INTERACTIVE, max_wait=None):
+        """
+        Waits without holding a thread until the request may be sent, and takes its tokens.
+
+        Async callers queue with the blocking ones in the same priority order, but poll every
+        ASYNC_POLL_INTERVAL seconds while another request is ahead of them instead of being notified.
+        Every try runs on a worker thread, as it may wait for the lock held by blocking callers or, with
+        shared buckets, for the database; the event loop itself never blocks.
+
+        Args:
+            priority (int): The priority of the request.
+            max_wait (float): The longest the caller is willing to wait in seconds, or None to wait indefinitely.
+
+        Returns:
+            bool: True if the request may be sent, False if it would have waited longer than `max_wait`.
+        """
+        deadline = None if max_wait is None else self._clock() + max_wait
+        ticket = await asyncio.to_thread(self._enqueue, priority, max_wait)
+        if ticket is None:
+            return False
+
+        try:
+            while True:
+                granted, delay = await asyncio.to_thread(self._attempt, ticket, deadline)
+                if granted is not None:
+                    return granted
+                await asyncio.sleep(delay)
+        finally:
+            await asyncio.to_thread(self._dequeue, ticket)
+
+    def stats(self):
+        """
+        Returns a dictionary with the admitted, rejected and queued request counts and the tokens left.
+        """
+        with self._condition:
+            tokens = self._buckets.tokens()
+            return {
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "queued": len(self._waiters),
+                "minute_tokens": tokens["upstream_minute"],
+                "day_tokens": tokens["upstream_day"],
+            }
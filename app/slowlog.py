@@ -0,0 +1,104 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from app import app
+from app.parsing import QueryError
+
+## Chat queries slower than SLOW_QUERY_THRESHOLD seconds are appended to a JSON lines log, one entry per query,
+## so the query shapes behind the tail latency can be found offline with benchmarks/slow_queries.py.
+## Entries hold the shape of the query, never its tickers, and user ids are hashed.
+
+
+def query_shape(query):
+    """
+    Returns the normalized shape of a compiled query: what was asked for and for how many tickers, but not which.
+
+    Args:
+        query (Query): A query from compile_query().
+
+    Returns:
+        dict: The query type, the sorted keywords, the selector keyword of a modifiable query, the number of
+            tickers, and the name of the parsing error if there was one.
+    """
+    keywords = sorted(set(keyword.strip().lower() for keyword in query.keywords or [] if keyword.strip()))
+    return {
+        "type": query.query_type,
+        "keywords": keywords,
+        "selector": query.selector if isinstance(query.selector, str) else None,
+        "tickers": len([ticker for ticker in query.tickers or [] if ticker.strip()]),
+        "error": QueryError(query.error).name if query.error is not None else None,
+    }
+
+
+class SlowQueryLog(object):
+    """
+    An append-only log of the chat queries slower than a threshold.
+
+    Attributes:
+        path (str): The JSON lines file entries are appended to.
+        threshold (float): Queries taking at least this many seconds are logged.
+        logged (int): The number of entries written by this process.
+    """
+
+    def __init__(self, path, threshold=1.0, secret=""):
+        self.path = path
+        self.threshold = threshold
+        self.logged = 0
+        self._secret = secret.encode()
+        self._lock = threading.Lock()
+
+    def hash_user(self, userId):
+        """
+        Returns a keyed hash of a user id, stable within a deployment so one user's queries can be grouped.
+        """
+        if userId is None:
+            return None
+        return hmac.new(self._secret, str(userId).encode(), hashlib.sha256).hexdigest()[:16]
+
+    def observe(self, elapsed, query, stage_timings, upstream, size, userId=None):
+        """
+        Logs a chat query if it took at least `threshold` seconds.
+
+        Args:
+            elapsed (float): The duration of the request in seconds.
+            query (Query): The compiled query.
+            stage_timings (list): (stage, seconds) pairs, as collected by metrics.stage().
+            upstream (list): The outcome of each upstream result: "ok" or the error code returned by the API call.
+            size (int): The size of the reply in bytes.
+            userId (int): The id of the user, or None if they are not logged in.
+
+        Returns:
+            bool: Whether the query was logged.
+        """
+        if elapsed < self.threshold:
+            return False
+        stages = {}
+        for name, seconds in stage_timings:
+            stages[name] = stages.get(name, 0.0) + seconds
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "duration": round(elapsed, 6),
+            "shape": query_shape(query),
+            "stages": {name: round(seconds, 6) for name, seconds in stages.items()},
+            "upstream": list(upstream),
+            "size": size,
+            "user": self.hash_user(userId),
+        }
+        line = json.dumps(entry, sort_keys=True) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as handle:
+                handle.write(line)
+            self.logged += 1
+        return True
+
+
+slow_query_log = None
+if app.config["SLOW_QUERY_LOG"]:
+    slow_query_log = SlowQueryLog(app.config["SLOW_QUERY_LOG_PATH"], app.config["SLOW_QUERY_THRESHOLD"],
+                                  app.config["SECRET_KEY"])
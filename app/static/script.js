@@ -62,27 +62,85 @@ document.addEventListener("DOMContentLoaded", () => {
     messages.scrollTop = messages.scrollHeight;
   }
 
+  // showNotAuthMessage warns a logged out user, once, that their messages are not saved
+  function showNotAuthMessage(notAuthMsg) {
+    if (firstMessage && notAuthMsg) {
+      const message = document.createElement("div");
+      message.className = "bot-message";
+      message.textContent = notAuthMsg;
+      message.style.color = "#E2694F";
+      messages.appendChild(message);
+      messages.scrollTop = messages.scrollHeight;
+      firstMessage = false;
+    }
+  }
+
+  // addBlock places one ticker's block inside a streamed bot message, keeping the order of the query
+  // even though blocks arrive in the order the server receives them
+  function addBlock(message, index, text) {
+    const block = document.createElement("div");
+    block.dataset.index = index;
+    block.innerHTML = text.replace(/(?:\r\n|\r|\n)/g, "<br>");
+    const next = Array.from(message.children).find(
+      (child) => Number(child.dataset.index) > index
+    );
+    message.insertBefore(block, next || null);
+    messages.scrollTop = messages.scrollHeight;
+  }
+
+  // readStream renders a newline-delimited JSON reply incrementally, one line per ticker
+  async function readStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let message = null;
+    let buffer = "";
+
+    const handleLine = (line) => {
+      if (!line) return;
+      const data = JSON.parse(line);
+      if ("not_auth_msg" in data) {
+        showNotAuthMessage(data.not_auth_msg);
+        message = document.createElement("div");
+        message.className = "bot-message";
+        messages.appendChild(message);
+      } else if ("done" in data) {
+        if (!message.children.length) message.remove();
+        if (!message.isConnected) addMessage(data.content, "bot");
+      } else {
+        addBlock(message, data.index, data.content || data.info);
+      }
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer);
+  }
+
   // getResponse will actually be responsible for the POST request and fetching a JSON containing
-  // the response data from the server.
+  // the response data from the server. Replies that call the stock API are streamed, so each
+  // ticker is shown as soon as it arrives.
   function getResponse(userInput) {
-    const DATA = { message: userInput };
+    const DATA = { message: userInput, stream: true };
     fetch("/", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(DATA),
     })
-      .then((response) => response.json())
-      .then((data) => {
-        if (firstMessage && data.not_auth_msg) {
-          const message = document.createElement("div");
-          message.className = "bot-message";
-          message.textContent = data.not_auth_msg;
-          message.style.color = "#E2694F";
-          messages.appendChild(message);
-          messages.scrollTop = messages.scrollHeight;
-          firstMessage = false;
+      .then((response) => {
+        const type = response.headers.get("Content-Type") || "";
+        if (type.includes("application/x-ndjson") && response.body) {
+          return readStream(response);
         }
-        addMessage(data.content, "bot");
+        return response.json().then((data) => {
+          showNotAuthMessage(data.not_auth_msg);
+          addMessage(data.content, "bot");
+        });
       })
       .catch((error) => console.error("Error:", error));
   }
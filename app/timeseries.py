@@ -0,0 +1,328 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+from app.planner import normalize_symbol
+
+## The series store keeps every fetched TIME_SERIES_* payload as a date-sorted array of bars on disk.
+## Range queries slice the memory-mapped arrays instead of downloading and decoding the JSON again.
+
+# Key of the bars in each time series payload, by API function
+SERIES_KEYS = {
+    "TIME_SERIES_DAILY_ADJUSTED": "Time Series (Daily)",
+    "TIME_SERIES_WEEKLY_ADJUSTED": "Weekly Adjusted Time Series",
+    "TIME_SERIES_MONTHLY_ADJUSTED": "Monthly Adjusted Time Series",
+}
+
+# One row per bar, oldest first. Fixed-size fields only, so the files can be memory-mapped.
+BAR_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("adjusted_close", np.float64),
+    ("volume", np.int64),
+])
+
+# Number of bars in an outputsize=compact payload, for the functions that accept an outputsize.
+# The weekly and monthly series are always sent in full.
+COMPACT_BARS = {
+    "TIME_SERIES_DAILY_ADJUSTED": 100,
+}
+
+# Bars of margin kept when deciding whether a compact payload still overlaps the stored series
+COMPACT_MARGIN = 10
+
+# Symbols that can safely be used as a file name
+SYMBOL_PATTERN = re.compile(r"[A-Z0-9][A-Z0-9.\-]*")
+
+
+def bars_from_payload(payload):
+    """
+    Converts the bars of a time series payload into an array of BAR_DTYPE, oldest bar first.
+
+    Args:
+        payload (dict): A TIME_SERIES_* response from the Alpha Vantage API.
+
+    Returns:
+        numpy.ndarray: The bars of the payload.
+    """
+    bars = next(payload[key] for key in SERIES_KEYS.values() if key in payload)
+    rows = [
+        (day, bar["1. open"], bar["2. high"], bar["3. low"], bar["4. close"],
+         bar.get("5. adjusted close", bar["4. close"]), bar.get("6. volume", bar.get("5. volume", 0)))
+        for day, bar in bars.items()
+    ]
+    array = np.array(rows, dtype=BAR_DTYPE)
+    return array[np.argsort(array["date"], kind="stable")]
+
+
+class Series(object):
+    """
+    The bars of one ticker for one API function, oldest bar first.
+
+    Attributes:
+        symbol (str): The ticker, e.g. "AAPL".
+        function (str): The TIME_SERIES_* function the bars come from.
+        bars (numpy.ndarray): An array of BAR_DTYPE, possibly memory-mapped.
+    """
+
+    def __init__(self, symbol, function, bars):
+        self.symbol = symbol
+        self.function = function
+        self.bars = bars
+
+    def __len__(self):
+        return len(self.bars)
+
+    def last(self, count):
+        """
+        Returns the latest `count` bars, oldest first.
+        """
+        return self.bars[-count:] if count > 0 else self.bars[:0]
+
+    def between(self, start, end):
+        """
+        Returns the bars dated from `start` to `end` inclusive, oldest first.
+
+        Args:
+            start, end (str or numpy.datetime64): The first and last dates, e.g. "2023-05-01".
+        """
+        dates = self.bars["date"]
+        first = np.searchsorted(dates, np.datetime64(start, "D"), side="left")
+        last = np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+        return self.bars[first:last]
+
+
+def merge_bars(stored, fetched):
+    """
+    Merges freshly fetched bars into a stored series. Fetched bars replace stored bars in the dates they
+    cover, and stored bars outside those dates are kept.
+
+    A dividend or split rescales every earlier adjusted close, so the kept bars are scaled by the ratio of
+    the new to the old adjusted close on the first fetched date, when the two series overlap.
+
+    Args:
+        stored (numpy.ndarray): The stored bars, oldest first.
+        fetched (numpy.ndarray): The fetched bars, oldest first.
+
+    Returns:
+        numpy.ndarray: The merged bars, oldest first.
+    """
+    if len(fetched) == 0:
+        return np.array(stored)
+    first, last = fetched["date"][0], fetched["date"][-1]
+    older = np.array(stored[stored["date"] < first])
+    # a payload served from a cache may be older than the stored series
+    newer = stored[stored["date"] > last]
+    if len(older) == 0 and len(newer) == 0:
+        return fetched
+
+    overlap = np.searchsorted(stored["date"], first)
+    if len(older) and overlap < len(stored) and stored["date"][overlap] == first and stored["adjusted_close"][overlap] != 0:
+        older["adjusted_close"] *= fetched["adjusted_close"][0] / stored["adjusted_close"][overlap]
+    return np.concatenate((older, fetched, newer))
+
+
+def as_series(item, function=None):
+    """
+    Returns `item` as a Series, converting it if it is a time series payload.
+
+    Args:
+        item (Series or dict): A Series, or a TIME_SERIES_* response from the Alpha Vantage API.
+        function (str): The function of the payload, guessed from its keys if not given.
+    """
+    if isinstance(item, Series):
+        return item
+    if function is None:
+        function = next(name for name, key in SERIES_KEYS.items() if key in item)
+    return Series(item["Meta Data"]["2. Symbol"], function, bars_from_payload(item))
+
+
+class SeriesStore(object):
+    """
+    Keeps the bars of each (function, symbol) pair in a .npy file under `root`.
+
+    Files are memory-mapped when read, so slicing a range touches only the pages it needs, and are
+    replaced atomically when written, so a reader in another worker process sees either the old or the new
+    series. A series is fresh for the time to live of its function, counted from the file's modification time.
+
+    Attributes:
+        root (str): The directory holding one sub-directory per function.
+        ttls (dict): Maps an API function name to its time to live in seconds.
+        default_ttl (int): The time to live used for functions missing from `ttls`.
+        hits (int): The number of lookups answered from a fresh file.
+        misses (int): The number of lookups that were missing or stale.
+        writes (int): The number of series written.
+        compact_fetches (int): The number of refreshes that only asked for the latest bars.
+        full_fetches (int): The number of refreshes that asked for the whole series.
+    """
+
+    def __init__(self, root, ttls, default_ttl=60, clock=time.time):
+        self.root = root
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compact_fetches = 0
+        self.full_fetches = 0
+        self._clock = clock
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def path(self, function, symbol):
+        """
+        Returns the path of the file holding the series, or None if the symbol cannot be stored.
+        """
+        symbol = normalize_symbol(symbol)
+        if function not in SERIES_KEYS or not SYMBOL_PATTERN.fullmatch(symbol):
+            return None
+        return os.path.join(self.root, function, symbol + ".npy")
+
+    def _open(self, path):
+        """
+        Returns the memory-mapped bars of `path` and the file's modification time, reusing the map while
+        the file is unchanged.
+        """
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            mapped = self._maps.get(path)
+            if mapped is not None and mapped[0] == mtime:
+                return mapped
+        bars = np.load(path, mmap_mode="r", allow_pickle=False)
+        with self._lock:
+            self._maps[path] = (mtime, bars)
+        return mtime, bars
+
+    def get(self, params):
+        """
+        Returns the stored series for a query, or None if it is missing or older than its time to live.
+
+        Args:
+            params (dict): The API parameters of a TIME_SERIES_* query.
+        """
+        series = self.load(params)
+        fresh = series is not None and self._clock() - series[0] < self.ttls.get(params["function"], self.default_ttl)
+        with self._lock:
+            if not fresh:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return series[1]
+
+    def remaining(self, params):
+        """
+        Returns the seconds left before the stored series for a query goes stale, or 0 if it is not stored.
+        It does not count as a lookup.
+        """
+        stored = self.load(params)
+        if stored is None:
+            return 0
+        return max(0, stored[0] + self.ttls.get(params["function"], self.default_ttl) - self._clock())
+
+    def load(self, params):
+        """
+        Returns the stored series for a query with its modification time, however old it is.
+
+        Returns:
+            tuple: (mtime, Series), or None if the series has never been stored.
+        """
+        path = self.path(params.get("function"), params.get("symbol", ""))
+        if path is None:
+            return None
+        try:
+            mtime, bars = self._open(path)
+        except (OSError, ValueError):
+            return None
+        return mtime, Series(normalize_symbol(params["symbol"]), params["function"], bars)
+
+    def delta_params(self, params, stored=None):
+        """
+        Returns the params to refresh a series with: outputsize=compact when the stored series ends within
+        the bars a compact payload holds, and outputsize=full on a cold start or after a long gap.
+        Params that already set an outputsize, or whose function has no compact size, are returned unchanged.
+
+        Args:
+            params (dict): The API parameters of a TIME_SERIES_* query.
+            stored (tuple): The result of load() for the query, if the caller already has it.
+        """
+        compact = COMPACT_BARS.get(params.get("function"))
+        if compact is None or "outputsize" in params:
+            return params
+        if stored is None:
+            stored = self.load(params)
+
+        outputsize = "full"
+        if stored is not None and len(stored[1]):
+            today = np.datetime64(int(self._clock()), "s").astype("datetime64[D]")
+            latest = stored[1].bars["date"][-1]
+            if np.busday_count(latest, today) <= compact - COMPACT_MARGIN:
+                outputsize = "compact"
+
+        with self._lock:
+            if outputsize == "compact":
+                self.compact_fetches += 1
+            else:
+                self.full_fetches += 1
+        return dict(params, outputsize=outputsize)
+
+    def put(self, params, payload):
+        """
+        Stores the bars of a payload, merged into any series already stored for the query.
+
+        Args:
+            params (dict): The API parameters the payload was fetched with.
+            payload (dict): The TIME_SERIES_* response from the Alpha Vantage API.
+
+        Returns:
+            Series: The stored series. It is returned even if the file could not be written.
+        """
+        symbol = normalize_symbol(params["symbol"])
+        bars = bars_from_payload(payload)
+        stored = self.load(params)
+        if stored is not None:
+            bars = merge_bars(stored[1].bars, bars)
+        series = Series(symbol, params["function"], bars)
+        path = self.path(params["function"], symbol)
+        if path is None:
+            return series
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+            with open(temporary, "wb") as handle:
+                np.save(handle, series.bars, allow_pickle=False)
+            os.replace(temporary, path)
+            with self._lock:
+                self.writes += 1
+        except OSError:
+            pass
+        return series
+
+    def clear(self):
+        """
+        Forgets the open maps and resets the counters. The files are left in place.
+        """
+        with self._lock:
+            self._maps.clear()
+            self.hits = self.misses = self.writes = 0
+            self.compact_fetches = self.full_fetches = 0
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of open maps, the hit/miss counters and the refresh sizes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "series": len(self._maps),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "compact_fetches": self.compact_fetches,
+                "full_fetches": self.full_fetches,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,140 @@
+import threading
+import time
+from app import app
+from app import api_calls
+from app.cache import is_empty_quote
+from app.models import WatchlistItem
+from app.parsing import stockkey
+from app.scheduler import INTERACTIVE, BACKGROUND
+
+## Watchlists are answered from one snapshot of quotes shared by every user.
+## The snapshot is refreshed as a single batch of the distinct watched tickers, so the upstream cost of a
+## refresh grows with the number of different tickers watched, not with the number of users watching them.
+
+
+def quote_query(symbol):
+    """
+    Returns the HTTP request params of the quote of a watched ticker.
+    """
+    return {"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": stockkey}
+
+
+class WatchlistSnapshot(object):
+    """
+    The latest quote of every watched ticker.
+
+    A lookup older than `interval` seconds starts a refresh of all watched tickers on a background thread at
+    BACKGROUND priority and is answered from the current snapshot meanwhile. Only one refresh runs at a time.
+    Tickers that are not in the snapshot yet (e.g. just added) are fetched for the caller straight away.
+    Each refresh rebuilds the snapshot from the watched tickers, so a ticker nobody watches any more is dropped
+    and no longer fetched.
+
+    Attributes:
+        interval (float): The age in seconds after which the snapshot is refreshed.
+        refreshes (int): The number of batch refreshes run.
+        fetched (int): The number of quotes fetched, by refreshes and for missing tickers.
+    """
+
+    def __init__(self, interval=300, clock=time.monotonic):
+        self.interval = interval
+        self.refreshes = 0
+        self.fetched = 0
+        self._clock = clock
+        self._quotes = {}
+        self._refreshed_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def age(self):
+        """
+        Returns the age of the snapshot in seconds, or None if it was never refreshed.
+        """
+        with self._lock:
+            return None if self._refreshed_at is None else self._clock() - self._refreshed_at
+
+    def _fetch(self, symbols, priority):
+        # the batch goes through api_call_iter(), so it is deduplicated and shares the caches with chat queries.
+        # A background refresh keeps at most half of the shared pool busy, leaving the rest to chat queries.
+        # Tickers without a quote, e.g. unknown ones, are left out of the snapshot.
+        max_workers = None if priority == INTERACTIVE else max(1, app.config["API_MAX_WORKERS"] // 2)
+        queries = [quote_query(symbol) for symbol in symbols]
+        quotes = {}
+        for index, result in api_calls.api_call_iter(queries, priority, max_workers):
+            if type(result) != int and not is_empty_quote(result):
+                quotes[symbols[index]] = result
+        with self._lock:
+            self._quotes.update(quotes)
+            self.fetched += len(quotes)
+        return quotes
+
+    def refresh(self, symbols=None):
+        """
+        Fetches the quotes of every watched ticker as one batch, and drops the quotes of the other tickers.
+        A watched ticker that could not be fetched keeps its last quote.
+
+        Args:
+            symbols (list): The tickers to refresh. Defaults to every ticker on a watchlist, which needs an app context.
+
+        Returns:
+            int: The number of quotes fetched.
+        """
+        if symbols is None:
+            symbols = WatchlistItem.allSymbols()
+        try:
+            quotes = self._fetch(symbols, BACKGROUND)
+            watched = set(symbols)
+            with self._lock:
+                self._quotes = {symbol: quote for symbol, quote in self._quotes.items() if symbol in watched}
+        finally:
+            with self._lock:
+                self._refreshed_at = self._clock()
+                self._refreshing = False
+                self.refreshes += 1
+        return len(quotes)
+
+    def _refresh_in_background(self):
+        with app.app_context():
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception("Watchlist refresh failed")
+
+    def quotes(self, symbols):
+        """
+        Returns the quotes of the given tickers from the snapshot.
+
+        Args:
+            symbols (list): Normalized tickers, e.g. a user's watchlist.
+
+        Returns:
+            list: The GLOBAL_QUOTE payloads of the tickers that could be fetched, in the order of `symbols`.
+        """
+        with self._lock:
+            stale = self._refreshed_at is None or self._clock() - self._refreshed_at >= self.interval
+            start = stale and not self._refreshing
+            if start:
+                self._refreshing = True
+            missing = [symbol for symbol in symbols if symbol not in self._quotes]
+        if start:
+            threading.Thread(target=self._refresh_in_background, name="watchlist_refresh", daemon=True).start()
+        if missing:
+            self._fetch(missing, INTERACTIVE)
+
+        with self._lock:
+            return [self._quotes[symbol] for symbol in symbols if symbol in self._quotes]
+
+    def stats(self):
+        """
+        Returns a dictionary with the size and age of the snapshot and its counters.
+        """
+        with self._lock:
+            return {
+                "symbols": len(self._quotes),
+                "age": None if self._refreshed_at is None else self._clock() - self._refreshed_at,
+                "refreshes": self.refreshes,
+                "fetched": self.fetched,
+            }
+
+
+# Shared by every user of this process
+watchlist_snapshot = WatchlistSnapshot(app.config["WATCHLIST_REFRESH_INTERVAL"])
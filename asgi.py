@@ -0,0 +1 @@
+from app.asgi import application
\ No newline at end of file
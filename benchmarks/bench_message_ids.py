@@ -0,0 +1,99 @@
+"""
+Benchmark of message inserts as a user's history grows.
+
+Compares the per-user counter (MessageCounter.allocate) with the previous allocation, which ran
+SELECT MAX(id) and SELECT MAX(conversationId) over the user's messages for every insert.
+
+Usage (from the top-level folder):
+    python benchmarks/bench_message_ids.py [--sizes 0,1000,10000,50000] [--inserts 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Use a throwaway database so the benchmark never touches app.db
+_bench_dir = tempfile.mkdtemp(prefix="stockbot-bench-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_bench_dir, "bench.db")
+os.environ["CACHE_DATABASE_PATH"] = os.path.join(_bench_dir, "cache.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import text
+from app import app, db
+from app.models import User, Message, MessageCounter
+
+
+def legacy_allocate(message, userId):
+    """
+    The MAX()-based allocation that setVariableFields used before the counter table.
+    """
+    message.userId = userId
+    currentId = db.session.execute(text("SELECT MAX(id) FROM Message WHERE userId==" + str(userId) + ";")).fetchone()[0]
+    currentConvId = db.session.execute(text("SELECT MAX(conversationId) FROM Message WHERE userId==" + str(userId) + ";")).fetchone()[0]
+    message.parentId = currentId or 0
+    message.id = (currentId or 0) + 1
+    message.conversationId = currentConvId or 1
+    message.timeStamp = datetime.now()
+
+
+def counter_allocate(message, userId):
+    message.setVariableFields(userId)
+
+
+def grow_history(userId, size):
+    """
+    Bulk inserts messages until the user has `size` of them, and syncs their counter.
+    """
+    current = db.session.execute(text("SELECT COUNT(*) FROM message WHERE userId = :u"), {"u": userId}).scalar()
+    rows = [{"id": n, "conversationId": 1, "userId": userId, "parentId": str(n - 1), "timeStamp": datetime.now(),
+             "content": "price current : AAPL", "isUser": n % 2 == 1} for n in range(current + 1, size + 1)]
+    if rows:
+        db.session.execute(Message.__table__.insert(), rows)
+    counter = db.session.get(MessageCounter, userId)
+    if counter is not None:
+        counter.lastId = max(size, counter.lastId)
+    db.session.commit()
+
+
+def run(allocate, userId, inserts):
+    """
+    Inserts `inserts` messages one commit at a time and returns the inserts per second.
+    """
+    start = time.perf_counter()
+    for _ in range(inserts):
+        message = Message(content="price current : AAPL")
+        message.setUser()
+        allocate(message, userId)
+        db.session.add(message)
+        db.session.commit()
+    return inserts / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0,1000,10000,50000", help="history sizes to measure at")
+    parser.add_argument("--inserts", type=int, default=200, help="inserts measured at each size")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        users = {}
+        for name in ("legacy", "counter"):
+            user = User(username=name, email=name + "@example.com")
+            db.session.add(user)
+            db.session.commit()
+            users[name] = user.id
+
+        print("{:>10} {:>16} {:>16}".format("history", "legacy ins/s", "counter ins/s"))
+        for size in (int(size) for size in args.sizes.split(",")):
+            grow_history(users["legacy"], size)
+            grow_history(users["counter"], size)
+            legacy = run(legacy_allocate, users["legacy"], args.inserts)
+            counter = run(counter_allocate, users["counter"], args.inserts)
+            print("{:>10} {:>16.0f} {:>16.0f}".format(size, legacy, counter))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Microbenchmark of the per-request cost of parsing user input into API calls.
+
+Compares compile_query() with the parser it replaced (parse_input() plus request_constructor(), with list
+scans over keywords.json and nested if/elif chains), for ticker lists of growing length.
+
+Usage (from the top-level folder):
+    python benchmarks/bench_parsing.py [--tickers 1,10,100,1000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.keywords import keyword_registry
+from app.parsing import compile_query, stockkey
+
+keyword_data = keyword_registry.data()
+
+
+def legacy_parse_input(user_input):
+    user_input = user_input.replace(" ", "")
+    split_input = user_input.split(":")
+    if len(split_input) != 2:
+        return -1
+    return split_input[0].split(","), split_input[1].split(",")
+
+
+def legacy_request_constructor(keyword_list, stock_name_list):
+    queries = []
+    overview = keyword_list[0] == "overview"
+    if keyword_list[0] in keyword_data["keywords"] or overview:
+        if not overview:
+            for keyword in keyword_list:
+                if keyword not in keyword_data["keywords"]:
+                    return -1
+        for ticker in stock_name_list:
+            queries.append({"function": "OVERVIEW", "symbol": ticker, "apikey": stockkey})
+        option_matrix = []
+        for keyword in keyword_data["keywords"]:
+            option_matrix.append(1 if keyword in keyword_list or overview else 0)
+        return queries, 1, option_matrix
+    elif keyword_list[0] in keyword_data["modifiableKeywords"]:
+        if len(keyword_list) != 2:
+            return -2
+        selector = keyword_list[1]
+        if selector in keyword_data["timeSelector"]:
+            function = "GLOBAL_QUOTE" if selector == keyword_data["timeSelector"][0] else "TIME_SERIES_DAILY_ADJUSTED"
+            query_type = 2
+        elif selector in keyword_data["rangeSelector"]:
+            functions = ["TIME_SERIES_DAILY_ADJUSTED", "TIME_SERIES_WEEKLY_ADJUSTED", "TIME_SERIES_MONTHLY_ADJUSTED"]
+            function = functions[keyword_data["rangeSelector"].index(selector)]
+            query_type = 3
+        else:
+            return -1
+        for ticker in stock_name_list:
+            queries.append({"function": function, "symbol": ticker, "apikey": stockkey})
+        return queries, query_type, selector
+    return -3
+
+
+def legacy(user_input):
+    parsed = legacy_parse_input(user_input)
+    if type(parsed) == tuple:
+        return legacy_request_constructor(parsed[0], parsed[1])
+    return parsed
+
+
+def measure(function, user_input, repeat=5):
+    """
+    Returns the best per-call time of function(user_input) in microseconds.
+    """
+    timer = timeit.Timer(lambda: function(user_input))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", default="1,10,100,1000", help="ticker list lengths to measure")
+    args = parser.parse_args()
+
+    inputs = [
+        ("info,eps,peratio", "info, eps, peratio : {}"),
+        ("price,lastyear", "price, lastyear : {}"),
+    ]
+    print("{:<18} {:>8} {:>14} {:>14}".format("query", "tickers", "legacy (us)", "compiled (us)"))
+    for name, template in inputs:
+        for count in (int(count) for count in args.tickers.split(",")):
+            user_input = template.format(", ".join("T" + str(n) for n in range(count)))
+            print("{:<18} {:>8} {:>14.2f} {:>14.2f}".format(
+                name, count, measure(legacy, user_input), measure(compile_query, user_input)))
+
+
+if __name__ == "__main__":
+    main()
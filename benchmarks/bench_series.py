@@ -0,0 +1,70 @@
+"""
+Microbenchmark of answering a historical ("price, lastyear") query for one ticker.
+
+Compares decoding the JSON payload and walking it as a dict of dicts, which every range query did before
+the series store, with slicing the memory-mapped arrays the store keeps, for series of growing length.
+
+Usage (from the top-level folder):
+    python benchmarks/bench_series.py [--bars 100,1000,5000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api_calls import format_response
+from app.timeseries import SeriesStore
+
+
+def monthly_payload(bars):
+    """
+    Returns a TIME_SERIES_MONTHLY_ADJUSTED payload with `bars` bars, newest first, as a JSON string.
+    """
+    dates = np.datetime64("2023-05-31", "D") - np.arange(bars) * 30
+    series = {}
+    for day in dates.astype(str):
+        series[day] = {"1. open": "100.0000", "2. high": "110.0000", "3. low": "90.0000", "4. close": "105.0000",
+                       "5. adjusted close": "105.0000", "6. volume": "123456789", "7. dividend amount": "0.0000"}
+    return json.dumps({"Meta Data": {"2. Symbol": "IBM"}, "Monthly Adjusted Time Series": series})
+
+
+def measure(function, repeat=5):
+    """
+    Returns the best per-call time of function() in microseconds.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", default="100,1000,5000", help="series lengths to measure")
+    args = parser.parse_args()
+
+    params = {"function": "TIME_SERIES_MONTHLY_ADJUSTED", "symbol": "IBM"}
+    with tempfile.TemporaryDirectory(prefix="stockbot-bench-") as directory:
+        store = SeriesStore(directory, {}, default_ttl=3600)
+        print("{:>8} {:>16} {:>16}".format("bars", "json + dict (us)", "series (us)"))
+        for count in (int(count) for count in args.bars.split(",")):
+            text = monthly_payload(count)
+            store.put(params, json.loads(text))
+
+            def from_json():
+                return format_response([json.loads(text)], 3, "lastyear")
+
+            def from_store():
+                return format_response([store.get(params)], 3, "lastyear")
+
+            assert from_json() == from_store()
+            print("{:>8} {:>16.1f} {:>16.1f}".format(count, measure(from_json), measure(from_store)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Offline benchmark suite of the chat request path, run against the local Alpha Vantage stub (stub_server.py).
+
+Measures parse_input(), request_constructor(), compile_query() and format_response() on the recorded fixture
+payloads, and full POST / round-trips through the Flask test client with cold and warm caches, with and
+without injected upstream errors. Everything runs against throwaway databases and the stub, so no network
+access or API key is needed.
+
+The results are written as JSON. Given a previous results file with --baseline, every measurement that got
+slower by more than --tolerance is reported and the exit code is 1, so the suite can gate regressions.
+
+Usage (from the top-level folder):
+    python benchmarks/bench_suite.py [--output results.json] [--baseline old.json] [--tolerance 0.25]
+                                     [--latency 0.02] [--error-rate 0.2] [--requests 30]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubServer, load_fixtures, with_symbol
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Chat messages of every query type, each with three tickers
+MESSAGES = {
+    "overview": "overview : ibm, aapl, msft",
+    "keywords": "eps, peratio : ibm, aapl, msft",
+    "price_current": "price, current : ibm, aapl, msft",
+    "price_lastweek": "price, lastweek : ibm, aapl, msft",
+    "price_lastyear": "price, lastyear : ibm, aapl, msft",
+    "compare_lastmonth": "compare, lastmonth : ibm, aapl, msft",
+}
+
+
+def summary(samples, unit):
+    """
+    Returns the summary statistics of a list of timings.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    return {
+        "unit": unit,
+        "n": int(len(samples)),
+        "mean": float(samples.mean()),
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "min": float(samples.min()),
+    }
+
+
+def micro(function, repeat=7):
+    """
+    Times function() with timeit and returns the per-call statistics in microseconds, one sample per repeat.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return summary([total / number * 1e6 for total in timer.repeat(repeat, number)], "us")
+
+
+def bench_parsing(results, parsing):
+    for name, message in MESSAGES.items():
+        keywords, tickers = parsing.parse_input(message)
+        results["parse_input/" + name] = micro(lambda: parsing.parse_input(message))
+        results["request_constructor/" + name] = micro(lambda: parsing.request_constructor(keywords, tickers))
+        results["compile_query/" + name] = micro(lambda: parsing.compile_query(message))
+
+
+def bench_formatting(results, api_calls, parsing):
+    fixtures = load_fixtures()
+    for name, message in MESSAGES.items():
+        query = parsing.compile_query(message)
+        payloads = [with_symbol(fixtures[params["function"]], params["function"], params["symbol"].upper())
+                    for params in query.queries]
+        results["format_response/" + name] = micro(
+            lambda: api_calls.format_response(payloads, query.query_type, query.selector))
+
+
+def bench_round_trips(results, app, api_calls, stub, count, error_rate):
+    from app import db
+    from app.models import User
+
+    with app.app_context():
+        user = User(username="benchmark", email="benchmark@example.com")
+        db.session.add(user)
+        db.session.commit()
+        userId = user.id
+
+    def post(client, message):
+        started = time.perf_counter()
+        reply = client.post("/", json={"message": message}).get_json()
+        return (time.perf_counter() - started) * 1e3, reply["success"]
+
+    def clear_caches():
+        api_calls.response_cache.clear()
+        if api_calls.persistent_cache is not None:
+            api_calls.persistent_cache.clear()
+        if api_calls.series_store is not None:
+            shutil.rmtree(api_calls.series_store.root, ignore_errors=True)
+            api_calls.series_store.clear()
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session["_user_id"] = str(userId)
+            session["_fresh"] = True
+
+        for name, message in MESSAGES.items():
+            cold, warm = [], []
+            for _ in range(count):
+                clear_caches()
+                cold.append(post(client, message)[0])
+                warm.append(post(client, message)[0])
+            results["post/" + name + "/cold"] = summary(cold, "ms")
+            results["post/" + name + "/warm"] = summary(warm, "ms")
+
+        stub.error_rate = error_rate
+        timings, successes = [], 0
+        for _ in range(count):
+            for message in MESSAGES.values():
+                clear_caches()
+                elapsed, success = post(client, message)
+                timings.append(elapsed)
+                successes += success
+        stub.error_rate = 0.0
+        results["post/errors/cold"] = summary(timings, "ms")
+        results["post/errors/cold"]["success_ratio"] = successes / float(len(timings))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Returns (name, old, new) for every measurement whose median got slower than the baseline by more than `tolerance`.
+    """
+    slower = []
+    for name, stats in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is not None and old["unit"] == stats["unit"] and stats["p50"] > old["p50"] * (1 + tolerance):
+            slower.append((name, old["p50"], stats["p50"]))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="results file, defaults to benchmarks/results/suite-<time>.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of a median, e.g. 0.25")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub waits before each reply")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="share of failed upstream calls in the error run")
+    parser.add_argument("--requests", type=int, default=30, help="round-trips measured per message")
+    args = parser.parse_args()
+
+    stub = StubServer(latency=args.latency, seed=1)
+    stub.start()
+
+    # Point the app at the stub and at throwaway databases before it is imported
+    bench_dir = tempfile.mkdtemp(prefix="stockbot-bench-")
+    os.environ.update({
+        "ALPHA_VANTAGE_URL": stub.url,
+        "AV_API": "benchmark",
+        "DATABASE_URL": "sqlite:///" + os.path.join(bench_dir, "bench.db"),
+        "CACHE_DATABASE_PATH": os.path.join(bench_dir, "cache.db"),
+        "SERIES_STORE_PATH": os.path.join(bench_dir, "series"),
+        "UPSTREAM_CALLS_PER_MINUTE": "1000000",
+        "UPSTREAM_CALLS_PER_DAY": "1000000",
+        "HTTP_BACKOFF": "0.01",
+        "PERSIST_WRITE_BEHIND": "0",
+        "PREFETCH": "0",
+    })
+    from app import app, db, api_calls, parsing
+    with app.app_context():
+        db.create_all()
+
+    results = {}
+    started = time.time()
+    bench_parsing(results, parsing)
+    bench_formatting(results, api_calls, parsing)
+    bench_round_trips(results, app, api_calls, stub, args.requests, args.error_rate)
+    stub.stop()
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "requests": args.requests,
+            "duration": time.time() - started,
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "suite-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+
+    print("{:<44} {:>6} {:>12} {:>12}".format("measurement", "unit", "p50", "p95"))
+    for name, stats in sorted(results.items()):
+        print("{:<44} {:>6} {:>12.2f} {:>12.2f}".format(name, stats["unit"], stats["p50"], stats["p95"]))
+    print("\nResults written to " + output)
+    shutil.rmtree(bench_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            slower = regressions(results, json.load(handle), args.tolerance)
+        for name, old, new in slower:
+            print("REGRESSION {}: {:.2f} -> {:.2f}".format(name, old, new))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
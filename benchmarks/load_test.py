@@ -0,0 +1,246 @@
+"""
+Load test of the chat endpoint with many simulated users, against the local Alpha Vantage stub (stub_server.py).
+
+Starts the app in a threaded server on one worker, with throwaway databases and every upstream call answered by
+the stub, then runs --users simulated users for --duration seconds. Logged-in users register through
+/register and sign in through /login first; anonymous users only chat. Every user sends chat messages drawn
+from a query mix built from keywords.json, and logged-in users open /history every --history-every messages.
+
+Reports the throughput and the p50/p95/p99 latency of each route, optionally as JSON with --output.
+
+The mix gives a weight to each kind of query, e.g. --mix "keywords=3,price=5,compare=1,overview=1", where
+"price" covers every time and range selector of the "price" keyword and "compare" every range selector.
+
+Usage (from the top-level folder):
+    python benchmarks/load_test.py [--users 20] [--logged-in 0.5] [--duration 30] [--latency 0.05]
+                                   [--mix keywords=3,price=5,compare=1,overview=1] [--no-cache] [--output load.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubServer
+
+KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "static", "keywords.json")
+
+TICKERS = ["IBM", "AAPL", "MSFT", "TSLA", "AMZN", "GOOG", "META", "NVDA"]
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def build_mix(keyword_data, weights, tickers=TICKERS, seed=0):
+    """
+    Builds the chat messages of a query mix from the keyword file.
+
+    Args:
+        keyword_data (dict): The contents of keywords.json.
+        weights (dict): The weight of each kind of query: "keywords", "overview", "price" and "compare".
+        tickers (list): The tickers the messages ask about, one to three per message.
+
+    Returns:
+        tuple: The messages and their weights, normalized to sum to 1.
+    """
+    chooser = random.Random(seed)
+    pick = lambda: ", ".join(chooser.sample(tickers, chooser.randint(1, 3)))
+    kinds = {
+        "keywords": [", ".join(chooser.sample(keyword_data["keywords"], chooser.randint(1, 3))) for _ in range(10)],
+        "overview": ["overview"],
+        "price": [keyword + ", " + selector for keyword in keyword_data["modifiableKeywords"]
+                  for selector in keyword_data["timeSelector"] + keyword_data["rangeSelector"]],
+        "compare": [keyword + ", " + selector for keyword in keyword_data.get("comparisonKeywords", [])
+                    for selector in keyword_data["rangeSelector"]],
+    }
+
+    messages, message_weights = [], []
+    for kind, weight in weights.items():
+        variants = kinds[kind]
+        for keywords in variants:
+            for _ in range(5):
+                messages.append(keywords + " : " + pick())
+                message_weights.append(weight / float(len(variants) * 5))
+    total = sum(message_weights)
+    return messages, [weight / total for weight in message_weights]
+
+
+class Recorder(object):
+    """
+    Collects the latency and outcome of every request, per route.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def timed(self, route, send, ok=None):
+        """
+        Sends a request with send() and records its latency under `route`. Returns the response, or None on error.
+        A response counts as an error if its status is 4xx/5xx, or if ok(response) is given and returns False.
+        """
+        started = time.perf_counter()
+        try:
+            response = send()
+            failed = response.status_code >= 400 or (ok is not None and not ok(response))
+        except requests.RequestException:
+            response, failed = None, True
+        elapsed = (time.perf_counter() - started) * 1e3
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if failed:
+                self.errors[route] += 1
+        return response
+
+    def report(self, elapsed):
+        """
+        Returns the count, error count, throughput and latency percentiles in milliseconds of each route.
+        """
+        report = {}
+        with self._lock:
+            for route, samples in sorted(self.latencies.items()):
+                samples = np.asarray(samples)
+                report[route] = {
+                    "requests": int(len(samples)),
+                    "errors": self.errors[route],
+                    "throughput": len(samples) / elapsed,
+                    "mean": float(samples.mean()),
+                    "p50": float(np.percentile(samples, 50)),
+                    "p95": float(np.percentile(samples, 95)),
+                    "p99": float(np.percentile(samples, 99)),
+                }
+        return report
+
+
+def csrf_token(response):
+    match = CSRF_PATTERN.search(response.text) if response is not None else None
+    return match.group(1) if match else ""
+
+
+def simulated_user(number, base, logged_in, deadline, messages, weights, history_every, recorder, seed):
+    """
+    Runs one user's session until the deadline: signing up and in if `logged_in`, then chatting.
+    """
+    # every user sends its own sequence of messages
+    chooser = random.Random(seed * 100003 + number)
+    session = requests.Session()
+    kind = "logged_in" if logged_in else "anonymous"
+
+    if logged_in:
+        name = "load_user_%d_%d" % (seed, number)
+        form = recorder.timed("GET /register", lambda: session.get(base + "/register"))
+        recorder.timed("POST /register", lambda: session.post(base + "/register", data={
+            "csrf_token": csrf_token(form), "username": name, "email": name + "@example.com",
+            "password": "load-test", "password2": "load-test"}, allow_redirects=False),
+            ok=lambda response: response.headers.get("Location", "").endswith("/login"))
+        form = recorder.timed("GET /login", lambda: session.get(base + "/login"))
+        recorder.timed("POST /login", lambda: session.post(base + "/login", data={
+            "csrf_token": csrf_token(form), "username": name, "password": "load-test"}, allow_redirects=False),
+            ok=lambda response: response.status_code == 302 and not response.headers["Location"].endswith("/login"))
+
+    sent = 0
+    while time.monotonic() < deadline:
+        message = messages[chooser.choices(range(len(messages)), weights)[0]]
+        recorder.timed("POST / (" + kind + ")", lambda: session.post(base + "/", json={"message": message}))
+        sent += 1
+        if logged_in and history_every and sent % history_every == 0:
+            recorder.timed("GET /history", lambda: session.get(base + "/history", allow_redirects=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="number of simulated users")
+    parser.add_argument("--logged-in", type=float, default=0.5, help="share of users that sign up and log in")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of chatting per user")
+    parser.add_argument("--ramp", type=float, default=2, help="seconds over which the users start")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub waits before each reply")
+    parser.add_argument("--mix", default="keywords=3,price=5,compare=1,overview=1", help="weight of each query kind")
+    parser.add_argument("--history-every", type=int, default=10, help="logged-in users open /history every N messages")
+    parser.add_argument("--no-cache", action="store_true", help="disable every cache, so each query goes to the stub")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    stub = StubServer(latency=args.latency, seed=args.seed)
+    stub.start()
+
+    # Point the app at the stub and at throwaway databases before it is imported
+    load_dir = tempfile.mkdtemp(prefix="stockbot-load-")
+    os.environ.update({
+        "ALPHA_VANTAGE_URL": stub.url,
+        "AV_API": "load-test",
+        "DATABASE_URL": "sqlite:///" + os.path.join(load_dir, "load.db"),
+        "CACHE_DATABASE_PATH": os.path.join(load_dir, "cache.db"),
+        "SERIES_STORE_PATH": os.path.join(load_dir, "series"),
+        "UPSTREAM_CALLS_PER_MINUTE": "1000000",
+        "UPSTREAM_CALLS_PER_DAY": "1000000",
+        "PREFETCH": "0",
+    })
+    if args.no_cache:
+        os.environ.update({"CACHE_MAX_ENTRIES": "0", "CACHE_PERSISTENT": "0", "SERIES_STORE": "0"})
+
+    from werkzeug.serving import make_server
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app_server", daemon=True).start()
+    base = "http://127.0.0.1:%d" % server.server_port
+
+    with open(KEYWORDS_PATH) as handle:
+        keyword_data = json.load(handle)
+    weights = {kind: float(weight) for kind, weight in (item.split("=") for item in args.mix.split(","))}
+    messages, message_weights = build_mix(keyword_data, weights, seed=args.seed)
+
+    recorder = Recorder()
+    logged_in_users = int(round(args.users * args.logged_in))
+    started = time.monotonic()
+    threads = []
+    for number in range(args.users):
+        start_at = started + args.ramp * number / max(args.users, 1)
+        deadline = start_at + args.duration
+        thread = threading.Thread(target=lambda n=number, s=start_at, d=deadline: (
+            time.sleep(max(0, s - time.monotonic())),
+            simulated_user(n, base, n < logged_in_users, d, messages, message_weights,
+                           args.history_every, recorder, args.seed)))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    server.shutdown()
+    stub.stop()
+    shutil.rmtree(load_dir, ignore_errors=True)
+
+    report = recorder.report(elapsed)
+    print("{} users ({} logged in) for {:.1f}s, stub latency {:.0f}ms, {} upstream calls\n".format(
+        args.users, logged_in_users, elapsed, args.latency * 1e3, stub.requests))
+    print("{:<26} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+        "route", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"))
+    for route, stats in report.items():
+        print("{:<26} {:>8} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+            route, stats["requests"], stats["errors"], stats["throughput"], stats["p50"], stats["p95"], stats["p99"]))
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({"settings": vars(args), "elapsed": elapsed, "upstream_calls": stub.requests,
+                       "routes": report}, handle, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
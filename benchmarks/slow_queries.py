@@ -0,0 +1,120 @@
+"""
+Offline analysis of the slow-query log written by the app (SLOW_QUERY_LOG_PATH, app/slow_queries.log by default).
+
+Groups the logged chat queries by their shape, e.g. "price lastyear x3" for the price of three tickers over
+the last year, and reports for each shape the number of slow queries, their share of the total slow time,
+the p50/p95/max duration, the mean time of each stage, the share of queries with an upstream error and the
+mean reply size. Shapes are sorted by total slow time, so the ones dominating the tail latency come first.
+
+Usage (from the top-level folder):
+    python benchmarks/slow_queries.py [app/slow_queries.log] [--since 2024-01-01] [--top 20] [--by-type] [--json]
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "slow_queries.log")
+
+STAGES = ("parse", "upstream", "format", "save")
+
+
+def read_entries(path):
+    """
+    Returns the entries of a slow-query log, skipping lines that are not valid JSON.
+    """
+    entries = []
+    with open(path) as handle:
+        for line in handle:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def group_key(shape, by_type=False):
+    """
+    Returns the group of a logged shape, e.g. "price lastyear x3", or "type 3 x3" when grouping by query type.
+    """
+    if shape.get("error"):
+        return "error " + shape["error"].lower()
+    if by_type:
+        return "type {} x{}".format(shape["type"], shape["tickers"])
+    words = [keyword for keyword in shape["keywords"] if keyword != shape["selector"]]
+    if shape["selector"] is not None:
+        words.append(shape["selector"])
+    return " ".join(words) + " x" + str(shape["tickers"])
+
+
+def aggregate(entries, by_type=False):
+    """
+    Aggregates log entries by query shape.
+
+    Args:
+        entries (list): The entries of the slow-query log.
+        by_type (bool): Whether to group by query type and ticker count instead of by keywords.
+
+    Returns:
+        list: One dictionary of statistics per shape, the shapes with the most slow time first.
+    """
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[group_key(entry["shape"], by_type)].append(entry)
+
+    total = sum(entry["duration"] for entry in entries) or 1.0
+    report = []
+    for shape, members in groups.items():
+        durations = np.array([entry["duration"] for entry in members])
+        report.append({
+            "shape": shape,
+            "count": len(members),
+            "share": float(durations.sum() / total),
+            "p50": float(np.percentile(durations, 50)),
+            "p95": float(np.percentile(durations, 95)),
+            "max": float(durations.max()),
+            "stages": {stage: float(np.mean([entry["stages"].get(stage, 0.0) for entry in members]))
+                       for stage in STAGES},
+            "upstream_errors": sum(any(outcome != "ok" for outcome in entry["upstream"]) for entry in members)
+                               / float(len(members)),
+            "size": float(np.mean([entry["size"] or 0 for entry in members])),
+            "users": len(set(entry["user"] for entry in members if entry["user"])),
+        })
+    report.sort(key=lambda stats: stats["share"], reverse=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", default=LOG_PATH, help="the slow-query log")
+    parser.add_argument("--since", help="only entries from this ISO date or time on, in UTC")
+    parser.add_argument("--top", type=int, default=20, help="number of shapes shown")
+    parser.add_argument("--by-type", action="store_true", help="group by query type and ticker count")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    entries = read_entries(args.log)
+    if args.since:
+        entries = [entry for entry in entries if entry["time"] >= args.since]
+    if not entries:
+        print("No slow queries logged.")
+        return
+
+    report = aggregate(entries, args.by_type)[:args.top]
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print("{} slow queries, {:.1f}s in total\n".format(len(entries), sum(entry["duration"] for entry in entries)))
+    print("{:<36} {:>6} {:>7} {:>8} {:>8} {:>8} {:>10} {:>9} {:>7}".format(
+        "shape", "count", "share", "p50 s", "p95 s", "max s", "upstream s", "errors", "size"))
+    for stats in report:
+        print("{:<36} {:>6} {:>6.1%} {:>8.2f} {:>8.2f} {:>8.2f} {:>10.2f} {:>8.1%} {:>7.0f}".format(
+            stats["shape"][:36], stats["count"], stats["share"], stats["p50"], stats["p95"], stats["max"],
+            stats["stages"]["upstream"], stats["upstream_errors"], stats["size"]))
+
+
+if __name__ == "__main__":
+    main()
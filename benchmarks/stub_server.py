@@ -0,0 +1,153 @@
+"""
+Local stand-in for the Alpha Vantage query endpoint, serving the payloads in benchmarks/fixtures.
+
+Each API function is answered with its fixture, with the symbol of the request written into the payload,
+after a configurable latency. A share of the requests can be failed on purpose, either with a HTTP 503 or
+with the call limit notice Alpha Vantage sends with HTTP 200.
+
+Usage (from the top-level folder):
+    python benchmarks/stub_server.py [--port 8765] [--latency 0.05] [--error-rate 0.0] [--error-kind 503]
+
+Then point the app at it with ALPHA_VANTAGE_URL=http://127.0.0.1:8765/query.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Where each function's payload holds the symbol
+SYMBOL_FIELDS = {
+    "OVERVIEW": (None, "Symbol"),
+    "GLOBAL_QUOTE": ("Global Quote", "01. symbol"),
+}
+
+# The notice Alpha Vantage sends, with HTTP 200, once the call limit is reached
+QUOTA_NOTICE = {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."}
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """
+    Returns the fixture payloads in `directory`, keyed on the API function named by each file.
+    """
+    fixtures = {}
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as handle:
+                fixtures[name[:-len(".json")]] = json.load(handle)
+    return fixtures
+
+
+def with_symbol(payload, function, symbol):
+    """
+    Returns a copy of a fixture payload with the requested symbol written into it.
+    """
+    payload = dict(payload)
+    parent, field = SYMBOL_FIELDS.get(function, ("Meta Data", "2. Symbol"))
+    if parent is None:
+        payload[field] = symbol
+    else:
+        payload[parent] = dict(payload[parent], **{field: symbol})
+    return payload
+
+
+class StubServer(object):
+    """
+    A threaded HTTP server answering Alpha Vantage queries from fixtures.
+
+    Attributes:
+        latency (float): Seconds slept before each reply.
+        error_rate (float): The share of requests that fail, from 0 to 1.
+        error_kind (str): "503" to fail with HTTP 503, or "quota" to send the call limit notice.
+        requests (int): The number of requests served.
+        url (str): The query URL of the running server.
+    """
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, error_kind="503", seed=None, fixtures=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.requests = 0
+        self.fixtures = fixtures if fixtures is not None else load_fixtures()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self.url = "http://127.0.0.1:%d/query" % self._server.server_address[1]
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body = stub.reply(url.path, parse_qs(url.query))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def reply(self, path, query):
+        """
+        Returns the status code and JSON body answering a request for `path` with the parsed query string.
+        """
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if path != "/query":
+            return 404, {}
+        if failed:
+            return (503, {}) if self.error_kind == "503" else (200, QUOTA_NOTICE)
+
+        function = query.get("function", [""])[0]
+        symbol = query.get("symbol", [""])[0]
+        if function not in self.fixtures or not symbol:
+            return 200, {"Error Message": "Invalid API call. Please retry or visit the documentation."}
+        return 200, with_symbol(self.fixtures[function], function, symbol.upper())
+
+    def start(self):
+        """
+        Serves requests from a background thread and returns the query URL.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub_server", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds slept before each reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail, from 0 to 1")
+    parser.add_argument("--error-kind", choices=["503", "quota"], default="503")
+    args = parser.parse_args()
+
+    stub = StubServer(args.port, args.latency, args.error_rate, args.error_kind)
+    print("Serving Alpha Vantage fixtures at " + stub.start())
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
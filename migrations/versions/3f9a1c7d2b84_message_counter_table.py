@@ -0,0 +1,37 @@
+"""message counter table
+
+Revision ID: 3f9a1c7d2b84
+Revises: 6c545acf599e
+Create Date: 2026-10-18 10:12:41.532118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7d2b84'
+down_revision = '6c545acf599e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('message_counter',
+    sa.Column('userId', sa.Integer(), nullable=False),
+    sa.Column('lastId', sa.Integer(), nullable=False),
+    sa.Column('lastConversationId', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['userId'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('userId')
+    )
+
+    # backfill the counters of existing users from their messages
+    op.execute(
+        'INSERT INTO message_counter ("userId", "lastId", "lastConversationId") '
+        'SELECT "userId", MAX(id), MAX("conversationId") FROM message '
+        'WHERE "userId" IS NOT NULL GROUP BY "userId"'
+    )
+
+
+def downgrade():
+    op.drop_table('message_counter')
@@ -0,0 +1,64 @@
+"""re-key message table for userId-first access
+
+Revision ID: 8b2e5d0a41c6
+Revises: 3f9a1c7d2b84
+Create Date: 2026-10-18 11:40:03.218874
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e5d0a41c6'
+down_revision = '3f9a1c7d2b84'
+branch_labels = None
+depends_on = None
+
+COLUMNS = '"id", "conversationId", "parentId", "userId", "timeStamp", "content", "isUser"'
+
+
+def create_message_table(name, primary_key, user_nullable=False):
+    op.create_table(name,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversationId', sa.Integer(), nullable=False),
+    sa.Column('parentId', sa.String(length=36), nullable=True),
+    sa.Column('userId', sa.Integer(), nullable=user_nullable),
+    sa.Column('timeStamp', sa.DateTime(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('isUser', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['userId'], ['user.id'], ),
+    sa.PrimaryKeyConstraint(*primary_key),
+    )
+
+
+def rebuild_message_table(primary_key, user_nullable=False):
+    # SQLite cannot change a primary key in place, so the table is rebuilt and the rows copied over
+    # in a single INSERT ... SELECT, which only holds the write lock for the length of the copy
+    create_message_table('message_rekeyed', primary_key, user_nullable)
+    op.execute('INSERT INTO message_rekeyed (' + COLUMNS + ') SELECT ' + COLUMNS + ' FROM message')
+    op.drop_table('message')
+    op.rename_table('message_rekeyed', 'message')
+
+
+def upgrade():
+    # userId becomes part of the primary key; messages without a user cannot be copied, and are not
+    # dropped silently, so the upgrade stops until they are dealt with
+    orphans = op.get_bind().execute(sa.text('SELECT COUNT(*) FROM message WHERE "userId" IS NULL')).scalar()
+    if orphans:
+        raise RuntimeError(str(orphans) + ' message rows have no userId. Delete them or assign them to a user '
+                           'before running this upgrade, e.g. DELETE FROM message WHERE "userId" IS NULL;')
+    rebuild_message_table(['userId', 'id', 'conversationId'])
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        # history pages: a user's sent messages, newest first
+        batch_op.create_index('ix_message_userId_isUser_timeStamp', ['userId', 'isUser', 'timeStamp', 'id'], unique=False)
+        # conversationId lookups when a user's counter is seeded
+        batch_op.create_index('ix_message_userId_conversationId', ['userId', 'conversationId'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_userId_conversationId')
+        batch_op.drop_index('ix_message_userId_isUser_timeStamp')
+    # back to the previous schema, where userId may be NULL
+    rebuild_message_table(['id', 'conversationId', 'userId'], user_nullable=True)
@@ -0,0 +1,35 @@
+"""watchlist item table
+
+Revision ID: c71d4e9a3f05
+Revises: 8b2e5d0a41c6
+Create Date: 2026-10-18 14:05:27.904413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d4e9a3f05'
+down_revision = '8b2e5d0a41c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('watchlist_item',
+    sa.Column('userId', sa.Integer(), nullable=False),
+    sa.Column('symbol', sa.String(length=16), nullable=False),
+    sa.Column('addedAt', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['userId'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('userId', 'symbol')
+    )
+    with op.batch_alter_table('watchlist_item', schema=None) as batch_op:
+        batch_op.create_index('ix_watchlist_item_symbol', ['symbol'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('watchlist_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_watchlist_item_symbol')
+
+    op.drop_table('watchlist_item')
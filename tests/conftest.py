@@ -1,7 +1,54 @@
+import os
+import tempfile
+
+# Point the app at throwaway databases before it is imported, so the tests never write to app.db
+_test_dir = tempfile.mkdtemp(prefix="stockbot-tests-")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_test_dir, "test.db"))
+os.environ.setdefault("CACHE_DATABASE_PATH", os.path.join(_test_dir, "cache.db"))
+os.environ.setdefault("SERIES_STORE_PATH", os.path.join(_test_dir, "series"))
+os.environ.setdefault("SLOW_QUERY_LOG_PATH", os.path.join(_test_dir, "slow_queries.log"))
+
 from app.forms import Login, Registration  
-from app import app
+from app import app, db, api_calls
+from app.cache import PersistentCache
+from app.models import User
+from app.scheduler import UpstreamScheduler
+from app.timeseries import SeriesStore
 import pytest
 
+
+class FakeClock:
+    """
+    A manually advanced clock so refills and expiry can be tested without sleeping.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeReply:
+    """
+    Minimal stand-in for a requests.Response returned by the Alpha Vantage API.
+    """
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    """
+    Pytest fixture that creates the tables of the test database once per test session.
+    """
+    with app.app_context():
+        db.create_all()
+    yield db
+
 @pytest.fixture(scope='module')
 def login_form():
     """
@@ -55,3 +102,58 @@ def test_client():
         # Establish an application context
         with app.app_context():
             yield testing_client
+
+
+@pytest.fixture
+def clock():
+    """
+    Pytest fixture that yields a FakeClock starting at 0, advanced by setting its `now` attribute.
+
+    Yields:
+        FakeClock: A manually advanced clock.
+    """
+    yield FakeClock()
+
+
+@pytest.fixture
+def fake_reply():
+    """
+    Pytest fixture that yields the FakeReply class, for fake http_client.get functions.
+
+    Yields:
+        type: FakeReply, built from a status code and a JSON payload.
+    """
+    yield FakeReply
+
+
+@pytest.fixture
+def make_user():
+    """
+    Pytest fixture that yields a function adding a user to the test database. Must be called inside an app context.
+
+    Yields:
+        function: Takes a unique name and returns the id of the new user.
+    """
+    def make(name):
+        user = User(username=name, email=name + "@example.com")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+    yield make
+
+
+@pytest.fixture
+def empty_cache(monkeypatch, tmp_path):
+    """
+    Pytest fixture that empties the response cache and swaps the shared cache and series store for temporary ones,
+    so every test reaches the (fake) API and nothing is written next to app.db. The call limit is
+    lifted and retries do not back off, so the tests never wait.
+    """
+    api_calls.response_cache.clear()
+    monkeypatch.setattr(api_calls, "persistent_cache",
+                        PersistentCache(str(tmp_path / "cache.db"), {}, default_ttl=60, sweep_interval=0))
+    monkeypatch.setattr(api_calls, "series_store", SeriesStore(str(tmp_path / "series"), {}, default_ttl=60))
+    monkeypatch.setattr(api_calls, "upstream_scheduler", UpstreamScheduler(100000, 100000))
+    monkeypatch.setattr(api_calls.http_client, "backoff", 0)
+    yield
+    api_calls.response_cache.clear()
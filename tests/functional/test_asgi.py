@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+import httpx
+from app import app, db, api_calls
+from app.asgi import application
+from app.models import User, Message
+
+
+async def fake_overview_async(params, priority=None):
+    """
+    Stand-in for api_calls.fetch_async that answers OVERVIEW queries after 50ms.
+    """
+    await asyncio.sleep(0.05)
+    return fake_overview(params)
+
+
+def fake_overview(params, priority=None):
+    """
+    Stand-in for api_calls.fetch that answers OVERVIEW queries.
+    """
+    return {"Name": params["symbol"] + " Inc.", "Symbol": params["symbol"], "Description": "A company.",
+            "DividendYield": "0.01", "DividendPerShare": "1", "EPS": "2", "PERatio": "3", "ProfitMargin": "0.2"}
+
+
+def session_cookie(userId):
+    """
+    Returns the session cookie of a logged in user, as Flask-Login would set it.
+    """
+    value = app.session_interface.get_signing_serializer(app).dumps({"_user_id": str(userId), "_fresh": True})
+    return {app.config["SESSION_COOKIE_NAME"]: value}
+
+
+def send(requests, cookies=None):
+    """
+    Sends (method, path, json) requests to the ASGI application all at once and returns the responses.
+    """
+    async def send_all():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver", cookies=cookies) as client:
+            return await asyncio.gather(*(client.request(method, path, json=body) for method, path, body in requests))
+    return asyncio.run(send_all())
+
+
+def test_asgi_chat_waits_on_upstream_concurrently(monkeypatch):
+    """
+    Test that chat messages sent to the ASGI application wait on upstream together, not one after another.
+
+    Steps:
+    1. Replace the async fetch with a fake taking 50ms per query.
+    2. Send twenty two-ticker messages at once.
+    3. Check the replies, and that they took about as long as one fetch.
+    """
+
+    # Step 1: Replace the async fetch
+    monkeypatch.setattr(api_calls, "fetch_async", fake_overview_async)
+
+    # Step 2: Send the messages at once
+    started = time.perf_counter()
+    responses = send([("POST", "/", {"message": "overview : aapl, msft"})] * 20)
+    elapsed = time.perf_counter() - started
+
+    # Step 3: Check the replies
+    for response in responses:
+        data = response.json()
+        assert data["success"] is True
+        assert data["content"].index("AAPL Inc.") < data["content"].index("MSFT Inc.")
+        assert data["not_auth_msg"].startswith("User not authenticated")
+    assert elapsed < 0.5
+
+
+def test_asgi_chat_saves_the_turn_of_a_logged_in_user(monkeypatch):
+    """
+    Test that the ASGI chat path saves the turn of a logged in user, like the Flask view.
+
+    Steps:
+    1. Create a user and replace the async fetch.
+    2. Send a message with the user's session cookie.
+    3. Check the reply and the saved messages.
+    """
+
+    # Step 1: Create the user
+    monkeypatch.setattr(api_calls, "fetch_async", fake_overview_async)
+    with app.app_context():
+        user = User(username="ivan_async", email="ivan_async@example.com")
+        db.session.add(user)
+        db.session.commit()
+        userId = user.id
+
+    # Step 2: Send the message
+    response, = send([("POST", "/", {"message": "overview : ibm"})], cookies=session_cookie(userId))
+
+    # Step 3: Check the reply and the turn
+    assert response.json()["not_auth_msg"] == ""
+    with app.app_context():
+        contents = [message.content for message in Message.query.filter_by(userId=userId).order_by(Message.id)]
+    assert contents == ["overview : ibm", response.json()["content"]]
+
+
+def test_asgi_passes_other_requests_to_flask(monkeypatch):
+    """
+    Test that requests not answered on the event loop are served by the Flask app.
+
+    Steps:
+    1. Replace the blocking fetch used by the Flask view.
+    2. Request a page, a streamed chat reply and a message that cannot be parsed.
+    3. Check each response.
+    """
+
+    # Step 1: Replace the blocking fetch
+    monkeypatch.setattr(api_calls, "fetch", fake_overview)
+
+    # Step 2: Send the requests
+    page, streamed, invalid = send([
+        ("GET", "/help", None),
+        ("POST", "/", {"message": "overview : aapl, msft", "stream": True}),
+        ("POST", "/", {"message": "overview aapl"}),
+    ])
+
+    # Step 3: Check the responses
+    assert page.status_code == 200 and page.headers["content-type"].startswith("text/html")
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    assert lines[-1]["done"] is True and "MSFT Inc." in lines[-1]["content"]
+    assert invalid.json()["content"] == "INFO: The input format was invalid."
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from app import app, db, api_calls
+from app.models import User, Message
+
+
+def fake_overview(params, priority=None):
+    """
+    Stand-in for api_calls.fetch that answers OVERVIEW queries, with the first ticker answering last.
+    """
+    if params["symbol"] == "AAPL":
+        time.sleep(0.05)
+    return {
+        "Name": params["symbol"] + " Inc.",
+        "Symbol": params["symbol"],
+        "Description": "A company.",
+        "DividendYield": "0.01",
+        "DividendPerShare": "1",
+        "EPS": "2",
+        "PERatio": "3",
+        "ProfitMargin": "0.2",
+    }
+
+
+def test_streamed_turn_is_saved_when_the_client_disconnects(monkeypatch):
+    """
+    Test that a logged in user's turn is saved with the blocks sent so far when a streamed reply is closed early.
+
+    Steps:
+    1. Create a user and log in, with a fake fetch where the first ticker never answers until released.
+    2. Read the header and the second ticker's block of a streamed reply, then close the response.
+    3. Check that the turn was saved with the block that was sent.
+    """
+
+    # Step 1: Create the user, with a fetch that holds the first ticker back
+    release = threading.Event()
+
+    def held_fetch(params, priority=None):
+        if params["symbol"] == "AAPL":
+            release.wait(2)
+        return fake_overview(params)
+
+    monkeypatch.setattr(api_calls, "fetch", held_fetch)
+    with app.app_context():
+        user = User(username="judy_stream", email="judy_stream@example.com")
+        db.session.add(user)
+        db.session.commit()
+        userId = user.id
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session["_user_id"] = str(userId)
+            session["_fresh"] = True
+
+        # Step 2: Read two lines and close
+        response = client.post('/', json={"message": "overview : aapl, msft", "stream": True}, buffered=False)
+        lines = iter(response.response)
+        assert "not_auth_msg" in json.loads(next(lines))
+        block = json.loads(next(lines))
+        response.close()
+    release.set()
+
+    # Step 3: Check the saved turn
+    assert block["index"] == 1
+    with app.app_context():
+        contents = [message.content for message in Message.query.filter_by(userId=userId).order_by(Message.id)]
+    assert contents == ["overview : aapl, msft", block["content"]]
+
+
+def test_chat_post_returns_json(test_client, monkeypatch):
+    """
+    Test that a chat message without "stream" gets a single JSON reply with every ticker in query order.
+
+    Steps:
+    1. Replace the API fetch with a fake.
+    2. POST a two-ticker overview query.
+    3. Check that the reply holds both tickers in query order.
+    """
+
+    # Step 1: Replace the API fetch
+    monkeypatch.setattr(api_calls, "fetch", fake_overview)
+
+    # Step 2: POST the query
+    response = test_client.post('/', json={"message": "overview : aapl, msft"})
+
+    # Step 3: Check the reply
+    data = response.get_json()
+    assert data["success"] is True
+    assert data["content"].index("AAPL Inc.") < data["content"].index("MSFT Inc.")
+
+
+def test_chat_post_streams_each_ticker(test_client, monkeypatch):
+    """
+    Test that a streamed chat reply sends each ticker's block as soon as it is ready.
+
+    Steps:
+    1. Replace the API fetch with a fake where the first ticker is slowest.
+    2. POST a two-ticker overview query with "stream" set.
+    3. Check the NDJSON lines: the header, the fastest ticker first, and the final reply in query order.
+    """
+
+    # Step 1: Replace the API fetch
+    monkeypatch.setattr(api_calls, "fetch", fake_overview)
+
+    # Step 2: POST the query
+    response = test_client.post('/', json={"message": "overview : aapl, msft", "stream": True})
+
+    # Step 3: Check the lines
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert "not_auth_msg" in lines[0]
+    assert lines[1]["index"] == 1 and "MSFT Inc." in lines[1]["content"]
+    assert lines[2]["index"] == 0 and "AAPL Inc." in lines[2]["content"]
+    assert lines[3]["done"] is True and lines[3]["success"] is True
+    assert lines[3]["content"] == lines[2]["content"] + lines[1]["content"]
+
+
+def test_chat_post_invalid_input_is_not_streamed(test_client):
+    """
+    Test that a reply that needs no API call is a plain JSON object even when streaming is requested.
+    """
+    response = test_client.post('/', json={"message": "no colon here", "stream": True})
+
+    assert response.get_json()["content"] == "INFO: The input format was invalid."
+
+
+def test_metrics_and_stage_timing_header(test_client, monkeypatch):
+    """
+    Test that a chat reply is timed stage by stage and that the timings appear on /metrics.
+
+    Steps:
+    1. Turn on the Server-Timing header and replace the API fetch with a fake.
+    2. POST a query and check the stages in the header.
+    3. Check that /metrics reports the stages and the request.
+    """
+
+    # Step 1: Turn on the header
+    monkeypatch.setitem(app.config, "METRICS_TIMING_HEADER", True)
+    monkeypatch.setattr(api_calls, "fetch", fake_overview)
+
+    # Step 2: POST the query
+    response = test_client.post('/', json={"message": "overview : msft"})
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert stages == ["parse", "upstream", "format"]
+
+    # Step 3: Check /metrics
+    text = test_client.get('/metrics').get_data(as_text=True)
+    assert 'stockbot_stage_duration_seconds_count{stage="upstream"}' in text
+    assert 'stockbot_request_duration_seconds_count{route="/",method="POST"}' in text
+    assert 'stockbot_cache_hit_ratio{cache="response"}' in text
+
+
+def test_slow_chat_query_is_logged(test_client, monkeypatch, tmp_path):
+    """
+    Test that a chat query slower than the threshold is written to the slow-query log.
+
+    Steps:
+    1. Point the slow-query log at a temporary file with a zero threshold.
+    2. POST a query, streamed and not streamed.
+    3. Check both entries.
+    """
+
+    # Step 1: Log every query
+    from app import routes
+    from app.slowlog import SlowQueryLog
+    monkeypatch.setattr(routes, "slow_query_log", SlowQueryLog(str(tmp_path / "slow.log"), threshold=0))
+    monkeypatch.setattr(api_calls, "fetch", fake_overview)
+
+    # Step 2: POST the queries
+    plain = test_client.post('/', json={"message": "overview : aapl, msft"}).get_data()
+    streamed = test_client.post('/', json={"message": "overview : msft", "stream": True}).get_data()
+
+    # Step 3: Check the entries
+    with open(tmp_path / "slow.log") as handle:
+        entries = [json.loads(line) for line in handle]
+    assert [entry["shape"]["tickers"] for entry in entries] == [2, 1]
+    assert [entry["upstream"] for entry in entries] == [["ok", "ok"], ["ok"]]
+    assert entries[0]["size"] == len(plain) and entries[1]["size"] == len(streamed)
+    assert set(entries[0]["stages"]) == {"parse", "upstream", "format"}
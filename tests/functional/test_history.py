@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from app import app, db
+from app.models import User
+from app.persistence import save_turn
+
+
+def make_history(name, turns):
+    """
+    Adds a user with `turns` chat turns, one minute apart, and returns the user's id.
+    """
+    with app.app_context():
+        user = User(username=name, email=name + "@example.com")
+        db.session.add(user)
+        db.session.commit()
+        start = datetime(2023, 5, 1, 9, 0, 0)
+        for n in range(turns):
+            sent_at = start + timedelta(minutes=n)
+            save_turn(user.id, "question " + str(n), "answer " + str(n), sent_at, sent_at + timedelta(seconds=1))
+        return user.id
+
+
+def login_as(client, userId):
+    """
+    Logs the test client in as the given user without going through the login form.
+    """
+    with client.session_transaction() as session:
+        session["_user_id"] = str(userId)
+        session["_fresh"] = True
+
+
+def test_history_messages_pages_through_every_turn():
+    """
+    Test that /history/messages returns a user's turns newest first, one page at a time.
+
+    Steps:
+    1. Create a user with five turns and log in.
+    2. Follow next_cursor with a page size of two until the last page.
+    3. Check that every turn was returned once, newest first, with its reply.
+    """
+
+    # Step 1: Create the user and log in
+    userId = make_history("grace_history", 5)
+    with app.test_client() as client:
+        login_as(client, userId)
+
+        # Step 2: Follow the cursors
+        pages, url = [], "/history/messages?limit=2"
+        while url:
+            page = client.get(url).get_json()
+            pages.append(page["turns"])
+            url = page["next_cursor"] and "/history/messages?limit=2&cursor=" + page["next_cursor"]
+
+    # Step 3: Check the turns
+    assert [len(page) for page in pages] == [2, 2, 1]
+    turns = [turn for page in pages for turn in page]
+    assert [turn["sent"] for turn in turns] == ["question 4", "question 3", "question 2", "question 1", "question 0"]
+    assert turns[0]["response"] == "answer 4"
+    assert turns[0]["sent_at"] == "2023-05-01 09:04:00"
+
+
+def test_history_page_renders_first_page_with_load_more():
+    """
+    Test that the history page renders only the first page, with a "Load more" button for the rest.
+    """
+    userId = make_history("heidi_history", app.config["HISTORY_PAGE_SIZE"] + 1)
+    with app.test_client() as client:
+        login_as(client, userId)
+        response = client.get("/history")
+
+        assert response.status_code == 200
+        assert response.data.count(b'class="sent-message"') == app.config["HISTORY_PAGE_SIZE"]
+        assert b'id="load-more"' in response.data
+        assert b"question 0" not in response.data
+
+        assert client.get("/history/messages?cursor=nonsense").status_code == 400
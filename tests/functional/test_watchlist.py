@@ -0,0 +1,100 @@
+from app import app, db, api_calls, routes
+from app.models import User
+from app.watchlist import WatchlistSnapshot
+
+
+def fake_quote(params, priority=None):
+    """
+    Stand-in for api_calls.fetch that answers GLOBAL_QUOTE queries.
+    """
+    return {"Global Quote": {"01. symbol": params["symbol"], "02. open": "1", "03. high": "2", "04. low": "0.5",
+                             "05. price": "1.5", "06. volume": "100"}}
+
+
+def test_watchlist_commands(monkeypatch):
+    """
+    Test adding tickers to a watchlist through the chat and showing their quotes.
+
+    Steps:
+    1. Create a user and log in.
+    2. Watch two tickers, one of them twice, and unwatch another.
+    3. Show the watchlist and check the quotes.
+    """
+
+    # Step 1: Create the user and log in, with a snapshot that is not due for a background refresh
+    monkeypatch.setattr(api_calls, "fetch", fake_quote)
+    snapshot = WatchlistSnapshot(interval=300)
+    snapshot.refresh([])
+    monkeypatch.setattr(routes, "watchlist_snapshot", snapshot)
+    with app.app_context():
+        user = User(username="heidi_watch", email="heidi_watch@example.com")
+        db.session.add(user)
+        db.session.commit()
+        userId = user.id
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session["_user_id"] = str(userId)
+            session["_fresh"] = True
+
+        # Step 2: Watch and unwatch
+        reply = client.post('/', json={"message": "watch : wwa, wwb, wwa"}).get_json()
+        assert reply["content"] == "Added WWA, WWB to your watchlist."
+        reply = client.post('/', json={"message": "unwatch : wwb"}).get_json()
+        assert reply["content"] == "Removed 1 ticker(s) from your watchlist."
+
+        # Step 3: Show the watchlist
+        reply = client.post('/', json={"message": "watchlist", "stream": True}).get_json()
+
+    assert reply["success"] is True
+    assert reply["content"].startswith("WWA\nCurrent price: 1.5\n")
+    assert "WWB" not in reply["content"]
+
+
+def test_watchlist_with_an_unknown_ticker(monkeypatch):
+    """
+    Test that an unknown ticker on a watchlist does not break the watchlist view.
+
+    Steps:
+    1. Log in with an upstream that answers one ticker with an empty quote.
+    2. Watch it together with a known ticker.
+    3. Show the watchlist and check that the known ticker is shown.
+    """
+
+    # Step 1: Log in with the fake upstream
+    monkeypatch.setattr(api_calls, "fetch", lambda params, priority=None: {"Global Quote": {}}
+                        if params["symbol"] == "ZZZZ" else fake_quote(params))
+    snapshot = WatchlistSnapshot(interval=300)
+    snapshot.refresh([])
+    monkeypatch.setattr(routes, "watchlist_snapshot", snapshot)
+    with app.app_context():
+        user = User(username="judy_watch", email="judy_watch@example.com")
+        db.session.add(user)
+        db.session.commit()
+        userId = user.id
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session["_user_id"] = str(userId)
+            session["_fresh"] = True
+
+        # Step 2: Watch both tickers
+        client.post('/', json={"message": "watch : aapl, zzzz"})
+
+        # Step 3: Show the watchlist
+        response = client.post('/', json={"message": "watchlist"})
+
+    assert response.status_code == 200
+    reply = response.get_json()
+    assert reply["success"] is True
+    assert reply["content"].startswith("AAPL\n")
+    assert reply["content"].endswith("INFO: Some tickers could not be fetched, please try again shortly.")
+
+def test_watchlist_needs_a_login(test_client):
+    """
+    Test that a user who is not logged in is asked to log in for watchlist commands.
+    """
+    reply = test_client.post('/', json={"message": "watch : aapl"}).get_json()
+
+    assert reply["content"] == "INFO: Please log in to keep a watchlist."
+
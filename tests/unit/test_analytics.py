@@ -0,0 +1,62 @@
+import numpy as np
+from app.analytics import compare, max_drawdown, relative_performance, correlation
+from app.api_calls import format_response
+
+
+def daily_payload(symbol, closes, start_day=1):
+    """
+    Builds a TIME_SERIES_DAILY_ADJUSTED payload, newest bar first as Alpha Vantage sends it.
+    """
+    bars = {}
+    for day, close in reversed(list(enumerate(closes, start_day))):
+        bars["2023-05-%02d" % day] = {"1. open": "1", "2. high": "1", "3. low": "1", "4. close": str(close),
+                                       "5. adjusted close": str(close), "6. volume": "100"}
+    return {"Meta Data": {"2. Symbol": symbol}, "Time Series (Daily)": bars}
+
+
+def test_vectorized_statistics():
+    """
+    Test the return, drawdown and correlation of a small price matrix.
+    """
+    prices = np.array([[100.0, 120.0, 90.0, 110.0],
+                       [50.0, 60.0, 45.0, 55.0]])
+
+    assert np.allclose(relative_performance(prices), [0.10, 0.10])
+    assert np.allclose(max_drawdown(prices), [-0.25, -0.25])
+    assert np.allclose(correlation(prices), [[1.0, 1.0], [1.0, 1.0]])
+
+
+def test_compare_aligns_tickers_by_date():
+    """
+    Test that tickers are compared on the dates they have in common.
+
+    Steps:
+    1. Build two daily series where the second starts two days later.
+    2. Compare them over their last three common bars.
+    3. Check the period, returns and correlation block.
+    """
+
+    # Step 1: Build the series
+    first = daily_payload("AAA", [10, 11, 12, 13, 14, 15])
+    second = daily_payload("BBB", [20, 10, 20, 40], start_day=3)
+
+    # Step 2: Compare the last three common bars
+    response_data = compare([first, second], 3)
+
+    # Step 3: Check the blocks
+    assert response_data[0] == ("AAA", ["Period: 2023-05-04 to 2023-05-06", "Return: +15.38%", "Max drawdown: 0.00%"])
+    assert response_data[1][1][1:] == ["Return: +300.00%", "Max drawdown: 0.00%"]
+    assert response_data[2][0] == "Correlation of returns"
+    assert len(response_data[2][1]) == 3
+
+
+def test_format_response_compare_query():
+    """
+    Test that format_response() answers a comparison query (type 4) from the fetched payloads.
+    """
+    payloads = [daily_payload("AAA", list(range(10, 30))), daily_payload("BBB", list(range(30, 10, -1)))]
+
+    response_data = format_response(payloads, 4, "lastweek")
+
+    assert [block[0] for block in response_data] == ["AAA", "BBB", "Correlation of returns"]
+    assert response_data[0][1][0] == "Period: 2023-05-15 to 2023-05-20"
@@ -0,0 +1,429 @@
+import asyncio
+import time
+import threading
+import httpx
+import pytest
+import numpy as np
+from app import api_calls
+from concurrent.futures import ThreadPoolExecutor
+from app.api_calls import api_call, api_call_async, api_call_iter, SingleFlight
+from app.timeseries import SeriesStore
+from app.scheduler import UpstreamScheduler
+from app.http_client import AsyncHTTPClient
+
+
+pytestmark = pytest.mark.usefixtures("empty_cache")
+
+
+def test_api_call_fan_out_keeps_input_order(monkeypatch, fake_reply):
+    """
+    Test that api_call() sends the queries in parallel and returns the results in input order.
+
+    Steps:
+    1. Replace the session's get with a slow fake that answers later tickers faster.
+    2. Call api_call() with six tickers.
+    3. Check that the results are in input order and that the calls overlapped.
+    """
+
+    # Step 1: Replace the session's get with a slow fake
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_get(url, params=None, timeout=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05 if params["symbol"] == "A" else 0.02)
+        with lock:
+            active[0] -= 1
+        return fake_reply(200, {"Symbol": params["symbol"]})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+
+    # Step 2: Call api_call() with six tickers
+    queries = [{"function": "OVERVIEW", "symbol": s, "apikey": None} for s in "ABCDEF"]
+    responses = api_call(queries, max_workers=6)
+
+    # Step 3: Check the ordering and the concurrency
+    assert [r["Symbol"] for r in responses] == list("ABCDEF")
+    assert peak[0] > 1
+
+
+def test_api_call_returns_first_error_in_input_order(monkeypatch, fake_reply):
+    """
+    Test that api_call() still returns an error code when one of the parallel queries fails.
+
+    Steps:
+    1. Replace the session's get with a fake that fails for two tickers.
+    2. Check that the error of the first failing ticker in input order is returned.
+    3. Check that sequential mode returns the same error.
+    """
+
+    # Step 1: Replace the session's get with a failing fake
+    def fake_get(url, params=None, timeout=None):
+        if params["symbol"] == "B":
+            return fake_reply(200, {})
+        if params["symbol"] == "C":
+            return fake_reply(503, None)
+        return fake_reply(200, {"Symbol": params["symbol"]})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    queries = [{"function": "OVERVIEW", "symbol": s, "apikey": None} for s in "ABCD"]
+
+    # Step 2: Parallel mode
+    assert api_call(queries, max_workers=4) == -1
+
+    # Step 3: Sequential mode
+    assert api_call(queries, max_workers=1) == -1
+
+
+def test_api_call_iter_keeps_a_window_of_queries_in_flight(monkeypatch):
+    """
+    Test that api_call_iter() never has more than max_workers queries in flight, and answers duplicates once.
+
+    Steps:
+    1. Replace fetch with a slow fake that records how many calls overlap.
+    2. Iterate over the results of ten tickers, one of them typed twice, with a window of three.
+    3. Check the peak concurrency and that every position got its result.
+    """
+
+    # Step 1: Replace fetch with a slow fake
+    active, peak, calls = [0], [0], []
+    lock = threading.Lock()
+
+    def slow_fetch(params, priority=None):
+        with lock:
+            calls.append(params["symbol"])
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return {"Symbol": params["symbol"]}
+
+    monkeypatch.setattr(api_calls, "fetch", slow_fetch)
+
+    # Step 2: Iterate with a window of three
+    symbols = list("ABCDEFGHIJ") + ["a"]
+    results = dict(api_call_iter([{"function": "OVERVIEW", "symbol": s, "apikey": None} for s in symbols],
+                                 max_workers=3))
+
+    # Step 3: Check the window and the results
+    assert peak[0] == 3 and len(calls) == 10
+    assert [results[index]["Symbol"] for index in range(len(symbols))] == list("ABCDEFGHIJ") + ["A"]
+
+
+def test_api_call_serves_repeated_queries_from_cache(monkeypatch, fake_reply):
+    """
+    Test that a repeated query is answered from the response cache instead of the API.
+
+    Steps:
+    1. Replace the session's get with a fake that counts the calls made.
+    2. Call api_call() twice for the same ticker with different casing and apikeys.
+    3. Check that the API was only called once and the cache recorded a hit.
+    """
+
+    # Step 1: Replace the session's get with a counting fake
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        return fake_reply(200, {"Global Quote": {"01. symbol": params["symbol"]}})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+
+    # Step 2: Call api_call() twice
+    first = api_call([{"function": "GLOBAL_QUOTE", "symbol": "AAPL", "apikey": "one"}])
+    second = api_call([{"function": "GLOBAL_QUOTE", "symbol": "aapl", "apikey": "two"}])
+
+    # Step 3: Check the API call count and the cache counters
+    assert first == second
+    assert len(calls) == 1
+    assert api_calls.response_cache.stats()["hits"] == 1
+
+
+def test_concurrent_identical_queries_share_one_request(monkeypatch, fake_reply):
+    """
+    Test that identical queries in flight at the same time are coalesced into one upstream request.
+
+    Steps:
+    1. Replace the session's get with a fake that blocks until released and counts its calls.
+    2. Start eight concurrent api_call() requests for the same quote, then release the fake.
+    3. Check that every caller got the payload and that only one upstream request was made.
+    """
+
+    # Step 1: Replace the session's get with a blocking fake
+    release = threading.Event()
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        release.wait(2)
+        return fake_reply(200, {"Global Quote": {"01. symbol": params["symbol"]}})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    monkeypatch.setattr(api_calls, "single_flight", SingleFlight())
+    query = [{"function": "GLOBAL_QUOTE", "symbol": "TSLA", "apikey": None}]
+
+    # Step 2: Start the concurrent requests and release the fake
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(api_call, query) for _ in range(8)]
+        while api_calls.single_flight.stats()["leaders"] == 0:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        results = [future.result() for future in futures]
+
+    # Step 3: Check the results and the upstream request count
+    assert all(result[0]["Global Quote"]["01. symbol"] == "TSLA" for result in results)
+    assert len(calls) == 1
+    stats = api_calls.single_flight.stats()
+    assert stats["leaders"] + stats["coalesced"] + api_calls.response_cache.stats()["hits"] == 8
+
+
+def test_single_flight_propagates_errors_to_every_caller():
+    """
+    Test that an exception raised by the shared call is raised in the leader and in every waiting caller.
+
+    Steps:
+    1. Start a leader call that fails once released, and a second caller for the same key.
+    2. Check that both callers see the exception.
+    """
+
+    # Step 1: Start the failing leader and a follower
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise ConnectionError("upstream down")
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except ConnectionError as error:
+            return str(error)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(call)
+        while flight.stats()["inflight"] == 0:
+            time.sleep(0.001)
+        follower = pool.submit(call)
+        while flight.stats()["coalesced"] == 0:
+            time.sleep(0.001)
+        release.set()
+
+        # Step 2: Check that both callers see the exception
+        assert leader.result() == "upstream down"
+        assert follower.result() == "upstream down"
+
+
+def test_api_call_reports_exhausted_call_limit(monkeypatch):
+    """
+    Test that api_call() returns QUOTA_EXCEEDED instead of queueing when the wait would be too long.
+
+    Steps:
+    1. Use a scheduler with no tokens left and a fake API that must not be reached.
+    2. Check that api_call() returns QUOTA_EXCEEDED.
+    """
+
+    # Step 1: Use an exhausted scheduler
+    scheduler = UpstreamScheduler(1, 1000)
+    scheduler.acquire()
+    monkeypatch.setattr(api_calls, "upstream_scheduler", scheduler)
+    monkeypatch.setitem(api_calls.app.config, "UPSTREAM_MAX_WAIT", 1)
+
+    def fake_get(url, params=None, timeout=None):
+        raise AssertionError("the API should not be called")
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+
+    # Step 2: Check the result
+    query = [{"function": "GLOBAL_QUOTE", "symbol": "IBM", "apikey": None}]
+    assert api_call(query) == api_calls.QUOTA_EXCEEDED
+
+
+def test_api_call_fetches_duplicate_tickers_once(monkeypatch, fake_reply):
+    """
+    Test that a ticker typed twice is downloaded once but answered for both queries.
+    """
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params["symbol"])
+        return fake_reply(200, {"Symbol": params["symbol"]})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    queries = [{"function": "OVERVIEW", "symbol": s, "apikey": None} for s in ("ibm", "IBM", "TSLA")]
+
+    responses = api_call(queries, max_workers=4)
+
+    assert [r["Symbol"] for r in responses] == ["IBM", "IBM", "TSLA"]
+    assert sorted(calls) == ["IBM", "TSLA"]
+
+
+def test_time_series_are_answered_from_the_series_store(monkeypatch, fake_reply):
+    """
+    Test that a time series query is fetched once and then answered from the series store,
+    without its payload being kept in the response caches.
+    """
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params["symbol"])
+        return fake_reply(200, {"Meta Data": {"2. Symbol": "IBM"}, "Time Series (Daily)": {
+            "2023-05-02": {"1. open": "2", "2. high": "2", "3. low": "2", "4. close": "2", "6. volume": "20"},
+            "2023-05-01": {"1. open": "1", "2. high": "1", "3. low": "1", "4. close": "1", "6. volume": "10"},
+        }})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    query = [{"function": "TIME_SERIES_DAILY_ADJUSTED", "symbol": "IBM", "apikey": "key"}]
+
+    first = api_call(query)
+    # the raw payload is only kept as bars in the series store, not in the response caches
+    assert api_calls.response_cache.stats()["entries"] == 0
+    assert api_calls.persistent_cache.stats()["entries"] == 0
+    second = api_call(query)
+
+    assert calls == ["IBM"]
+    assert list(first[0].bars["close"]) == list(second[0].bars["close"]) == [1.0, 2.0]
+
+
+def test_stale_series_are_refreshed_with_compact_fetches(monkeypatch, tmp_path, fake_reply):
+    """
+    Test that a cold series is fetched in full and a stale one only with the latest bars, which are merged in.
+    """
+    sizes = []
+    today = np.datetime64("today", "D")
+    dates = [str(today - 2), str(today - 1), str(today)]
+
+    def fake_get(url, params=None, timeout=None):
+        sizes.append(params["outputsize"])
+        days = dates[:2] if params["outputsize"] == "full" else dates[1:]
+        return fake_reply(200, {"Meta Data": {"2. Symbol": "IBM"}, "Time Series (Daily)": {
+            day: {"1. open": "1", "2. high": "1", "3. low": "1", "4. close": str(dates.index(day) + 1), "6. volume": "10"}
+            for day in reversed(days)
+        }})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    monkeypatch.setattr(api_calls, "series_store", SeriesStore(str(tmp_path / "stale"), {}, default_ttl=0))
+    query = [{"function": "TIME_SERIES_DAILY_ADJUSTED", "symbol": "IBM", "apikey": "key"}]
+
+    api_call(query)
+    series = api_call(query)[0]
+
+    assert sizes == ["full", "compact"]
+    assert list(series.bars["close"]) == [1.0, 2.0, 3.0]
+
+
+def test_async_api_call_shares_requests_and_caches(monkeypatch):
+    """
+    Test that api_call_async() keeps the input order, sends identical queries once, and fills the caches
+    used by the blocking path.
+
+    Steps:
+    1. Replace the async client with one on a slow mock transport.
+    2. Run two requests at once, overlapping on one ticker.
+    3. Check the results, the upstream calls and that api_call() is then answered from the cache.
+    """
+
+    # Step 1: Replace the async client
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.params["symbol"])
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"Symbol": request.url.params["symbol"]})
+
+    monkeypatch.setattr(api_calls, "async_http_client",
+                        AsyncHTTPClient(backoff=0, transport=httpx.MockTransport(handler)))
+
+    # Step 2: Run two requests at once
+    queries = lambda symbols: [{"function": "OVERVIEW", "symbol": s, "apikey": None} for s in symbols]
+
+    async def both():
+        return await asyncio.gather(api_call_async(queries("XYZ")), api_call_async(queries("ZW")))
+
+    first, second = asyncio.run(both())
+
+    # Step 3: Check the results and the calls
+    assert [r["Symbol"] for r in first] == ["X", "Y", "Z"]
+    assert [r["Symbol"] for r in second] == ["Z", "W"]
+    assert sorted(calls) == ["W", "X", "Y", "Z"]
+    monkeypatch.setattr(api_calls.http_client.session, "get", None)
+    assert [r["Symbol"] for r in api_call(queries("WX"))] == ["W", "X"]
+
+
+def test_async_api_call_keeps_blocking_calls_off_the_event_loop(monkeypatch, tmp_path):
+    """
+    Test that the shared cache and the shared call limit buckets are only used from worker threads by api_call_async().
+
+    Steps:
+    1. Use a scheduler with shared buckets and record the thread of every shared cache and bucket call.
+    2. Run an async request that misses the caches.
+    3. Check that none of the calls ran on the event loop's thread.
+    """
+
+    # Step 1: Record the threads
+    threads = []
+    scheduler = UpstreamScheduler(100000, 100000, path=str(tmp_path / "limits.db"))
+    monkeypatch.setattr(api_calls, "upstream_scheduler", scheduler)
+
+    def recorded(function):
+        def call(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return function(*args, **kwargs)
+        return call
+
+    for owner, name in [(api_calls.persistent_cache, "get"), (api_calls.persistent_cache, "set"),
+                        (scheduler._buckets, "take"), (scheduler._buckets, "time_until")]:
+        monkeypatch.setattr(owner, name, recorded(getattr(owner, name)))
+    monkeypatch.setattr(api_calls, "async_http_client", AsyncHTTPClient(
+        backoff=0, transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"Symbol": "LOOP"}))))
+
+    # Step 2: Run the request
+    async def run():
+        result = await api_call_async([{"function": "OVERVIEW", "symbol": "LOOP", "apikey": None}])
+        return result, threading.get_ident()
+
+    result, loop_thread = asyncio.run(run())
+
+    # Step 3: Check the threads
+    assert result == [{"Symbol": "LOOP"}]
+    assert len(threads) >= 3 and loop_thread not in threads
+
+
+def test_async_api_call_reports_upstream_errors(monkeypatch):
+    """
+    Test that api_call_async() returns the first error in input order, like api_call().
+    """
+    def handler(request):
+        if request.url.params["symbol"] == "BAD":
+            return httpx.Response(200, json={"Error Message": "Invalid API call."})
+        return httpx.Response(404)
+
+    monkeypatch.setattr(api_calls, "async_http_client",
+                        AsyncHTTPClient(backoff=0, transport=httpx.MockTransport(handler)))
+    queries = [{"function": "OVERVIEW", "symbol": s, "apikey": None} for s in ("BAD", "GONE")]
+
+    assert asyncio.run(api_call_async(queries)) == -1
+    assert asyncio.run(api_call_async(queries[1:])) == 404
+
+
+def test_empty_quote_of_an_unknown_ticker_is_an_error(monkeypatch, fake_reply):
+    """
+    Test that the empty quote Alpha Vantage sends for an unknown ticker is reported as an error and not cached.
+    """
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params["symbol"])
+        return fake_reply(200, {"Global Quote": {}})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    query = [{"function": "GLOBAL_QUOTE", "symbol": "ZZZZ", "apikey": None}]
+
+    assert api_call(query) == -1
+    assert api_call(query) == -1
+    assert calls == ["ZZZZ", "ZZZZ"]
+    assert api_calls.persistent_cache.get(query[0]) is None
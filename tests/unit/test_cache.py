@@ -0,0 +1,139 @@
+import threading
+from app.cache import ResponseCache, PersistentCache, cache_key
+
+
+def test_cache_key_ignores_apikey_and_symbol_case():
+    """
+    Test that the cache key is shared by queries that only differ by apikey or symbol casing.
+    """
+    a = cache_key({"function": "OVERVIEW", "symbol": "ibm", "apikey": "one"})
+    b = cache_key({"apikey": "two", "symbol": " IBM", "function": "OVERVIEW"})
+    assert a == b
+    assert a != cache_key({"function": "GLOBAL_QUOTE", "symbol": "IBM"})
+
+
+def test_cache_expires_entries_per_function(clock):
+    """
+    Test that each API function uses its own time to live.
+
+    Steps:
+    1. Store a GLOBAL_QUOTE and an OVERVIEW payload.
+    2. Advance the clock past the GLOBAL_QUOTE TTL only.
+    3. Check that only the OVERVIEW payload is still served.
+    """
+
+    # Step 1: Store the payloads
+    cache = ResponseCache({"GLOBAL_QUOTE": 300, "OVERVIEW": 86400}, max_entries=10, clock=clock)
+    quote = {"function": "GLOBAL_QUOTE", "symbol": "IBM"}
+    overview = {"function": "OVERVIEW", "symbol": "IBM"}
+    cache.set(quote, {"Global Quote": {}})
+    cache.set(overview, {"Symbol": "IBM"})
+
+    # Step 2: Advance the clock
+    clock.now = 301
+
+    # Step 3: Check what is still served
+    assert cache.get(quote) is None
+    assert cache.get(overview) == {"Symbol": "IBM"}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    """
+    Test that the cache stays within its size bound by evicting the least recently used entry.
+
+    Steps:
+    1. Fill a cache with room for two entries, then read the first entry.
+    2. Store a third entry.
+    3. Check that the second (least recently used) entry was evicted.
+    """
+
+    # Step 1: Fill the cache and touch the first entry
+    cache = ResponseCache({}, max_entries=2, default_ttl=60)
+    first, second, third = ({"function": "OVERVIEW", "symbol": s} for s in ("A", "B", "C"))
+    cache.set(first, {"Symbol": "A"})
+    cache.set(second, {"Symbol": "B"})
+    cache.get(first)
+
+    # Step 2: Store a third entry
+    cache.set(third, {"Symbol": "C"})
+
+    # Step 3: Check the eviction
+    assert cache.get(second) is None
+    assert cache.get(first) == {"Symbol": "A"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_skips_error_payloads():
+    """
+    Test that Alpha Vantage error and rate limit payloads are never cached.
+    """
+    cache = ResponseCache({}, max_entries=10, default_ttl=60)
+    params = {"function": "OVERVIEW", "symbol": "NOPE"}
+    cache.set(params, {"Error Message": "Invalid API call."})
+    cache.set(params, {"Note": "Thank you for using Alpha Vantage!"})
+    assert cache.get(params) is None
+
+
+def test_persistent_cache_is_shared_between_instances(tmp_path, clock):
+    """
+    Test that a payload stored by one PersistentCache is served by another using the same file,
+    as happens between worker processes.
+
+    Steps:
+    1. Store a payload through one cache instance.
+    2. Read it back through a second instance.
+    3. Advance the clock past the TTL, sweep, and check that the row is gone.
+    """
+
+    # Step 1: Store a payload
+    path = str(tmp_path / "cache.db")
+    writer = PersistentCache(path, {"GLOBAL_QUOTE": 300}, sweep_interval=0, clock=clock)
+    params = {"function": "GLOBAL_QUOTE", "symbol": "AAPL", "apikey": "key"}
+    writer.set(params, {"Global Quote": {"01. symbol": "AAPL"}})
+
+    # Step 2: Read it back through a second instance
+    reader = PersistentCache(path, {"GLOBAL_QUOTE": 300}, sweep_interval=0, clock=clock)
+    payload, remaining = reader.get({"function": "GLOBAL_QUOTE", "symbol": "aapl"})
+    assert payload == {"Global Quote": {"01. symbol": "AAPL"}}
+    assert remaining == 300
+
+    # Step 3: Expire and sweep
+    clock.now = 301
+    assert reader.get(params) is None
+    assert reader.sweep() == 1
+    assert reader.stats()["entries"] == 0
+
+
+def test_persistent_cache_counts_every_lookup_from_many_threads(tmp_path):
+    """
+    Test that the hit and miss counters of the shared cache add up when many threads look up at once.
+
+    Steps:
+    1. Store one payload.
+    2. Look up a stored and a missing query from eight threads.
+    3. Check that every lookup was counted.
+    """
+
+    # Step 1: Store a payload
+    cache = PersistentCache(str(tmp_path / "cache.db"), {"GLOBAL_QUOTE": 300}, sweep_interval=0)
+    stored = {"function": "GLOBAL_QUOTE", "symbol": "IBM"}
+    cache.set(stored, {"Global Quote": {"01. symbol": "IBM"}})
+
+    # Step 2: Look up from eight threads
+    def look_up():
+        for _ in range(100):
+            cache.get(stored)
+            cache.get({"function": "GLOBAL_QUOTE", "symbol": "NONE"})
+
+    threads = [threading.Thread(target=look_up) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Step 3: Check the counters
+    assert cache.counters() == {"hits": 800, "misses": 800}
+    cache.clear()
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
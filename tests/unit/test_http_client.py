@@ -0,0 +1,102 @@
+import asyncio
+import httpx
+import pytest
+import requests
+from app.http_client import HTTPClient, AsyncHTTPClient
+
+
+class FakeReply:
+    """
+    Minimal stand-in for a requests.Response.
+    """
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def scripted_get(outcomes, calls):
+    """
+    Returns a fake Session.get that answers with the given outcomes in order,
+    raising the ones that are exceptions.
+    """
+    def fake_get(url, params=None, timeout=None):
+        calls.append(timeout)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeReply(outcome)
+    return fake_get
+
+
+def test_client_retries_server_errors_and_connection_errors(monkeypatch):
+    """
+    Test that 5xx replies and connection errors are retried until a reply succeeds.
+
+    Steps:
+    1. Script a 502 reply, a connection error, then a 200 reply.
+    2. Check that the 200 reply is returned after two retries, using the configured timeouts.
+    """
+
+    # Step 1: Script the replies
+    calls = []
+    client = HTTPClient(connect_timeout=1, read_timeout=2, retries=2, backoff=0)
+    monkeypatch.setattr(client.session, "get", scripted_get([502, requests.ConnectionError(), 200], calls))
+
+    # Step 2: Check the result
+    assert client.get("http://upstream/query", {"function": "OVERVIEW"}).status_code == 200
+    assert calls == [(1, 2)] * 3
+    assert client.stats()["retries"] == 2
+    assert client.stats()["requests"] == 3
+
+
+def test_client_gives_up_after_retries(monkeypatch):
+    """
+    Test that the last 5xx reply is returned, and the last connection error raised, once retries run out,
+    and that 4xx replies are never retried.
+    """
+    client = HTTPClient(retries=1, backoff=0)
+
+    monkeypatch.setattr(client.session, "get", scripted_get([500, 503], []))
+    assert client.get("http://upstream/query").status_code == 503
+
+    monkeypatch.setattr(client.session, "get", scripted_get([requests.Timeout(), requests.ConnectionError()], []))
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://upstream/query")
+
+    calls = []
+    monkeypatch.setattr(client.session, "get", scripted_get([404], calls))
+    assert client.get("http://upstream/query").status_code == 404
+    assert len(calls) == 1
+
+
+def test_async_client_retries_like_the_blocking_client():
+    """
+    Test that the asyncio client retries 5xx replies and connection errors with the same policy.
+
+    Steps:
+    1. Script a 503 reply, a connection error, then a 200 reply on a mock transport.
+    2. Check that the 200 reply is returned after two retries, with the query params sent.
+    3. Check that a connection error is raised once the retries run out.
+    """
+
+    # Step 1: Script the replies
+    outcomes, seen = [503, httpx.ConnectError("refused"), 200], []
+
+    def handler(request):
+        seen.append(request.url.params["function"])
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"status": outcome})
+
+    client = AsyncHTTPClient(retries=2, backoff=0, transport=httpx.MockTransport(handler))
+
+    # Step 2: Check the result
+    reply = asyncio.run(client.get("http://upstream/query", {"function": "OVERVIEW"}))
+    assert reply.status_code == 200 and reply.json() == {"status": 200}
+    assert seen == ["OVERVIEW"] * 3
+    assert client.stats()["retries"] == 2
+
+    # Step 3: Give up after the retries
+    outcomes.extend([httpx.ConnectError("refused")] * 3)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.get("http://upstream/query", {"function": "OVERVIEW"}))
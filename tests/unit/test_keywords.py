@@ -0,0 +1,67 @@
+import json
+import os
+from app.keywords import KeywordRegistry, KEYWORDS_PATH
+from app.parsing import compile_keywords
+
+
+def write_keywords(path, keywords, mtime):
+    """
+    Writes a keyword file with the given "keywords" list and modification time.
+    """
+    data = {"keywords": keywords, "modifiableKeywords": ["price"], "timeSelector": ["current", "yesterday"],
+            "rangeSelector": ["lastweek", "lastmonth", "lastyear"]}
+    with open(path, "w") as f:
+        json.dump(data, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_registry_path_does_not_depend_on_working_directory():
+    """
+    Test that the keyword file is found relative to the package.
+    """
+    assert os.path.isabs(KEYWORDS_PATH)
+    assert os.path.exists(KEYWORDS_PATH)
+
+
+def test_registry_reloads_changed_file(tmp_path, clock):
+    """
+    Test that a changed keyword file is picked up after the check interval, with its tables recompiled.
+
+    Steps:
+    1. Load a keyword file and compile its tables.
+    2. Change the file; check it is not reloaded before the check interval has passed.
+    3. Advance the clock; check the new keywords and tables are served.
+    """
+
+    # Step 1: Load the file
+    path = str(tmp_path / "keywords.json")
+    write_keywords(path, ["info"], 1000)
+    registry = KeywordRegistry(path, check_interval=5, clock=clock)
+    assert "info" in registry.derive(compile_keywords)["keywords"]
+
+    # Step 2: Change the file
+    write_keywords(path, ["info", "beta"], 2000)
+    clock.now = 1
+    assert registry.data()["keywords"] == ["info"]
+
+    # Step 3: Advance the clock
+    clock.now = 6
+    assert registry.data()["keywords"] == ["info", "beta"]
+    assert "beta" in registry.derive(compile_keywords)["keywords"]
+    assert registry.reloads == 1
+
+
+def test_registry_keeps_last_good_version(tmp_path):
+    """
+    Test that an invalid keyword file is ignored and the previous version stays in use.
+    """
+    path = str(tmp_path / "keywords.json")
+    write_keywords(path, ["info"], 1000)
+    registry = KeywordRegistry(path, check_interval=0)
+
+    with open(path, "w") as f:
+        f.write('{"keywords": [')
+    os.utime(path, (2000, 2000))
+
+    assert registry.data()["keywords"] == ["info"]
+    assert registry.reloads == 0
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from app import app, db
+from app.models import Message, MessageCounter
+
+
+def save_message(userId, content):
+    """
+    Saves one message for the user in its own session, as a request would, and returns its id.
+    """
+    with app.app_context():
+        message = Message(content=content)
+        message.setUser()
+        message.setVariableFields(userId)
+        db.session.add(message)
+        db.session.commit()
+        return message.id
+
+
+def test_message_ids_increment_per_user(make_user):
+    """
+    Test that message ids are allocated from each user's counter, starting at 1 with parentId 0.
+
+    Steps:
+    1. Save two messages for one user and one for another.
+    2. Check the ids, parentIds and counters.
+    """
+
+    # Step 1: Save the messages
+    with app.app_context():
+        alice, bob = make_user("alice_ids"), make_user("bob_ids")
+        first, second = save_message(alice, "hi"), save_message(alice, "again")
+        other = save_message(bob, "hello")
+
+        # Step 2: Check the ids
+        assert (first, second, other) == (1, 2, 1)
+        assert Message.query.filter_by(userId=alice, id=2).first().parentId == "1"
+        assert db.session.get(MessageCounter, alice).lastId == 2
+
+
+def test_counter_is_seeded_from_existing_messages(make_user):
+    """
+    Test that a user with messages but no counter row continues from their highest message id.
+    """
+    with app.app_context():
+        userId = make_user("carol_ids")
+        db.session.add(Message(id=41, conversationId=3, userId=userId, content="old"))
+        db.session.commit()
+
+        assert save_message(userId, "new") == 42
+        assert Message.query.filter_by(userId=userId, id=42).first().conversationId == 3
+
+
+def test_concurrent_messages_get_distinct_ids(make_user):
+    """
+    Test that concurrent requests from one user never get the same message id.
+    """
+    with app.app_context():
+        userId = make_user("dave_ids")
+        save_message(userId, "first")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda n: save_message(userId, str(n)), range(16)))
+
+    assert sorted(ids) == list(range(2, 18))
@@ -0,0 +1,41 @@
+from app.metrics import Histogram, Metrics, server_timing
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    Test that a histogram renders cumulative bucket counts, with the sum and count of the observations.
+    """
+    histogram = Histogram("stage_seconds", "Stage time.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "parse")
+
+    lines = histogram.render()
+
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="parse",le="1.0"} 3' in lines
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 4' in lines
+    assert 'stage_seconds_sum{stage="parse"} 6.05' in lines
+    assert histogram.count("parse") == 4
+
+
+def test_counter_and_collectors_render_in_text_format():
+    """
+    Test that counters and registered collectors are rendered with their HELP and TYPE lines.
+    """
+    metrics = Metrics()
+    metrics.upstream_calls.inc("OVERVIEW", "200")
+    metrics.upstream_calls.inc("OVERVIEW", "200")
+    metrics.collector(lambda: [("cache_hit_ratio", "gauge", "Hit ratio.", [((("cache", 'a"b'),), 0.5)])])
+
+    text = metrics.render()
+
+    assert '# TYPE stockbot_upstream_calls_total counter' in text
+    assert 'stockbot_upstream_calls_total{function="OVERVIEW",outcome="200"} 2' in text
+    assert '# TYPE cache_hit_ratio gauge\ncache_hit_ratio{cache="a\\"b"} 0.5\n' in text
+
+
+def test_server_timing_adds_up_repeated_stages():
+    """
+    Test that a stage timed twice in one request is reported once, with its total in milliseconds.
+    """
+    assert server_timing([("parse", 0.001), ("format", 0.002), ("format", 0.003)]) == "parse;dur=1.00, format;dur=5.00"
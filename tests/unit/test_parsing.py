@@ -0,0 +1,75 @@
+from app.parsing import compile_query, request_constructor, parse_input, QueryError
+
+
+def test_compile_query_builds_typed_queries():
+    """
+    Test that compile_query() turns each kind of input into the right query type, selector and API calls.
+
+    Steps:
+    1. Compile a keywords query, a time selector query and a range selector query.
+    2. Check the query type, selector and API functions of each.
+    """
+
+    # Step 1: Compile the queries
+    info = compile_query("info, eps : aapl, tsla")
+    current = compile_query("price, current : {IBM}")
+    lastyear = compile_query("price,lastyear:ibm,msft,amzn")
+
+    # Step 2: Check the queries
+    assert info.error is None and info.query_type == 1
+    assert info.selector == [1, 0, 0, 1, 0, 0]
+    assert [q["symbol"] for q in info.queries] == ["aapl", "tsla"]
+    assert current.query_type == 2 and current.selector == "current"
+    assert current.queries[0]["function"] == "GLOBAL_QUOTE" and current.queries[0]["symbol"] == "IBM"
+    assert lastyear.query_type == 3 and lastyear.selector == "lastyear"
+    assert {q["function"] for q in lastyear.queries} == {"TIME_SERIES_MONTHLY_ADJUSTED"}
+
+
+def test_compile_query_reports_structured_errors():
+    """
+    Test that invalid input gets the matching QueryError, equal to the codes request_constructor() returned.
+    """
+    assert compile_query("aapl").error == QueryError.INVALID_FORMAT
+    assert compile_query("price:current:aapl").error == QueryError.INVALID_FORMAT
+    assert compile_query("info, nonsense : aapl").error == -1
+    assert compile_query("price, sometime : aapl").error == QueryError.INVALID_KEYWORDS
+    assert compile_query("price : aapl").error == -2
+    assert compile_query("hello : aapl").error == QueryError.NO_KEYWORDS
+
+
+def test_request_constructor_matches_compile_query():
+    """
+    Test that request_constructor() still returns the (queries, query_type, selector) tuple or an error code.
+    """
+    keywords, tickers = parse_input("overview : aapl, tsla")
+    queries, query_type, selector = request_constructor(keywords, tickers)
+
+    assert [q["function"] for q in queries] == ["OVERVIEW", "OVERVIEW"]
+    assert (query_type, selector) == (1, [1, 1, 1, 1, 1, 1])
+    assert request_constructor(["price"], ["aapl"]) == -2
+
+
+def test_compile_query_builds_comparison_queries():
+    """
+    Test that "compare" takes a range selector and fetches that selector's series for every ticker.
+    """
+    query = compile_query("compare, lastmonth : aapl, msft")
+
+    assert query.error is None
+    assert (query.query_type, query.selector) == (4, "lastmonth")
+    assert {q["function"] for q in query.queries} == {"TIME_SERIES_WEEKLY_ADJUSTED"}
+    assert compile_query("compare, current : aapl").error == QueryError.INVALID_KEYWORDS
+    assert compile_query("compare : aapl").error == QueryError.WRONG_KEYWORD_COUNT
+
+
+def test_compile_query_builds_watchlist_commands():
+    """
+    Test that watchlist commands are parsed without any API calls, and that "watchlist" needs no tickers.
+    """
+    watch = compile_query("watch : aapl, msft")
+    show = compile_query(" watchlist ")
+
+    assert (watch.query_type, watch.selector, watch.tickers, watch.queries) == (5, "watch", ["aapl", "msft"], [])
+    assert (show.query_type, show.selector, show.tickers) == (5, "watchlist", [])
+    assert compile_query("watch :").error == QueryError.INVALID_FORMAT
+    assert compile_query("watch, current : aapl").error == QueryError.WRONG_KEYWORD_COUNT
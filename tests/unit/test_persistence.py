@@ -0,0 +1,84 @@
+import time
+from sqlalchemy import event
+from app import app, db
+from app.models import Message
+from app.persistence import save_turn, WriteBehindQueue
+
+
+def test_save_turn_writes_both_messages_in_one_commit(make_user):
+    """
+    Test that a chat turn is saved with one commit, and that the reply directly follows the message.
+
+    Steps:
+    1. Count the commits made while saving a turn.
+    2. Check that there was one commit and both messages were saved with consecutive ids.
+    """
+
+    # Step 1: Count the commits
+    with app.app_context():
+        userId = make_user("erin_turns")
+        commits = []
+        listener = lambda connection: commits.append(connection)
+        event.listen(db.engine, "commit", listener)
+        try:
+            save_turn(userId, "price current : AAPL", "AAPL\nCurrent price: 1\n")
+        finally:
+            event.remove(db.engine, "commit", listener)
+
+        # Step 2: Check the commit count and the messages
+        assert len(commits) == 1
+        sent, reply = Message.query.filter_by(userId=userId).order_by(Message.id).all()
+        assert (sent.id, sent.isUser, sent.parentId) == (1, True, "0")
+        assert (reply.id, reply.isUser, reply.parentId) == (2, False, "1")
+
+
+def test_write_behind_queue_saves_turns_in_batches(make_user):
+    """
+    Test that turns recorded through the write-behind queue are saved once flushed.
+
+    Steps:
+    1. Record three turns through a queue with a long flush interval.
+    2. Flush the queue and check that all six messages were saved in order.
+    """
+
+    # Step 1: Record the turns
+    with app.app_context():
+        userId = make_user("frank_turns")
+    queue = WriteBehindQueue(flush_interval=60, batch_size=10)
+    for n in range(3):
+        queue.record(userId, "message " + str(n), "reply " + str(n))
+
+    # Step 2: Flush and check
+    queue.flush()
+    with app.app_context():
+        messages = Message.query.filter_by(userId=userId).order_by(Message.id).all()
+        assert [m.content for m in messages] == ["message 0", "reply 0", "message 1", "reply 1", "message 2", "reply 2"]
+        assert [m.id for m in messages] == [1, 2, 3, 4, 5, 6]
+        assert queue.written == 3 and queue.pending() == 0
+
+
+def test_flush_saves_turns_the_background_thread_is_collecting(make_user):
+    """
+    Test that flush() saves the turns the background thread has taken off the queue but not written yet.
+
+    Steps:
+    1. Record three turns 50ms apart through a queue with a long flush interval.
+    2. Flush the queue and check that it returns at once with every turn saved.
+    """
+
+    # Step 1: Record the turns while the background thread is collecting its batch
+    with app.app_context():
+        userId = make_user("grace_turns")
+    queue = WriteBehindQueue(flush_interval=60, batch_size=10)
+    for n in range(3):
+        queue.record(userId, "message " + str(n), "reply " + str(n))
+        time.sleep(0.05)
+    assert queue.pending() == 3
+
+    # Step 2: Flush and check
+    started = time.monotonic()
+    assert queue.flush(timeout=10) is True
+    assert time.monotonic() - started < 5
+    assert queue.written == 3 and queue.pending() == 0
+    with app.app_context():
+        assert Message.query.filter_by(userId=userId).count() == 6
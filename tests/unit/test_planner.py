@@ -0,0 +1,39 @@
+from app.planner import plan_queries
+
+
+def test_plan_collapses_duplicate_symbols():
+    """
+    Test that differently-cased and padded duplicates of a ticker share one fetch.
+
+    Steps:
+    1. Plan queries for "aapl", "AAPL ", "msft" and "AAPL".
+    2. Check that only two fetches remain, with normalized symbols.
+    3. Check that results are mapped back onto every original query.
+    """
+
+    # Step 1: Plan the queries
+    queries = [{"function": "GLOBAL_QUOTE", "symbol": s, "apikey": "key"} for s in ("aapl", "AAPL ", "msft", "AAPL")]
+    plan = plan_queries(queries)
+
+    # Step 2: Check the fetches
+    assert [params["symbol"] for params in plan.fetches] == ["AAPL", "MSFT"]
+    assert plan.saved() == 2
+
+    # Step 3: Check the mapping
+    assert plan.expand(["apple", "microsoft"]) == ["apple", "apple", "microsoft", "apple"]
+
+
+def test_plan_keeps_functions_apart_and_prefers_full_series():
+    """
+    Test that different functions are fetched separately, and that a full series answers a compact query.
+    """
+    queries = [
+        {"function": "TIME_SERIES_DAILY_ADJUSTED", "symbol": "IBM", "outputsize": "compact"},
+        {"function": "TIME_SERIES_DAILY_ADJUSTED", "symbol": "IBM", "outputsize": "full"},
+        {"function": "GLOBAL_QUOTE", "symbol": "IBM"},
+    ]
+    plan = plan_queries(queries)
+
+    assert len(plan.fetches) == 2
+    assert plan.fetches[0]["outputsize"] == "full"
+    assert plan.positions == [0, 0, 1]
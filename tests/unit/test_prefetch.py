@@ -0,0 +1,115 @@
+import pytest
+from datetime import datetime, timedelta
+from app import app, db, api_calls
+from app.models import User
+from app.persistence import save_turn
+from app.prefetch import Prefetcher, popular_queries
+from app.scheduler import UpstreamScheduler
+
+
+pytestmark = pytest.mark.usefixtures("empty_cache")
+
+
+def add_messages(name, messages):
+    """
+    Saves each message as a chat turn of a new user.
+    """
+    user = User(username=name, email=name + "@example.com")
+    db.session.add(user)
+    db.session.commit()
+    for message in messages:
+        save_turn(user.id, message, "reply")
+
+
+def test_popular_queries_counts_what_users_ask_for():
+    """
+    Test that the messages are parsed into upstream queries and ranked by how often they are asked for.
+
+    Steps:
+    1. Save messages asking for QQA's overview and QQB's twice, QQA's quote and QQC's once, and one invalid message.
+    2. Check the ranking, and that symbols are normalized.
+    """
+
+    # Step 1: Save the messages
+    with app.app_context():
+        add_messages("prefetch_counts", [
+            "eps : qqa, qqb", "price, current : QQA", "eps : qqa", "eps : qqb, qqc", "eps, nonsense : qqa",
+        ])
+
+        # Step 2: Check the ranking
+        popular = popular_queries(datetime.now() - timedelta(hours=1), 100)
+        ranking = [(params["function"], params["symbol"], count) for params, count in popular
+                   if params["symbol"].startswith("QQ")]
+
+    # queries asked for equally often may come in any order
+    assert sorted(ranking[:2]) == [("OVERVIEW", "QQA", 2), ("OVERVIEW", "QQB", 2)]
+    assert sorted(ranking[2:]) == [("GLOBAL_QUOTE", "QQA", 1), ("OVERVIEW", "QQC", 1)]
+
+
+def test_prefetch_refreshes_cold_queries_within_its_quota(monkeypatch, fake_reply):
+    """
+    Test that a prefetch run only fetches queries that are not warm, and stops at its share of the quota.
+
+    Steps:
+    1. Save messages for four tickers and warm the cache for one of them.
+    2. Run a prefetcher allowed two calls per minute.
+    3. Check that two cold tickers were fetched and the run was throttled.
+    """
+
+    # Step 1: Save messages and warm one ticker
+    fetched = []
+
+    def fake_get(url, params=None, timeout=None):
+        fetched.append(params["symbol"])
+        return fake_reply(200, {"Symbol": params["symbol"]})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    with app.app_context():
+        add_messages("prefetch_quota", ["eps : rra, rrb, rrc, rrd"] * 3)
+        api_calls.response_cache.set({"function": "OVERVIEW", "symbol": "RRA"}, {"Symbol": "RRA"})
+
+        # Step 2: Run the prefetcher
+        prefetcher = Prefetcher(top_n=100, per_minute=10, per_day=1000, quota_share=0.2)
+        prefetcher.run_once()
+
+    # Step 3: Check the fetches
+    assert len(fetched) == 2 and "RRA" not in fetched
+    assert set(fetched) <= {"RRB", "RRC", "RRD"}
+    stats = prefetcher.stats()
+    assert (stats["prefetched"], stats["throttled"]) == (2, 1)
+    assert stats["skipped"] >= 1
+
+
+def test_rejected_prefetch_keeps_its_quota(monkeypatch, fake_reply):
+    """
+    Test that a prefetch turned away by the upstream scheduler does not use up the prefetch quota.
+
+    Steps:
+    1. Save messages for two tickers and use up the upstream call limit.
+    2. Run a prefetcher allowed two calls per minute.
+    3. Check that nothing was fetched and the prefetch quota is still full.
+    """
+
+    # Step 1: Save messages and use up the call limit
+    fetched = []
+
+    def fake_get(url, params=None, timeout=None):
+        fetched.append(params["symbol"])
+        return fake_reply(200, {"Symbol": params["symbol"]})
+
+    monkeypatch.setattr(api_calls.http_client.session, "get", fake_get)
+    scheduler = UpstreamScheduler(1, 1000)
+    assert scheduler.acquire()
+    monkeypatch.setattr(api_calls, "upstream_scheduler", scheduler)
+    with app.app_context():
+        add_messages("prefetch_rejected", ["eps : rja, rjb"] * 3)
+
+        # Step 2: Run the prefetcher
+        prefetcher = Prefetcher(top_n=100, per_minute=10, per_day=1000, quota_share=0.2)
+        prefetcher.run_once()
+
+    # Step 3: Nothing was sent and no prefetch token was spent
+    assert fetched == []
+    stats = prefetcher.stats()
+    assert stats["failed"] >= 2 and stats["prefetched"] == 0
+    assert stats["quota_left"] == 2
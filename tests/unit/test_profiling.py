@@ -0,0 +1,75 @@
+import os
+import pstats
+import time
+from app import app
+from app.profiling import Profiler
+
+
+def slow_view():
+    total = 0
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        total += 1
+    return "done"
+
+
+def test_disabled_profiler_leaves_views_unwrapped(tmp_path):
+    """
+    Test that a disabled profiler returns the view itself, so it adds nothing to a request.
+    """
+    profiler = Profiler(False, "secret", str(tmp_path))
+
+    assert profiler.wrap(slow_view) is slow_view
+
+
+def test_profiles_only_requests_with_the_token(tmp_path):
+    """
+    Test that only a request carrying the token is profiled, and that its profile is a readable pstats dump.
+
+    Steps:
+    1. Call the view without the token and with a wrong one.
+    2. Call it with the token in the header and check the profile.
+    """
+    profiler = Profiler(True, "secret", str(tmp_path))
+    view = profiler.wrap(slow_view)
+
+    # Step 1: No profile without the right token
+    with app.test_request_context("/"):
+        assert view() == "done"
+    with app.test_request_context("/?profile=wrong"):
+        assert view() == "done"
+    assert not os.path.exists(tmp_path) or os.listdir(tmp_path) == []
+
+    # Step 2: Profiled with the token
+    with app.test_request_context("/", headers={"X-Profile-Token": "secret"}):
+        response = view()
+    assert response.get_data(as_text=True) == "done"
+    name = response.headers["X-Profile"]
+    assert name.endswith(".prof") and os.listdir(tmp_path) == [name]
+    stats = pstats.Stats(os.path.join(tmp_path, name))
+    assert any(function == "slow_view" for _, _, function in stats.stats)
+
+
+def test_collapsed_stacks_and_rotation(tmp_path):
+    """
+    Test that sampled stacks are written in the collapsed format and that only the newest profiles are kept.
+
+    Steps:
+    1. Profile four requests with a profiler keeping two profiles.
+    2. Check that the two newest profiles are left and hold collapsed stacks.
+    """
+
+    # Step 1: Profile four requests
+    profiler = Profiler(True, "secret", str(tmp_path), keep=2, format="collapsed", interval=0.001)
+    view = profiler.wrap(slow_view)
+    names = []
+    for _ in range(4):
+        with app.test_request_context("/?profile=secret"):
+            names.append(view().headers["X-Profile"])
+
+    # Step 2: Check the profiles left
+    assert profiler.profiles() == names[2:]
+    with open(os.path.join(tmp_path, names[-1])) as handle:
+        lines = handle.read().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("slow_view (test_profiling.py:" in line for line in lines)
@@ -0,0 +1,97 @@
+import glob
+import importlib.util
+import os
+from datetime import datetime
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from app.history import history_query
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), "..", "..", "migrations", "versions")
+
+# The hot queries on the message table, as the app sends them to SQLite
+SEED_COUNTER = "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(conversationId), 1) FROM message WHERE userId = 1"
+
+
+def load_migrations():
+    """
+    Loads every migration module and returns them in revision order.
+    """
+    modules = {}
+    for path in glob.glob(os.path.join(MIGRATIONS, "*.py")):
+        spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules[module.down_revision] = module
+
+    ordered, revision = [], None
+    while revision in modules:
+        ordered.append(modules[revision])
+        revision = modules[revision].revision
+    return ordered
+
+
+def migrated_engine():
+    """
+    Creates an in-memory SQLite database by running every migration, with a few messages added
+    before the message table is re-keyed so the copy is exercised.
+    """
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        operations = Operations(MigrationContext.configure(connection))
+        with Operations.context(operations.migration_context):
+            for migration in load_migrations():
+                if migration.revision == "8b2e5d0a41c6":
+                    connection.exec_driver_sql("INSERT INTO user (id, username) VALUES (1, 'ivan')")
+                    for n in range(1, 5):
+                        connection.exec_driver_sql(
+                            'INSERT INTO message (id, "conversationId", "userId", "timeStamp", content, "isUser") '
+                            "VALUES (?, 1, 1, '2023-05-01 09:00:0" + str(n) + "', 'm', ?)", (n, n % 2))
+                migration.upgrade()
+    return engine
+
+
+def query_plan(connection, sql):
+    """
+    Returns the detail column of SQLite's EXPLAIN QUERY PLAN for a statement.
+    """
+    if not isinstance(sql, str):
+        sql = str(sql.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def test_migrations_keep_existing_messages():
+    """
+    Test that re-keying the message table copies every existing message.
+    """
+    engine = migrated_engine()
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT COUNT(*) FROM message").scalar() == 4
+
+
+def test_history_and_allocation_queries_use_indexes():
+    """
+    Test that the history and message id queries search an index instead of scanning the message table.
+
+    Steps:
+    1. Build a database from the migrations.
+    2. Check the plans of the first history page, a later history page and the counter seed query.
+    3. Check that no plan scans the whole table or sorts in a temporary b-tree.
+    """
+
+    # Step 1: Build the database
+    engine = migrated_engine()
+
+    with engine.connect() as connection:
+        # Step 2: Get the plans
+        plans = [
+            query_plan(connection, history_query(1, limit=21)),
+            query_plan(connection, history_query(1, (datetime(2023, 5, 1, 9, 0, 3), 3), limit=21)),
+            query_plan(connection, SEED_COUNTER),
+        ]
+
+    # Step 3: Check the plans
+    for plan in plans:
+        assert not any(step.startswith("SCAN message") or step.startswith("SCAN m") for step in plan), plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+        assert any("USING" in step and "INDEX" in step for step in plan), plan
@@ -0,0 +1,207 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from app.scheduler import TokenBucket, SharedTokenBuckets, UpstreamScheduler, INTERACTIVE, PREFETCH
+
+
+def test_token_bucket_refills_over_time(clock):
+    """
+    Test that a token bucket refills at its rate and never above its capacity.
+    """
+    bucket = TokenBucket(5, 60, clock)
+    for _ in range(5):
+        bucket.consume()
+    assert bucket.time_until(1) == 12
+    clock.now = 12
+    assert bucket.time_until(1) == 0
+    clock.now = 10000
+    bucket.refill()
+    assert bucket.tokens == 5
+
+
+def test_scheduler_estimates_wait_from_both_limits(clock):
+    """
+    Test that the wait estimate accounts for the per-minute and per-day buckets.
+
+    Steps:
+    1. Use up the per-minute allowance of a scheduler.
+    2. Check the estimate for the next request.
+    3. Use a scheduler whose per-day allowance is the tighter limit and check its estimate.
+    """
+
+    # Step 1: Use up the per-minute allowance
+    scheduler = UpstreamScheduler(2, 1000, clock)
+    assert scheduler.acquire() and scheduler.acquire()
+
+    # Step 2: The next token comes after 30 seconds
+    assert scheduler.estimate_wait() == 30
+    assert not scheduler.acquire(max_wait=10)
+    assert scheduler.stats()["rejected"] == 1
+
+    # Step 3: The per-day limit dominates
+    daily = UpstreamScheduler(100, 1, clock)
+    assert daily.acquire()
+    assert daily.estimate_wait() == 24 * 60 * 60
+
+
+def test_scheduler_releases_interactive_requests_first():
+    """
+    Test that queued interactive requests are admitted before queued prefetch requests.
+
+    Steps:
+    1. Use up the allowance of a fast-refilling scheduler.
+    2. Queue a prefetch request, then an interactive request.
+    3. Check that the interactive request was admitted first.
+    """
+
+    # Step 1: Use up the allowance
+    scheduler = UpstreamScheduler(60 * 5, 100000)       # one token every 200ms
+    while scheduler.available() >= 1:
+        scheduler.acquire()
+
+    # Step 2: Queue the two requests
+    order = []
+
+    def request(name, priority):
+        scheduler.acquire(priority)
+        order.append(name)
+
+    prefetch = threading.Thread(target=request, args=("prefetch", PREFETCH))
+    interactive = threading.Thread(target=request, args=("interactive", INTERACTIVE))
+    prefetch.start()
+    while scheduler.stats()["queued"] == 0:
+        time.sleep(0.001)
+    interactive.start()
+    while scheduler.stats()["queued"] < 2:
+        time.sleep(0.001)
+    prefetch.join(2)
+    interactive.join(2)
+
+    # Step 3: Check the order
+    assert order == ["interactive", "prefetch"]
+
+
+def test_async_acquire_waits_for_a_token_without_a_thread():
+    """
+    Test that acquire_async() admits a request once a token is back, and rejects one that would wait too long.
+
+    Steps:
+    1. Use up the only token of a bucket refilling in 0.1 seconds.
+    2. Check that an async request waiting 1 second is admitted after the refill.
+    3. Check that an async request waiting at most 0.01 seconds is rejected straight away.
+    """
+
+    # Step 1: Use up the token
+    scheduler = UpstreamScheduler(600, 1000)
+    scheduler._buckets.buckets["upstream_minute"] = TokenBucket(1, 0.1)
+    assert scheduler.acquire(INTERACTIVE)
+
+    # Step 2: Wait for the refill
+    started = time.monotonic()
+    assert asyncio.run(scheduler.acquire_async(INTERACTIVE, max_wait=1)) is True
+    assert 0.05 < time.monotonic() - started < 0.5
+
+    # Step 3: Reject a request that would wait too long
+    assert asyncio.run(scheduler.acquire_async(INTERACTIVE, max_wait=0.01)) is False
+    assert scheduler.stats()["granted"] == 2 and scheduler.stats()["rejected"] == 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_schedulers_sharing_a_database_share_the_limits(tmp_path):
+    """
+    Test that schedulers of different worker processes, sharing one database, admit the limit between them.
+
+    Steps:
+    1. Create two schedulers on the same database file, as two worker processes would.
+    2. Use up the per-minute allowance with requests from both.
+    3. Check that neither admits another request, and that both see the same tokens.
+    """
+
+    # Step 1: Create the schedulers
+    path = str(tmp_path / "cache.db")
+    first = UpstreamScheduler(3, 1000, path=path)
+    second = UpstreamScheduler(3, 1000, path=path)
+
+    # Step 2: Use up the allowance from both
+    assert first.acquire(max_wait=1) and second.acquire(max_wait=1) and first.acquire(max_wait=1)
+
+    # Step 3: The next request waits in both
+    assert not second.acquire(max_wait=0.5) and not first.acquire(max_wait=0.5)
+    assert 19 < first.estimate_wait() <= 20
+    assert second.stats()["minute_tokens"] < 1 and int(first.stats()["day_tokens"]) == int(second.stats()["day_tokens"]) == 997
+
+
+def test_shared_buckets_never_give_out_more_tokens_than_they_hold(tmp_path):
+    """
+    Test that concurrent takes on shared buckets, each with its own connection, never overspend.
+
+    Steps:
+    1. Create shared buckets holding 20 tokens and refilling over a day.
+    2. Take tokens from 8 threads at once, 10 attempts each.
+    3. Check that exactly 20 takes succeeded and the refill clock is comparable between processes.
+    """
+
+    # Step 1: Create the buckets
+    path = str(tmp_path / "cache.db")
+    limits = {"test_minute": (20, 24 * 60 * 60)}
+    taken = []
+
+    # Step 2: Take from several threads
+    def take():
+        buckets = SharedTokenBuckets(path, limits)
+        taken.extend(buckets.take(1) for _ in range(10))
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Step 3: Check the tokens given out
+    assert taken.count(True) == 20
+    assert SharedTokenBuckets(path, limits).tokens()["test_minute"] < 1
+
+
+def test_async_acquire_does_not_block_the_event_loop_on_a_locked_database(tmp_path):
+    """
+    Test that an async request keeps the event loop running while another process holds the shared buckets.
+
+    Steps:
+    1. Create a scheduler on a shared database and lock the database from another connection.
+    2. Acquire asynchronously while a second task counts its ticks, releasing the lock after 0.3 seconds.
+    3. Check that the request was admitted after the release and that the loop kept ticking meanwhile.
+    """
+
+    # Step 1: Lock the database
+    path = str(tmp_path / "cache.db")
+    scheduler = UpstreamScheduler(5, 500, path=path)
+    assert scheduler.available() == 5
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+
+    # Step 2: Acquire while counting ticks
+    async def run():
+        ticks = [0]
+        done = asyncio.Event()
+
+        async def tick():
+            while not done.is_set():
+                ticks[0] += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        asyncio.get_running_loop().call_later(0.3, holder.execute, "COMMIT")
+        started = time.monotonic()
+        granted = await scheduler.acquire_async(INTERACTIVE, max_wait=5)
+        elapsed = time.monotonic() - started
+        done.set()
+        await ticker
+        return granted, elapsed, ticks[0]
+
+    granted, elapsed, ticks = asyncio.run(run())
+
+    # Step 3: Check the request and the loop
+    assert granted is True and elapsed >= 0.25
+    assert ticks >= 10
+    assert scheduler.stats()["queued"] == 0
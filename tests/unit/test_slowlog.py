@@ -0,0 +1,43 @@
+import json
+from app.parsing import compile_query
+from app.slowlog import SlowQueryLog, query_shape
+
+
+def test_query_shape_drops_the_tickers():
+    """
+    Test that the shape of a query keeps its keywords, selector and ticker count, but not the tickers.
+    """
+    shape = query_shape(compile_query("price, lastyear : ibm, aapl, msft"))
+
+    assert shape == {"type": 3, "keywords": ["lastyear", "price"], "selector": "lastyear", "tickers": 3,
+                     "error": None}
+    assert query_shape(compile_query("price : ibm"))["error"] == "WRONG_KEYWORD_COUNT"
+
+
+def test_only_slow_queries_are_logged_with_hashed_users(tmp_path):
+    """
+    Test that a query is logged only from the threshold on, and that the user id is hashed.
+
+    Steps:
+    1. Observe a fast and a slow query.
+    2. Check the single entry in the log.
+    """
+    log = SlowQueryLog(str(tmp_path / "slow.log"), threshold=0.5, secret="key")
+    query = compile_query("eps, peratio : ibm, aapl")
+
+    # Step 1: Observe a fast and a slow query
+    assert log.observe(0.1, query, [("parse", 0.001)], ["ok", "ok"], 120, userId=7) is False
+    assert log.observe(0.8, query, [("parse", 0.001), ("format", 0.1), ("format", 0.2)], ["ok", 503], 120,
+                       userId=7) is True
+
+    # Step 2: Check the entry
+    with open(tmp_path / "slow.log") as handle:
+        entries = [json.loads(line) for line in handle]
+    assert len(entries) == 1 and log.logged == 1
+    entry = entries[0]
+    assert entry["duration"] == 0.8 and entry["size"] == 120
+    assert entry["shape"]["keywords"] == ["eps", "peratio"] and entry["shape"]["tickers"] == 2
+    assert entry["stages"] == {"parse": 0.001, "format": 0.3}
+    assert entry["upstream"] == ["ok", 503]
+    assert entry["user"] == log.hash_user(7) and "7" != entry["user"] and len(entry["user"]) == 16
+    assert SlowQueryLog(str(tmp_path / "other.log"), secret="other").hash_user(7) != entry["user"]
@@ -0,0 +1,139 @@
+import os
+import numpy as np
+from app.timeseries import SeriesStore, Series, bars_from_payload, as_series
+from app.api_calls import format_response
+
+PARAMS = {"function": "TIME_SERIES_DAILY_ADJUSTED", "symbol": "aapl", "apikey": "key"}
+
+
+def daily_payload(closes):
+    """
+    Builds a TIME_SERIES_DAILY_ADJUSTED payload for AAPL, newest bar first as Alpha Vantage sends it.
+    """
+    bars = {}
+    for day, close in reversed(list(enumerate(closes, 1))):
+        bars["2023-05-%02d" % day] = {"1. open": "%.4f" % (close - 1), "2. high": "%.4f" % (close + 1),
+                                       "3. low": "%.4f" % (close - 2), "4. close": "%.4f" % close,
+                                       "5. adjusted close": "%.4f" % close, "6. volume": str(day * 100)}
+    return {"Meta Data": {"2. Symbol": "AAPL"}, "Time Series (Daily)": bars}
+
+
+def test_bars_are_sorted_oldest_first():
+    """
+    Test that the bars of a payload are converted to a date-sorted array.
+    """
+    bars = bars_from_payload(daily_payload([10, 11, 12]))
+
+    assert list(bars["date"].astype(str)) == ["2023-05-01", "2023-05-02", "2023-05-03"]
+    assert list(bars["close"]) == [10.0, 11.0, 12.0]
+    assert list(bars["volume"]) == [100, 200, 300]
+
+
+def test_store_round_trip_and_expiry(tmp_path):
+    """
+    Test that a stored series is read back memory-mapped until its time to live runs out.
+
+    Steps:
+    1. Store a payload with a 60 second time to live.
+    2. Read it back and slice a range.
+    3. Move the clock past the time to live and check that it is stale.
+    """
+
+    # Step 1: Store a payload
+    now = [os.path.getmtime(str(tmp_path))]
+    store = SeriesStore(str(tmp_path), {"TIME_SERIES_DAILY_ADJUSTED": 60}, clock=lambda: now[0])
+    store.put(PARAMS, daily_payload([10, 11, 12, 13, 14]))
+    assert os.path.exists(os.path.join(str(tmp_path), "TIME_SERIES_DAILY_ADJUSTED", "AAPL.npy"))
+
+    # Step 2: Read it back
+    series = store.get(PARAMS)
+    assert isinstance(series.bars, np.memmap)
+    assert series.symbol == "AAPL"
+    assert list(series.last(2)["close"]) == [13.0, 14.0]
+    assert list(series.between("2023-05-02", "2023-05-03")["close"]) == [11.0, 12.0]
+
+    # Step 3: Expire it
+    now[0] += 3600
+    assert store.get(PARAMS) is None
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_store_rejects_unsafe_symbols(tmp_path):
+    """
+    Test that a symbol which is not a plain ticker is never used as a file name.
+    """
+    store = SeriesStore(str(tmp_path), {})
+    params = dict(PARAMS, symbol="../../etc")
+
+    series = store.put(params, daily_payload([10, 11]))
+
+    assert len(series) == 2
+    assert store.get(params) is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_format_response_reads_series_and_payloads_alike():
+    """
+    Test that a historical query gives the same reply from a stored Series as from the raw payload.
+    """
+    payload = daily_payload([10, 11, 12, 13, 14, 15, 16])
+    series = as_series(payload)
+
+    from_payload = format_response([payload], 3, "lastweek")
+    from_series = format_response([Series("AAPL", series.function, series.bars)], 3, "lastweek")
+
+    assert from_payload == from_series
+    assert from_series[0][1][:6] == ["2023-05-07", "Open: 15.0000", "Close: 16.0000", "High: 17.0000",
+                                     "Low: 14.0000", "Volume: 700"]
+    assert len(from_series[0][1]) == 5 * 6
+
+
+def test_delta_params_pick_the_refresh_size(tmp_path):
+    """
+    Test that a cold start fetches the full series, a short gap only the compact one, and a long gap the full one.
+    """
+    now = [0.0]
+    store = SeriesStore(str(tmp_path), {}, clock=lambda: now[0])
+    day = lambda date: float(np.datetime64(date, "s").astype(np.int64))
+
+    now[0] = day("2023-05-09")
+    assert store.delta_params(PARAMS)["outputsize"] == "full"
+
+    store.put(PARAMS, daily_payload([10, 11, 12]))
+    assert store.delta_params(PARAMS)["outputsize"] == "compact"
+
+    now[0] = day("2024-05-09")
+    assert store.delta_params(PARAMS)["outputsize"] == "full"
+    assert store.delta_params(dict(PARAMS, outputsize="compact"))["outputsize"] == "compact"
+    assert "outputsize" not in store.delta_params(dict(PARAMS, function="TIME_SERIES_MONTHLY_ADJUSTED"))
+    assert store.stats()["compact_fetches"] == 1 and store.stats()["full_fetches"] == 2
+
+
+def test_put_merges_new_bars_into_the_stored_series(tmp_path):
+    """
+    Test that a compact refresh keeps the older stored bars and rescales their adjusted closes.
+
+    Steps:
+    1. Store five bars.
+    2. Store a refresh of the last two bars plus a new one, after a 2:1 split in adjusted terms.
+    3. Check the merged bars.
+    """
+
+    # Step 1: Store five bars
+    store = SeriesStore(str(tmp_path), {})
+    store.put(PARAMS, daily_payload([10, 11, 12, 13, 14]))
+
+    # Step 2: Store the refresh
+    refresh = daily_payload([10, 11, 12, 13, 14, 15])
+    bars = refresh["Time Series (Daily)"]
+    for date in ["2023-05-01", "2023-05-02", "2023-05-03"]:
+        del bars[date]
+    for bar in bars.values():
+        bar["5. adjusted close"] = "%.4f" % (float(bar["4. close"]) / 2)
+    series = store.put(PARAMS, refresh)
+
+    # Step 3: Check the merged bars
+    assert list(series.bars["date"].astype(str)) == ["2023-05-0%d" % day for day in range(1, 7)]
+    assert list(series.bars["close"]) == [10.0, 11.0, 12.0, 13.0, 14.0, 15.0]
+    assert np.allclose(series.bars["adjusted_close"], [5.0, 5.5, 6.0, 6.5, 7.0, 7.5])
+    assert list(store.load(PARAMS)[1].bars["close"]) == [10.0, 11.0, 12.0, 13.0, 14.0, 15.0]
@@ -0,0 +1,124 @@
+import threading
+from app import app, db, api_calls
+from app.models import WatchlistItem
+from app.watchlist import WatchlistSnapshot
+
+
+def fake_quote(params, priority=None):
+    """
+    Stand-in for api_calls.fetch that answers GLOBAL_QUOTE queries.
+    """
+    return {"Global Quote": {"01. symbol": params["symbol"], "02. open": "1", "03. high": "1", "04. low": "1",
+                             "05. price": "1", "06. volume": "1"}}
+
+
+def test_watchlist_items_are_kept_per_user(make_user):
+    """
+    Test adding and removing tickers, and listing the distinct tickers of every watchlist.
+    """
+    with app.app_context():
+        first, second = make_user("wl_first"), make_user("wl_second")
+
+        assert WatchlistItem.watch(first, ["WLA", "WLB"]) == ["WLA", "WLB"]
+        assert WatchlistItem.watch(first, ["WLB", "WLC"]) == ["WLC"]
+        WatchlistItem.watch(second, ["WLA"])
+        db.session.commit()
+        assert WatchlistItem.unwatch(first, ["WLC"]) == 1
+        db.session.commit()
+
+        assert WatchlistItem.symbolsFor(first) == ["WLA", "WLB"]
+        assert [symbol for symbol in WatchlistItem.allSymbols() if symbol.startswith("WL")] == ["WLA", "WLB"]
+
+
+def test_snapshot_refreshes_shared_tickers_once(monkeypatch, make_user):
+    """
+    Test that a refresh fetches each watched ticker once however many users watch it, and that
+    watchlists are then answered from the snapshot.
+
+    Steps:
+    1. Have three users watch overlapping tickers.
+    2. Refresh the snapshot and count the fetches.
+    3. Read every user's quotes and check that nothing more was fetched.
+    """
+
+    # Step 1: Three users with overlapping watchlists
+    fetched = []
+    lock = threading.Lock()
+
+    def counting_fetch(params, priority=None):
+        with lock:
+            fetched.append(params["symbol"])
+        return fake_quote(params)
+
+    monkeypatch.setattr(api_calls, "fetch", counting_fetch)
+    with app.app_context():
+        users = [make_user("wl_shared_" + str(n)) for n in range(3)]
+        for userId in users:
+            WatchlistItem.watch(userId, ["SHA", "SHB", "SHC"])
+        db.session.commit()
+        symbols = [symbol for symbol in WatchlistItem.allSymbols() if symbol.startswith("SH")]
+
+        # Step 2: Refresh
+        snapshot = WatchlistSnapshot(interval=300)
+        assert snapshot.refresh(symbols) == 3
+        assert sorted(fetched) == ["SHA", "SHB", "SHC"]
+
+        # Step 3: Read every watchlist
+        for userId in users:
+            quotes = snapshot.quotes(WatchlistItem.symbolsFor(userId))
+            assert [quote["Global Quote"]["01. symbol"] for quote in quotes] == ["SHA", "SHB", "SHC"]
+    assert len(fetched) == 3
+    assert snapshot.stats()["refreshes"] == 1
+
+
+def test_snapshot_leaves_out_unknown_tickers(monkeypatch):
+    """
+    Test that a ticker answered with an empty quote is not kept in the snapshot.
+    """
+    monkeypatch.setattr(api_calls, "fetch",
+                        lambda params, priority=None: {"Global Quote": {}} if params["symbol"] == "ZZZZ"
+                        else fake_quote(params))
+    snapshot = WatchlistSnapshot(interval=300)
+    snapshot.refresh([])
+
+    quotes = snapshot.quotes(["AAPL", "ZZZZ"])
+
+    assert [quote["Global Quote"]["01. symbol"] for quote in quotes] == ["AAPL"]
+    assert snapshot.stats()["symbols"] == 1
+
+
+def test_refresh_drops_tickers_nobody_watches(monkeypatch, make_user):
+    """
+    Test that a refresh no longer fetches or keeps a ticker after its last watcher removed it.
+
+    Steps:
+    1. Have a user watch two tickers and refresh the snapshot.
+    2. Unwatch one of them and refresh again.
+    3. Check that the second refresh only fetched the watched ticker and dropped the other quote.
+    """
+
+    # Step 1: Watch two tickers and refresh
+    fetched = []
+
+    def counting_fetch(params, priority=None):
+        fetched.append(params["symbol"])
+        return fake_quote(params)
+
+    monkeypatch.setattr(api_calls, "fetch", counting_fetch)
+    watched = lambda: [symbol for symbol in WatchlistItem.allSymbols() if symbol.startswith("DR")]
+    with app.app_context():
+        userId = make_user("wl_drop")
+        WatchlistItem.watch(userId, ["DRA", "DRB"])
+        db.session.commit()
+        snapshot = WatchlistSnapshot(interval=300)
+        assert snapshot.refresh(watched()) == 2
+
+        # Step 2: Unwatch one and refresh
+        WatchlistItem.unwatch(userId, ["DRB"])
+        db.session.commit()
+        del fetched[:]
+        assert snapshot.refresh(watched()) == 1
+
+    # Step 3: Check the fetches and the snapshot
+    assert fetched == ["DRA"]
+    assert snapshot.stats()["symbols"] == 1